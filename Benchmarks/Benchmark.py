@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import time
+import argparse
+import shutil
+import platform
+import statistics
+import tempfile
+from contextlib import contextmanager
+
+import pandas as pd
+from selenium.webdriver.common.by import By
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Benchmarks import Fixtures
+from Model_Components.Backends import ScrapingBackend
+from Model_Components.Parsing import HtmlDocument
+from Model_Components.Scraping import DataScraper
+from Model_Components.Mining import TextMiner
+from Model_Components.Transforming import DataTransformer
+from Model_Components.Journaling import CacheJournal
+from Model_Components.Sampling import PostcodeSampler
+
+"""
+Description:
+* This script times every stage of the pipeline on synthetic data, without a browser or network connection:
+  card extraction, text mining, cleaning, writing and resuming the cache journal and sampling postcodes.
+
+Instructions:
+* Run from the project folder: python Benchmarks/Benchmark.py
+* The timings are compared with Benchmarks/baseline.json. The script fails (exit code 1) when a stage is slower than
+  its baseline by more than the threshold. Record a new baseline with --save-baseline, on the machine that runs the
+  comparisons, as timings of different machines are not comparable.
+* --quick only runs the smallest size of every stage.
+* Every timing is the median of several repeats, and differences under the noise floor never count as regressions.
+"""
+
+# BENCHMARK PARAMETERS
+
+stage_sizes = {  # Amount of rows (properties, or postcodes for sampling) every stage is timed with
+    "extraction": [1_000, 10_000],
+    "text_mining": [1_000, 10_000, 100_000],
+    "clean_data": [1_000, 10_000, 100_000, 1_000_000],
+    "clean_data_stream": [1_000, 10_000, 100_000, 1_000_000],
+    "cache_write": [1_000, 10_000, 100_000],
+    "cache_resume": [1_000, 10_000, 100_000],
+    "sampling": [1_000, 10_000, 100_000, 1_000_000],
+    "sampling_index": [1_000, 10_000, 100_000, 1_000_000],
+}
+
+threshold = 0.25  # A stage regresses when it is more than 25% slower than its baseline...
+noise_floor = 0.01  # ...and more than 10 milliseconds slower
+min_repeats = 5  # Stages up to 100k rows are timed at least this many times...
+min_total_seconds = 1.0  # ...and repeated (up to max_repeats times) until they took this long in total
+max_repeats = 50
+baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+fields_of_interest = {"price": True, "property_type": True, "bedrooms": True, "bathrooms": True, "text": True,
+                      "text_values": Fixtures.TEXT_VALUES}
+
+
+class FixtureBackend(ScrapingBackend):
+    """This backend serves result pages from memory, so extraction is timed without any network traffic."""
+
+    def property_elements(self, page):
+        return HtmlDocument(page).find_elements(By.CSS_SELECTOR, '.l-searchResult.is-list')
+
+
+@contextmanager
+def working_directory(directory=None):
+    """The cache and the sampler read and write relative to the working directory, so they run in a temporary one."""
+    original_directory = os.getcwd()
+    temporary_directory = None
+    if directory is None:
+        temporary_directory = directory = tempfile.mkdtemp()
+    os.chdir(directory)
+    try:
+        yield directory
+    finally:
+        os.chdir(original_directory)
+        if temporary_directory:
+            shutil.rmtree(temporary_directory, ignore_errors=True)
+
+
+def write_journal(pages):
+    os.makedirs(os.path.join("Outputs", "Cache", "Journal"), exist_ok=True)
+    journal = CacheJournal("benchmark")
+    journal.start(pd.DataFrame(columns=["postcode", "region_gpt"]), {})
+    for page_number, (records, constants) in enumerate(pages):
+        journal.append(records, {"current_page": page_number}, **constants)
+    journal.close()
+
+
+def bench_extraction(size):
+    pages = [Fixtures.result_page_html(cards=24, page=page, seed=page) for page in range(size // 24)]
+    scraper = DataScraper(pd.DataFrame(columns=["postcode", "region_gpt"]), 1, fields_of_interest,
+                          backend=FixtureBackend())
+
+    def run():
+        for page in pages:
+            scraper.extract_data(page, "PC1")
+    return run
+
+
+def bench_text_mining(size):
+    texts = pd.Series(Fixtures.descriptions(size))
+    text_miner = TextMiner(Fixtures.TEXT_VALUES)
+    return lambda: text_miner.mine_series(texts)
+
+
+def bench_clean_data(size):
+    raw_data = Fixtures.raw_data_frame(size)
+    return lambda: DataTransformer(raw_data).clean_data
+
+
+def bench_clean_data_stream(size):
+    raw_data = Fixtures.raw_data_frame(size)
+
+    def run():
+        chunks = (raw_data.iloc[start:start + 100_000] for start in range(0, size, 100_000))
+        for _ in DataTransformer(chunks).stream_clean_data():
+            pass
+    return run
+
+
+def bench_cache_write(size):
+    pages = list(Fixtures.page_records(Fixtures.raw_data_frame(size)))
+
+    def run():
+        with working_directory():
+            write_journal(pages)
+    return run
+
+
+def bench_cache_resume(size):
+    directory = tempfile.mkdtemp()
+    with working_directory(directory):
+        write_journal(Fixtures.page_records(Fixtures.raw_data_frame(size)))
+
+    def run():
+        with working_directory(directory):
+            journal = CacheJournal("benchmark")
+            journal.load()
+            journal.replay()
+    run.cleanup = lambda: shutil.rmtree(directory, ignore_errors=True)
+    return run
+
+
+def bench_sampling(size):
+    """Sampling from the indexed copy of the postcode list, as in every run after the first."""
+    directory = tempfile.mkdtemp()
+    with working_directory(directory):
+        os.makedirs("Inputs")
+        Fixtures.postcode_table(size).to_csv(os.path.join("Inputs", "postalcodes.csv"), index=False)
+        PostcodeSampler(n_per_region=40, set_seed=12).pc_sampler()
+
+    def run():
+        with working_directory(directory):
+            PostcodeSampler(n_per_region=40, set_seed=12).pc_sampler()
+    run.cleanup = lambda: shutil.rmtree(directory, ignore_errors=True)
+    return run
+
+
+def bench_sampling_index(size):
+    """Reading and indexing the postcode list, which only happens when it changed."""
+    postcode_table = Fixtures.postcode_table(size)
+
+    def run():
+        with working_directory():
+            os.makedirs("Inputs")
+            postcode_table.to_csv(os.path.join("Inputs", "postalcodes.csv"), index=False)
+            PostcodeSampler(n_per_region=40, set_seed=12).load_postcodes()
+    return run
+
+
+benchmarks = {
+    "extraction": bench_extraction,
+    "text_mining": bench_text_mining,
+    "clean_data": bench_clean_data,
+    "clean_data_stream": bench_clean_data_stream,
+    "cache_write": bench_cache_write,
+    "cache_resume": bench_cache_resume,
+    "sampling": bench_sampling,
+    "sampling_index": bench_sampling_index,
+}
+
+
+def time_stage(stage, size):
+    """This function returns the median time of a number of repeats. Fast stages are repeated until they ran for
+    min_total_seconds, as single timings of a few milliseconds vary by more than the threshold between runs."""
+    run = benchmarks[stage](size)
+    repeats = min_repeats if size <= 100_000 else 1
+    try:
+        timings = []
+        while len(timings) < repeats or (sum(timings) < min_total_seconds and len(timings) < max_repeats
+                                         and size <= 100_000):
+            start_time = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start_time)
+    finally:
+        getattr(run, "cleanup", lambda: None)()
+    return statistics.median(timings)
+
+
+def compare(results, baseline):
+    """This function returns the stages that regressed past the threshold."""
+    regressions = []
+    for key, result in results.items():
+        baseline_result = baseline.get("results", {}).get(key)
+        if baseline_result is None:
+            continue
+        slowdown = result["seconds"] / baseline_result["seconds"] - 1
+        result["change"] = round(slowdown, 4)
+        if slowdown > threshold and result["seconds"] - baseline_result["seconds"] > noise_floor:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    global threshold
+    parser = argparse.ArgumentParser(description="Time every pipeline stage on synthetic data.")
+    parser.add_argument("--stages", nargs="+", choices=list(benchmarks), default=list(benchmarks))
+    parser.add_argument("--quick", action="store_true", help="only run the smallest size of every stage")
+    parser.add_argument("--save-baseline", action="store_true", help="save the timings as the new baseline")
+    parser.add_argument("--threshold", type=float, default=threshold)
+    arguments = parser.parse_args()
+    threshold = arguments.threshold
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, 'r') as f:
+            baseline = json.load(f)
+
+    results = {}
+    for stage in arguments.stages:
+        sizes = stage_sizes[stage][:1] if arguments.quick else stage_sizes[stage]
+        for size in sizes:
+            seconds = time_stage(stage, size)
+            results[f"{stage}[{size}]"] = {"seconds": round(seconds, 6), "rows_per_second": round(size / seconds)}
+
+    regressions = compare(results, baseline)
+
+    print(f"{'stage':<28}{'seconds':>12}{'rows/s':>14}{'vs baseline':>14}")
+    for key, result in results.items():
+        change = f"{result['change']:+.1%}" if "change" in result else "-"
+        flag = "  REGRESSED" if key in regressions else ""
+        print(f"{key:<28}{result['seconds']:>12.4f}{result['rows_per_second']:>14,}{change:>14}{flag}")
+
+    if arguments.save_baseline:
+        baseline_results = dict(baseline.get("results", {}))
+        baseline_results.update({key: {"seconds": result["seconds"], "rows_per_second": result["rows_per_second"]}
+                                 for key, result in results.items()})
+        with open(baseline_path, 'w') as f:
+            json.dump({"machine": {"platform": platform.platform(), "python": platform.python_version(),
+                                   "processor": platform.processor()},
+                       "results": baseline_results}, f, indent=2)
+        print(f"Baseline saved in {baseline_path}")
+    elif regressions:
+        print(f"{len(regressions)} stage(s) regressed by more than {threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
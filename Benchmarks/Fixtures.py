@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+"""This file generates the synthetic inputs of the benchmarks: Rightmove-like result pages, raw data frames as the
+scraper produces them and postcode tables. Everything is generated from a seed, so every run measures the same data."""
+
+PROPERTY_TYPES = ["Flat", "Terraced house", "Semi-detached house", "Detached house", "Bungalow", "Maisonette"]
+REGIONS = ["London", "South East", "South West", "East of England", "West Midlands", "East Midlands",
+           "Yorkshire and The Humber", "North West", "North East", "Wales", "Scotland", "Northern Ireland"]
+DESCRIPTION_WORDS = ["a", "lovely", "spacious", "home", "with", "parking", "space", "garden", "fully", "furnished",
+                     "close", "to", "the", "station", "and", "local", "shops", "newly", "renovated", "kitchen",
+                     "double", "bedroom", "en-suite", "bathroom", "chain", "free", "south", "facing", "views"]
+TEXT_VALUES = {"fully furnished": True, "parking space": True, "garden": True, "chain free": True, "en-suite": "word"}
+
+
+def descriptions(n, seed=0, words=30):
+    """This function returns n property descriptions of random words, some of which form the mined phrases."""
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(DESCRIPTION_WORDS)
+    word_indices = rng.integers(0, len(vocabulary), size=(n, words))
+    return [" ".join(row) + "." for row in vocabulary[word_indices]]
+
+
+def property_card(listing_id, rng, description):
+    return f'''<div class="l-searchResult is-list" id="property-{listing_id}"><div class="propertyCard">
+<a class="propertyCard-link" href="/properties/{listing_id}#/"><img src="/img/{listing_id}.jpg" alt=""></a>
+<div class="propertyCard-price"><div class="propertyCard-priceValue">£{rng.integers(80, 2000) * 1000:,}</div></div>
+<h2 class="property-information"><span class="text">{PROPERTY_TYPES[rng.integers(len(PROPERTY_TYPES))]}</span>
+<span class="no-svg-bed-icon bed-icon seperator"><svg><use xlink:href="#icon-bed"></use></svg></span>
+<span class="text">{rng.integers(1, 6)}</span>
+<span class="no-svg-bathroom-icon bathroom-icon seperator"><svg><use xlink:href="#icon-bath"></use></svg></span>
+<span class="text">{rng.integers(1, 4)}</span></h2>
+<div class="propertyCard-description"><span data-test="property-description"><span>{description}</span></span></div>
+<div class="propertyCard-contacts"><a href="/estate-agents/{rng.integers(10 ** 5)}">Estate agent</a>
+<a class="propertyCard-contactsPhoneNumber" href="tel:01234567890">01234 567890</a></div>
+</div></div>'''
+
+
+def result_page_html(cards=24, pages=42, page=0, seed=0):
+    """This function returns the HTML of a results page with the given number of property cards."""
+    rng = np.random.default_rng(seed)
+    card_descriptions = descriptions(cards, seed)
+    property_cards = "\n".join(property_card(10 ** 8 + seed * 1000 + i, rng, card_descriptions[i])
+                               for i in range(cards))
+    return f'''<!DOCTYPE html><html><head><title>Property for sale</title>
+<link rel="stylesheet" href="/styles.css"><script>window.jsonModel = {{"properties": []}};</script></head>
+<body><header><nav><a href="/">Home</a><a href="/property-for-sale.html">Buy</a></nav></header>
+<div id="l-container"><div class="l-searchResults">
+{property_cards}
+</div>
+<div class="pagination-pageSelect"><span>Page</span> <span>{page + 1}</span> <span>of</span> <span>{pages}</span></div>
+<button class="pagination-direction--next">Next</button></div>
+<footer><p>Synthetic fixture</p></footer></body></html>'''
+
+
+def raw_data_frame(n_rows, seed=0, duplicate_share=0.02, empty_share=0.02):
+    """This function returns a frame like DataScraper's raw data: every value is text as it was scraped, except for
+    the mined text values. A share of the rows are duplicates or have no data at all."""
+    rng = np.random.default_rng(seed)
+
+    prices = rng.integers(80, 2000, size=n_rows) * 1000
+    raw_data = pd.DataFrame({
+        "listing_id": (10 ** 8 + np.arange(n_rows)).astype(str),
+        "postcode": np.char.add("PC", rng.integers(1, 3000, size=n_rows).astype(str)),
+        "region_gpt": np.array(REGIONS)[rng.integers(len(REGIONS), size=n_rows)],
+        "price": [f"£{price:,}" for price in prices],
+        "property_type": np.array(PROPERTY_TYPES)[rng.integers(len(PROPERTY_TYPES), size=n_rows)],
+        "bedrooms": rng.integers(1, 6, size=n_rows).astype(str),
+        "bathrooms": rng.integers(1, 4, size=n_rows).astype(str),
+        "text": np.array(descriptions(min(n_rows, 10000), seed), dtype=object)[np.arange(n_rows) % 10000],
+    })
+    for phrase in TEXT_VALUES:
+        raw_data[phrase] = (rng.random(n_rows) < 0.3).astype(object)  # like scraped values, these can be None
+
+    duplicate_rows = np.flatnonzero(rng.random(n_rows) < duplicate_share)
+    raw_data.iloc[duplicate_rows] = raw_data.iloc[rng.integers(0, n_rows, size=len(duplicate_rows))].to_numpy()
+
+    empty_rows = rng.random(n_rows) < empty_share
+    raw_data.loc[empty_rows, ["price", "property_type", "bedrooms", "bathrooms", "text"] + list(TEXT_VALUES)] = None
+    return raw_data
+
+
+def page_records(raw_data, page_size=24):
+    """This function splits a raw data frame into pages of row dictionaries, as extract_data returns them."""
+    records = raw_data.drop(columns=["postcode", "region_gpt"]).to_dict("records")
+    constants = raw_data[["postcode", "region_gpt"]].to_dict("records")
+    for start in range(0, len(records), page_size):
+        yield records[start:start + page_size], constants[start]
+
+
+def postcode_table(n_postcodes, seed=0):
+    """This function returns a postcode list in the format of Inputs/postalcodes.csv."""
+    rng = np.random.default_rng(seed)
+    regions = np.array(REGIONS + ["Isle of Man", "Jersey"])[rng.integers(len(REGIONS) + 2, size=n_postcodes)]
+    countries = np.where(np.isin(regions, ["Isle of Man", "Jersey"]), regions, "England")
+    return pd.DataFrame({
+        "postcode": [f"{chr(65 + i % 26)}{chr(65 + i // 26 % 26)}{i // 676 + 1}" for i in range(n_postcodes)],
+        "region_gpt": regions,
+        "country_string": countries,
+    })
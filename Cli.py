@@ -0,0 +1,345 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+
+"""
+Description:
+* Command line entry point of the scraper. Every stage of the model is a subcommand, and the stages pass their results
+  on through files in the job folder (Outputs/Jobs/<job>/), so each stage can be run, repeated or skipped on its own:
+
+    sample      samples postcodes                               -> sample.csv
+    scrape      scrapes the sampled postcodes                   -> raw.csv (and weights.csv, with listing quotas,
+                                                                   and dead_letters.csv, if postcodes failed)
+    recover     takes the raw data out of a cache instead       -> raw.csv
+    queue       queues the sampled postcodes for workers        -> queue.sqlite
+    work        scrapes tasks from the queue, until it is drained
+    collect     takes the raw data out of the queue             -> raw.csv
+    transform   cleans the raw data                             -> clean/part-*.parquet
+    remine      mines the saved descriptions again, after the text_values changed (raw.csv and clean/ by default)
+    export      exports the clean data to Outputs/
+    aggregate   adds the clean data to the summary tables       -> Outputs/Aggregates/
+    run         all of the above, except recover and remine (aggregate only if enabled in aggregate_settings)
+
+Instructions:
+* python Cli.py <subcommand> --config Inputs/job_example.json
+* The job config holds the same settings as the input parameters of Main.py. Settings left out take the defaults
+  below, and "job" names the job folder.
+* To scrape with several processes or machines, queue the sample once and start "work" as often as needed, on
+  every machine with the same job config. queue_settings["path"] can point at a queue on a shared disk.
+* To re-mine a cache, recover it into the job first. Exports can be re-mined by passing their paths to remine.
+* Stages only import what they use, so recovering, transforming and exporting never load the browser stack.
+"""
+
+DEFAULT_CONFIG = {
+    "job": "default",
+    "fields_of_interest": {
+        "price": True,
+        "property_type": True,
+        "bedrooms": True,
+        "bathrooms": True,
+        "text": True,
+        "text_values": {"fully furnished": True, "parking space": True},
+    },
+    "n_per_region": 40,
+    "set_seed": 12,
+    "sampling_settings": {},
+    "session_settings": {"max_pages": 50, "max_memory": 1500},
+    "backend": "selenium",
+    "archive_settings": {},
+    "rate_settings": {"max_rate": 1.0, "max_attempts": 5},
+    "quota_settings": {"listings_per_region": None, "listings_per_postcode": None},
+    "fault_settings": {"max_attempts": 3, "failure_rate": 0.5, "window": 20, "cooldown": 60, "max_trips": 5},
+    "n_workers": 1,
+    "incremental": False,
+    "export_settings": {"export_format": "csv", "partition": False, "compression": "zstd", "delta": False},
+    "metrics_settings": {"export_interval": 60, "profile_postcode": None},
+    "chunk_size": None,
+    "queue_settings": {"path": None, "lease_seconds": 120, "max_attempts": 5},
+    "remine_settings": {"n_processes": None},
+    "aggregate_settings": {"enabled": False, "relative_accuracy": 0.01},
+}
+
+
+class Job:
+    """This class holds the settings of a job and finds its files."""
+
+    def __init__(self, config_path=None):
+        self.config = json.loads(json.dumps(DEFAULT_CONFIG))  # deep copy
+        if config_path:
+            with open(config_path, 'r') as f:
+                self.config.update(json.load(f))
+
+        self.directory = os.path.join(os.getcwd(), "Outputs", "Jobs", str(self.config["job"]))
+        self.output_id = datetime.now().strftime('%Y%m%d%H%M%S')
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __getitem__(self, key):
+        return self.config[key]
+
+    def path(self, *names):
+        return os.path.join(self.directory, *names)
+
+    def read_state(self):
+        """The state holds what later stages need to know about earlier ones, eg. the cache ID of the scrape."""
+        if not os.path.exists(self.path("state.json")):
+            return {}
+        with open(self.path("state.json"), 'r') as f:
+            return json.load(f)
+
+    def write_state(self, **values):
+        state = dict(self.read_state(), **values)
+        with open(self.path("state.json.tmp"), 'w') as f:
+            json.dump(state, f)
+        os.replace(self.path("state.json.tmp"), self.path("state.json"))
+
+
+def sample(job):
+    from Model_Components.Sampling import PostcodeSampler
+
+    pc_sample = PostcodeSampler(n_per_region=job["n_per_region"], set_seed=job["set_seed"],
+                                **job["sampling_settings"]).pc_sampler()
+    pc_sample.to_csv(job.path("sample.csv"), index=False)
+    logging.info(f"Sample saved in: {job.path('sample.csv')}")
+
+
+def scrape(job, resume_cache=None):
+    import pandas as pd
+    from Model_Components.Caching import CachedScraper
+
+    if not resume_cache and not os.path.exists(job.path("sample.csv")):
+        sample(job)
+    pc_sample = pd.read_csv(job.path("sample.csv")) if not resume_cache else None
+
+    scraper = CachedScraper(pc_sample, n_per_region=job["n_per_region"], fields_of_interest=job["fields_of_interest"],
+                            session_settings=job["session_settings"], n_workers=job["n_workers"],
+                            backend=job["backend"], incremental=job["incremental"],
+                            rate_settings=job["rate_settings"], archive_settings=job["archive_settings"],
+                            quota_settings=job["quota_settings"], fault_settings=job["fault_settings"])
+    if resume_cache:  # the sample and progress come from the interrupted run
+        scraper.resume(resume_cache)
+    raw_data = scraper.run()
+
+    write_raw_data(job, raw_data)
+    sampling_weights = scraper.sampling_weights()
+    if sampling_weights is not None:
+        sampling_weights.to_csv(job.path("weights.csv"))
+    elif os.path.exists(job.path("weights.csv")):
+        os.remove(job.path("weights.csv"))
+    if scraper.dead_letters:
+        pd.DataFrame(scraper.dead_letters).to_csv(job.path("dead_letters.csv"), index=False)
+        logging.info(f"The postcodes that could not be scraped are listed in: {job.path('dead_letters.csv')}")
+    elif os.path.exists(job.path("dead_letters.csv")):
+        os.remove(job.path("dead_letters.csv"))
+    job.write_state(cache_id=scraper.cache_id)
+
+
+def recover(job, cache_id):
+    from Model_Components.Journaling import CacheRecover
+
+    raw_data = CacheRecover(import_cache=cache_id).recover_cache(chunk_size=job["chunk_size"])
+    write_raw_data(job, raw_data)
+    job.write_state(cache_id=cache_id)
+
+
+def open_queue(job):
+    from Model_Components.Queueing import TaskQueue
+
+    queue_settings = dict(job["queue_settings"])
+    path = queue_settings.pop("path", None) or job.path("queue.sqlite")
+    return TaskQueue(path, **queue_settings)
+
+
+def queue(job, retry_failed=False):
+    import pandas as pd
+
+    task_queue = open_queue(job)
+    if retry_failed:
+        task_queue.retry_failed()
+    else:
+        if not os.path.exists(job.path("sample.csv")):
+            sample(job)
+        task_queue.seed(pd.read_csv(job.path("sample.csv")))
+    logging.info(f"Queue progress: {task_queue.progress()}")
+    task_queue.close()
+
+
+def work(job):
+    from Model_Components.Distributing import QueueWorker
+
+    task_queue = open_queue(job)
+    QueueWorker(task_queue, n_per_region=job["n_per_region"], fields_of_interest=job["fields_of_interest"],
+                session_settings=job["session_settings"], n_workers=job["n_workers"], backend=job["backend"],
+                rate_settings=job["rate_settings"], archive_settings=job["archive_settings"]).run()
+    task_queue.close()
+
+
+def collect(job):
+    task_queue = open_queue(job)
+    progress = task_queue.progress()
+    if progress["pending"] or progress["leased"]:
+        logging.info(f"The queue is not drained yet, collecting the tasks done so far: {progress}")
+    if progress["failed"]:
+        logging.info(f"{progress['failed']} tasks failed, their pages are missing. "
+                     f"Run 'queue --retry-failed' and 'work' to try them again.")
+    write_raw_data(job, task_queue.results())
+    task_queue.close()
+
+
+def write_raw_data(job, raw_data):
+    """Raw data is saved as CSV, like the cache journal. It can be a DataFrame or an iterable of chunks."""
+    import pandas as pd
+
+    chunks = [raw_data] if isinstance(raw_data, pd.DataFrame) else raw_data
+    for k, chunk in enumerate(chunks):
+        chunk.to_csv(job.path("raw.csv"), mode="w" if k == 0 else "a", header=k == 0, index=False)
+    logging.info(f"Raw data saved in: {job.path('raw.csv')}")
+
+
+def transform(job):
+    import pandas as pd
+    from Model_Components.Transforming import DataTransformer
+
+    raw_data = pd.read_csv(job.path("raw.csv"), chunksize=job["chunk_size"])
+    sampling_weights = None
+    if os.path.exists(job.path("weights.csv")):
+        sampling_weights = pd.read_csv(job.path("weights.csv"), index_col="postcode")["sampling_weight"]
+
+    os.makedirs(job.path("clean"), exist_ok=True)
+    for part in os.listdir(job.path("clean")):
+        os.remove(job.path("clean", part))
+
+    if job["chunk_size"]:
+        clean_chunks = DataTransformer(raw_data, sampling_weights).stream_clean_data()
+    else:
+        clean_data = DataTransformer(raw_data, sampling_weights).clean_data
+        clean_chunks = [clean_data] if clean_data is not None else []
+
+    for k, clean_chunk in enumerate(clean_chunks):
+        write_part(job.path("clean", f"part-{k:05d}"), clean_chunk)
+    logging.info(f"Clean data saved in: {job.path('clean')}")
+
+
+def remine(job, paths=None):
+    from Model_Components.Remining import TextReminer
+
+    if not paths:
+        paths = [path for path in (job.path("raw.csv"), job.path("clean")) if os.path.exists(path)]
+    text_values = job["fields_of_interest"]["text_values"]
+    with TextReminer(text_values, chunk_size=job["chunk_size"], **job["remine_settings"]) as text_reminer:
+        text_reminer.remine(paths)
+
+
+def write_part(path, data):
+    """Clean data keeps its types, in Parquet when pyarrow is installed and as a pickle otherwise."""
+    try:
+        data.to_parquet(path + ".parquet", index=False)
+    except ImportError:
+        data.to_pickle(path + ".pkl")
+
+
+def read_part(path):
+    import pandas as pd
+
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+
+def export(job):
+    import pandas as pd
+    from Model_Components.Exporting import DataExporter
+
+    parts = sorted(job.path("clean", part) for part in os.listdir(job.path("clean")))
+
+    listing_index = None
+    if job["incremental"]:
+        from Model_Components.Indexing import ListingIndex
+        listing_index = ListingIndex(run_id=job.read_state().get("cache_id"))
+
+    if job["chunk_size"]:
+        exporter = DataExporter(None, job.output_id, listing_index=listing_index, **job["export_settings"])
+        exporter.export_chunks(read_part(part) for part in parts)
+    else:
+        clean_data = pd.concat([read_part(part) for part in parts], ignore_index=True) if parts else None
+        DataExporter(clean_data, job.output_id, listing_index=listing_index, **job["export_settings"]).export()
+
+
+def aggregate(job):
+    """The clean data is aggregated under the cache ID of the scrape, so aggregating it again replaces it."""
+    from Model_Components.Aggregating import RegionalAggregates
+
+    aggregate_settings = dict(job["aggregate_settings"])
+    aggregate_settings.pop("enabled", None)
+    aggregates = RegionalAggregates(run_id=job.read_state().get("cache_id") or job.output_id, **aggregate_settings)
+    aggregates.reset()
+    for part in sorted(os.listdir(job.path("clean"))):
+        aggregates.add(read_part(job.path("clean", part)))
+    aggregates.export_summaries()
+    aggregates.close()
+
+
+def run(job):
+    sample(job)
+    scrape(job)
+    transform(job)
+    export(job)
+    if job["aggregate_settings"].get("enabled"):
+        aggregate(job)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Scrape a representative sample of properties from Rightmove.")
+    subparsers = parser.add_subparsers(dest="stage", required=True)
+
+    for stage, description in [("sample", "sample postcodes"),
+                               ("scrape", "scrape the sampled postcodes"),
+                               ("recover", "take the raw data out of a cache instead of scraping"),
+                               ("queue", "queue the sampled postcodes for workers"),
+                               ("work", "scrape tasks from the queue"),
+                               ("collect", "take the raw data out of the queue"),
+                               ("transform", "clean the raw data"),
+                               ("remine", "mine the saved descriptions again with the current text_values"),
+                               ("export", "export the clean data"),
+                               ("aggregate", "add the clean data to the regional summary tables"),
+                               ("run", "sample, scrape, transform and export")]:
+        subparser = subparsers.add_parser(stage, help=description)
+        subparser.add_argument("--config", help="job config file (JSON)")
+        if stage == "scrape":
+            subparser.add_argument("--resume", metavar="CACHE_ID", help="continue an interrupted scrape")
+        if stage == "recover":
+            subparser.add_argument("cache_id")
+        if stage == "remine":
+            subparser.add_argument("paths", nargs="*", help="files or directories to re-mine (CSV, Parquet, pickle)")
+        if stage == "queue":
+            subparser.add_argument("--retry-failed", action="store_true", help="queue the failed tasks again")
+
+    arguments = parser.parse_args(arguments)
+
+    from Model_Components.HelperFunctions import configure_logging
+    from Model_Components.Metrics import metrics
+
+    job = Job(arguments.config)
+    configure_logging(job.output_id)
+    metrics.configure(job.output_id, **job["metrics_settings"])
+    logging.info(f"Starting {arguments.stage} of job {job['job']}.")
+
+    if arguments.stage == "scrape":
+        scrape(job, resume_cache=arguments.resume)
+    elif arguments.stage == "recover":
+        recover(job, arguments.cache_id)
+    elif arguments.stage == "remine":
+        remine(job, arguments.paths)
+    elif arguments.stage == "queue":
+        queue(job, retry_failed=arguments.retry_failed)
+    else:
+        {"sample": sample, "work": work, "collect": collect, "transform": transform, "export": export,
+         "aggregate": aggregate, "run": run}[arguments.stage](job)
+
+    metrics.export()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -21,6 +21,8 @@ Notes:
 
 import_cache = None  # "20230411000133"  # Fill in cache_id,in memory (eg. "20230410155536") for it to be loaded. This is a recovery measure.
 
+resume_cache = None  # Fill in cache_id (eg. "20230410155536") to continue an interrupted scrape where it stopped.
+
 fields_of_interest = {
     "price": True,
     "property_type": True,
@@ -37,7 +39,87 @@ n_per_region = 40  # Amount of postcodes to be sampled from one region
 
 set_seed = 12
 
+sampling_settings = {
+    "allocation": "equal",  # "equal": n_per_region per region, "proportional": by the number of postcodes per region,
+    # "weighted": by the weights below. The last two divide n_per_region * (number of regions) postcodes in total.
+    "weights": {},  # Weighted allocation only, eg. {"London": 3} (regions left out weigh 1)
+    "max_per_region": None,  # Never sample more than this many postcodes from one region
+}
+
+session_settings = {  # Browser sessions are reused across postcodes and recycled once they are used up.
+    "max_pages": 50,  # Restart a browser after it has loaded this many pages
+    "max_memory": 1500,  # Restart a browser once it uses more than this many MB of memory (requires psutil)
+    "profile": {  # How Chrome is started. Only the HTML is read, so everything else is left out by default.
+        "headless": True,  # Run without a window
+        "page_load_strategy": "eager",  # Continue once the HTML is parsed, without waiting for images and scripts
+        "block_images": True,
+        "block_fonts": True,
+        "blocked_urls": None,  # URL patterns that are never loaded (* is a wildcard), None blocks known trackers
+        "measure_traffic": True,  # Record the bytes every page transfers in the metrics (page_bytes)
+    },
+    "bulk_extraction": False,  # Read the cards from one page_source call, instead of one browser call per field
+}
+
+backend = "selenium"  # "selenium" renders every page in Chrome, "http" fetches and parses the pages without a browser,
+# "replay" processes the pages recorded in the archive by earlier runs, without connecting to Rightmove
+
+archive_settings = {  # Fetched pages can be kept in Outputs/Archive/, to process them again later with backend "replay"
+    "record": False,
+    "ttl_days": 30,  # Remove pages after this many days
+    "max_size_mb": 2000,  # Remove the least recently used pages once the archive grows past this size
+}
+
+rate_settings = {  # All workers share one request budget, which slows down automatically when requests fail.
+    "max_rate": 1.0,  # Requests per second when the website responds well
+    "max_attempts": 5,  # Attempts per request, with exponentially growing pauses in between
+}
+
+quota_settings = {  # Stop paginating once enough listings are found, instead of scraping every page of every postcode.
+    # Every postcode gets its first page, the rest of the budget goes to the postcodes with more pages. The listings
+    # get a sampling_weight column that corrects for the pages that were skipped.
+    "listings_per_region": None,  # eg. 2000
+    "listings_per_postcode": None,  # eg. 240 (10 pages)
+}
+
+fault_settings = {  # A postcode that fails is retried from the page that failed, without restarting the run
+    "max_attempts": 3,  # Attempts per postcode, after which it is set aside in Outputs/dead_letters_<id>.csv. Pages
+    # that fail to load are not attempted again: their requests were already retried (rate_settings["max_attempts"])
+    "failure_rate": 0.5,  # Pause scraping once this share of the latest postcode attempts failed...
+    "window": 20,  # ...out of this many
+    "cooldown": 60,  # Seconds to pause, doubling every time the first postcode after a pause fails as well
+    "max_trips": 5,  # Stop the run (it can be resumed with resume_cache) when it would pause this many times in a row
+}
+
+n_workers = 1  # Amount of browsers scraping postcodes in parallel. Output is the same as with a single browser.
+
+incremental = False  # Keep an index of listings across runs, and stop paginating a postcode once a page has no news
+
+export_settings = {
+    "export_format": "csv",  # "csv" (one file) or "parquet" (compressed and typed, requires pyarrow)
+    "partition": False,  # Parquet only: write one file per region under Outputs/rightmove_data/run_id=<id>/
+    "compression": "zstd",
+    "delta": False,  # Incremental runs only: export only the new, changed and removed listings
+}
+
+metrics_settings = {  # Counters and timings of every stage are saved in Outputs/Metrics/ as JSON and Prometheus text
+    "export_interval": 60,  # Also save them every this many seconds during the run
+    "profile_postcode": None,  # Fill in a postcode of the sample (eg. "AB10") to save a cProfile of scraping it
+}
+
+aggregate_settings = {  # Keep summary tables per region and postcode in Outputs/Aggregates/, for dashboards
+    "enabled": False,  # Count listings and phrases and sketch the price distribution by region, type and bedrooms
+    "relative_accuracy": 0.01,  # Price quantiles are estimated within this fraction of the true price
+}
+
+chunk_size = None  # Clean and export the data in chunks of this many rows (eg. 100000), if it does not fit in memory
+
 # RUNNING THE MODEL
 
 RightMoveModel(import_cache=import_cache, fields_of_interest=fields_of_interest, n_per_region=n_per_region,
-               set_seed=set_seed).run()
+               set_seed=set_seed, session_settings=session_settings,
+               n_workers=n_workers, backend=backend, resume_cache=resume_cache,
+               export_settings=export_settings, incremental=incremental,
+               rate_settings=rate_settings, metrics_settings=metrics_settings,
+               archive_settings=archive_settings, sampling_settings=sampling_settings,
+               chunk_size=chunk_size, quota_settings=quota_settings,
+               aggregate_settings=aggregate_settings, fault_settings=fault_settings).run()
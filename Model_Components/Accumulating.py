@@ -0,0 +1,50 @@
+import pandas as pd
+
+
+class RowAccumulator:
+    """This class collects scraped properties column by column and only builds a DataFrame when asked.
+    Appending a page costs the same at the start and at the end of a run, unlike concatenating DataFrames."""
+
+    def __init__(self, columns=()):
+        self.columns = {column: [] for column in columns}
+        self.n_rows = 0
+        self.frame = None  # DataFrame built by to_frame, kept until new rows arrive
+
+    def __len__(self):
+        return self.n_rows
+
+    def append(self, records, **constants):
+        """This function appends a list of row dictionaries. Constants are values shared by all rows (eg. postcode).
+        Columns that show up for the first time are back-filled with None for the earlier rows."""
+        if not records:
+            return
+
+        for row in records + [constants]:
+            for column in row:
+                if column not in self.columns:
+                    self.columns[column] = [None] * self.n_rows
+
+        for column, values in self.columns.items():
+            if column in constants:
+                values.extend([constants[column]] * len(records))
+            else:
+                values.extend([record.get(column) for record in records])
+
+        self.n_rows += len(records)
+        self.frame = None
+
+    def append_frame(self, frame):
+        """This function appends the rows of a DataFrame, eg. data recovered from a cache."""
+        self.append(frame.to_dict(orient="records"))
+
+    def to_frame(self):
+        """This function returns all rows collected so far as one DataFrame."""
+        if self.frame is None:
+            self.frame = pd.DataFrame(self.columns)
+        return self.frame
+
+    @classmethod
+    def from_frame(cls, frame):
+        accumulator = cls(frame.columns)
+        accumulator.append_frame(frame)
+        return accumulator
@@ -0,0 +1,278 @@
+import os
+import math
+import logging
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from Model_Components.Metrics import metrics
+
+
+class RegionalAggregates:
+    """This class keeps summary tables of the clean data per region and per postcode, broken down by property type and
+    bedrooms, in a SQLite file. Every group holds its number of listings, the sum, minimum and maximum of the prices,
+    a quantile sketch of the prices and the number of descriptions that mention each phrase of the text values.
+    All of these can be merged by adding them up, so the state is updated chunk by chunk as the clean data comes in,
+    and coarser summaries (eg. per region over all property types) are computed from the small tables with SQL.
+    Listings count with their sampling_weight, if any (see DataTransformer.add_sampling_weights).
+
+    The state is kept per run (run_id), and aggregating a run again replaces it. Runs with incremental=True stop
+    paginating early, so they only describe the newest listings of every postcode.
+
+    Price quantiles come from a DDSketch: prices fall in logarithmic buckets, bucket i holding (gamma^(i-1), gamma^i]
+    with gamma = (1 + relative_accuracy) / (1 - relative_accuracy). Every estimated quantile is within
+    relative_accuracy of the true price, whatever the number of listings."""
+
+    # The keys every level is broken down by, starting with the column of the area. Postcodes hold few listings
+    # each, so they are not broken down further.
+    levels = {"region": ["region", "property_type", "bedrooms"], "postcode": ["postcode"]}
+
+    def __init__(self, path=None, run_id=None, relative_accuracy=0.01):
+        self.path = path or os.path.join(os.getcwd(), "Outputs", "Aggregates", "aggregates.sqlite")
+        self.run_id = run_id
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")  # the aggregates can be computed again from the data
+        self.connection.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value REAL)")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS groups (
+                run_id TEXT,
+                level TEXT,
+                area TEXT,
+                property_type TEXT,
+                bedrooms INTEGER,
+                region TEXT,
+                listings INTEGER,
+                weight REAL,
+                priced REAL,
+                price_sum REAL,
+                price_min REAL,
+                price_max REAL,
+                PRIMARY KEY (run_id, level, area, property_type, bedrooms)
+            ) WITHOUT ROWID""")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS price_sketches (
+                run_id TEXT,
+                level TEXT,
+                area TEXT,
+                property_type TEXT,
+                bedrooms INTEGER,
+                bucket INTEGER,
+                count REAL,
+                PRIMARY KEY (run_id, level, area, property_type, bedrooms, bucket)
+            ) WITHOUT ROWID""")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS phrases (
+                run_id TEXT,
+                level TEXT,
+                area TEXT,
+                property_type TEXT,
+                bedrooms INTEGER,
+                phrase TEXT,
+                mined REAL,
+                hits REAL,
+                PRIMARY KEY (run_id, level, area, property_type, bedrooms, phrase)
+            ) WITHOUT ROWID""")
+
+        # Buckets of one database must all have the same width, so the accuracy it was created with is kept
+        self.connection.execute("INSERT OR IGNORE INTO settings VALUES ('relative_accuracy', ?)", (relative_accuracy,))
+        self.relative_accuracy = self.connection.execute(
+            "SELECT value FROM settings WHERE name = 'relative_accuracy'").fetchone()[0]
+        if self.relative_accuracy != relative_accuracy:
+            logging.info(f"The aggregates in {self.path} use a relative accuracy of {self.relative_accuracy}, "
+                         f"instead of {relative_accuracy}.")
+        self.connection.commit()
+        self.gamma = (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+
+    def reset(self):
+        """This function removes the state of this run, before it is aggregated (again) from the start."""
+        with self.lock:
+            for table in ("groups", "price_sketches", "phrases"):
+                self.connection.execute(f"DELETE FROM {table} WHERE run_id = ?", (self.run_id,))
+            self.connection.commit()
+
+    def add(self, clean_data):
+        """This function adds a chunk of clean data to the state of this run. Chunks must not overlap, which
+        holds for the chunks of DataTransformer.stream_clean_data."""
+        if clean_data is None or clean_data.empty:
+            return
+
+        with metrics.timer("aggregation_seconds"):
+            listings = self.group_keys(clean_data)
+            phrase_data = clean_data[[column for column in clean_data.columns if clean_data[column].dtype == "boolean"]]
+            rows = {"groups": [], "price_sketches": [], "phrases": []}
+            for level, keys in self.levels.items():
+                rows["groups"] += self.group_rows(level, listings, keys)
+                rows["price_sketches"] += self.sketch_rows(level, listings, keys)
+                rows["phrases"] += self.phrase_rows(level, listings, keys, phrase_data)
+
+            with self.lock:
+                self.connection.executemany("""
+                    INSERT INTO groups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (run_id, level, area, property_type, bedrooms) DO UPDATE SET
+                        listings = groups.listings + excluded.listings,
+                        weight = groups.weight + excluded.weight,
+                        priced = groups.priced + excluded.priced,
+                        price_sum = groups.price_sum + excluded.price_sum,
+                        price_min = COALESCE(MIN(groups.price_min, excluded.price_min), groups.price_min,
+                                             excluded.price_min),
+                        price_max = COALESCE(MAX(groups.price_max, excluded.price_max), groups.price_max,
+                                             excluded.price_max)
+                    """, rows["groups"])
+                self.connection.executemany("""
+                    INSERT INTO price_sketches VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (run_id, level, area, property_type, bedrooms, bucket) DO UPDATE SET
+                        count = price_sketches.count + excluded.count
+                    """, rows["price_sketches"])
+                self.connection.executemany("""
+                    INSERT INTO phrases VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (run_id, level, area, property_type, bedrooms, phrase) DO UPDATE SET
+                        mined = phrases.mined + excluded.mined,
+                        hits = phrases.hits + excluded.hits
+                    """, rows["phrases"])
+                self.connection.commit()
+
+        metrics.increment("aggregated_listings_total", len(clean_data))
+
+    def tap(self, clean_chunks):
+        """This function adds every chunk of a stream of clean data and passes it on (eg. to DataExporter)."""
+        for clean_chunk in clean_chunks:
+            self.add(clean_chunk)
+            yield clean_chunk
+
+    @staticmethod
+    def group_keys(clean_data):
+        """Missing property types and bedrooms are stored as '' and -1, as SQLite keys can not be missing."""
+        def column(name, default):
+            return clean_data[name] if name in clean_data.columns else pd.Series(default, index=clean_data.index)
+
+        price = pd.to_numeric(column("price", np.nan), errors="coerce").astype("float64")
+        return pd.DataFrame({
+            "region": column("region_gpt", "").astype("string").fillna("").to_numpy(object),
+            "postcode": column("postcode", "").astype("string").fillna("").to_numpy(object),
+            "property_type": column("property_type", "").astype("string").fillna("").to_numpy(object),
+            "bedrooms": pd.to_numeric(column("bedrooms", -1)).astype("Int64").fillna(-1).to_numpy("int64"),
+            "weight": column("sampling_weight", 1.0).astype("float64").to_numpy(),
+            "price": price.where(price > 0).to_numpy(),  # prices of 0 (or below) are treated as missing
+        })
+
+    def group_rows(self, level, listings, keys):
+        priced = listings["price"].notna()
+        groups = listings.assign(
+            priced=listings["weight"].where(priced, 0.0),
+            price_sum=(listings["price"] * listings["weight"]).where(priced, 0.0),
+        ).groupby(keys, sort=False).agg(area_region=("region", "first"), listings=("weight", "size"),
+                                        weight=("weight", "sum"), priced=("priced", "sum"),
+                                        price_sum=("price_sum", "sum"), price_min=("price", "min"),
+                                        price_max=("price", "max"))
+        return self.table_rows(level, groups, ["area_region", "listings", "weight", "priced", "price_sum", "price_min",
+                                               "price_max"])
+
+    def sketch_rows(self, level, listings, keys):
+        priced = listings[listings["price"].notna()]
+        buckets = np.ceil(np.log(priced["price"].to_numpy()) / math.log(self.gamma)).astype("int64")
+        counts = priced.assign(bucket=buckets).groupby(keys + ["bucket"], sort=True)["weight"].sum()
+        return self.table_rows(level, counts.rename("count"), ["bucket", "count"])
+
+    def phrase_rows(self, level, listings, keys, phrase_data):
+        rows = []
+        for phrase in phrase_data.columns:
+            found = phrase_data[phrase].to_numpy(dtype="float64", na_value=np.nan)
+            counts = listings[keys].assign(
+                mined=np.where(np.isnan(found), 0.0, listings["weight"]),  # listings with a description
+                hits=np.where(found == 1, listings["weight"], 0.0),
+            ).groupby(keys, sort=False)[["mined", "hits"]].sum()
+            rows += self.table_rows(level, counts.assign(phrase=phrase), ["phrase", "mined", "hits"])
+        return rows
+
+    def table_rows(self, level, grouped, columns):
+        """This function turns values grouped by the keys of a level into rows of a table. Keys the level is not
+        broken down by are stored as missing ('' and -1)."""
+        grouped = grouped.reset_index().rename(columns={self.levels[level][0]: "area"})
+        grouped = grouped.assign(run_id=self.run_id, level=level,
+                                 property_type=grouped.get("property_type", ""), bedrooms=grouped.get("bedrooms", -1))
+        grouped = grouped[["run_id", "level", "area", "property_type", "bedrooms"] + columns].astype(object)
+        return list(grouped.where(grouped.notna(), None).itertuples(index=False, name=None))
+
+    def runs(self):
+        with self.lock:
+            return [run_id for (run_id,) in self.connection.execute(
+                "SELECT DISTINCT run_id FROM groups ORDER BY run_id")]
+
+    def summary(self, level="region", by=None, quantiles=(0.25, 0.5, 0.75), run_ids=None):
+        """This function returns one row per area and combination of the keys in by (all keys of the level by
+        default) with the number of listings, the mean, minimum, maximum and quantiles of the price and, per phrase,
+        the share of descriptions that mention it. The given runs (by default this run, or else the latest) are
+        merged into one summary."""
+        if level not in self.levels:
+            raise ValueError(f"Unknown level {level}, choose from {list(self.levels)}")
+        by = self.levels[level][1:] if by is None else list(by)
+        if not set(by) <= set(self.levels[level][1:]):
+            raise ValueError(f"The {level} level is only broken down by {self.levels[level][1:]}")
+        run_ids = run_ids or [self.run_id or (self.runs() or [None])[-1]]
+
+        keys = ["area"] + by
+        select = ", ".join(keys)
+        where = f"level = ? AND run_id IN ({','.join('?' * len(run_ids))})"
+        params = [level] + list(run_ids)
+
+        with self.lock:
+            groups = pd.read_sql_query(f"""
+                SELECT {select}, MIN(region) AS region, SUM(listings) AS listings, SUM(weight) AS weight,
+                       SUM(price_sum) / NULLIF(SUM(priced), 0) AS mean_price, MIN(price_min) AS min_price,
+                       MAX(price_max) AS max_price
+                FROM groups WHERE {where} GROUP BY {select} ORDER BY {select}""", self.connection, params=params)
+            sketches = pd.read_sql_query(f"""
+                SELECT {select}, bucket, SUM(count) AS count
+                FROM price_sketches WHERE {where} GROUP BY {select}, bucket ORDER BY {select}, bucket""",
+                self.connection, params=params)
+            phrases = pd.read_sql_query(f"""
+                SELECT {select}, phrase, SUM(hits) / NULLIF(SUM(mined), 0) AS share
+                FROM phrases WHERE {where} GROUP BY {select}, phrase""", self.connection, params=params)
+
+        summary = groups.set_index(keys)
+        for q, values in self.quantiles(sketches, keys, quantiles).items():
+            values = values.reindex(summary.index)
+            summary[f"p{round(q * 100):g}_price"] = values.clip(summary["min_price"], summary["max_price"]).round()
+        if not phrases.empty:
+            summary = summary.join(phrases.pivot_table(index=keys, columns="phrase", values="share", dropna=False))
+
+        if level == "region":
+            summary = summary.drop(columns="region")
+        summary = summary.reset_index().rename(columns={"area": level})
+        if "property_type" in summary.columns:
+            summary["property_type"] = summary["property_type"].replace("", pd.NA)
+        if "bedrooms" in summary.columns:
+            summary["bedrooms"] = summary["bedrooms"].astype("Int8").replace(-1, pd.NA)
+        return summary
+
+    def quantiles(self, sketches, keys, quantiles):
+        """This function finds the bucket every quantile falls in, per group, and estimates the price as the point in
+        the bucket with the same relative error to both of its ends."""
+        cumulative = sketches.groupby(keys, sort=False)["count"].cumsum()
+        total = sketches.groupby(keys, sort=False)["count"].transform("sum")
+        values = {}
+        for q in quantiles:
+            reached = sketches[cumulative >= q * total * (1 - 1e-9)]
+            buckets = reached.groupby(keys, sort=True)["bucket"].first()
+            values[q] = 2 * self.gamma ** buckets.astype("float64") / (self.gamma + 1)
+        return values
+
+    def export_summaries(self, directory=None):
+        """This function saves the summaries of this run that dashboards start from: per region by property type
+        and bedrooms, and per postcode."""
+        directory = directory or os.path.join(os.path.dirname(os.path.abspath(self.path)), f"run_id={self.run_id}")
+        os.makedirs(directory, exist_ok=True)
+        self.summary("region").to_csv(os.path.join(directory, "region.csv"), index=False)
+        self.summary("postcode").to_csv(os.path.join(directory, "postcode.csv"), index=False)
+        logging.info(f"Regional aggregates saved in: {directory}")
+        return directory
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
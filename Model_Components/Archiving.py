@@ -0,0 +1,141 @@
+import os
+import gzip
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+
+from Model_Components.Metrics import metrics
+
+
+class PageArchive:
+    """This class keeps a copy of every fetched results page on disk, so pages can be processed again without
+    scraping Rightmove (see ReplayBackend).
+    Pages are stored gzip compressed under the hash of their key (the results URL, which includes the page index):
+        Outputs/Archive/pages/<2 characters of the hash>/<hash>.html.gz
+    A small SQLite index keeps track of when each page was stored and last used. Pages older than ttl_days are
+    evicted, and once the archive grows past max_size_mb, the least recently used pages are evicted first."""
+
+    evict_every = 500  # check for pages to evict after this many new pages
+
+    def __init__(self, directory=None, ttl_days=30, max_size_mb=2000):
+        self.directory = directory or os.path.join(os.getcwd(), "Outputs", "Archive")
+        self.ttl_days = ttl_days
+        self.max_size_mb = max_size_mb
+        self.lock = threading.Lock()  # scraping workers share the connection
+        self.puts_since_eviction = 0
+
+        os.makedirs(os.path.join(self.directory, "pages"), exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(self.directory, "archive.sqlite"), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")  # the pages can be scraped again, no need to fsync
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                digest TEXT,
+                size INTEGER,
+                stored REAL,
+                accessed REAL
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed)")
+        self.connection.commit()
+        self.evict()
+
+    @staticmethod
+    def digest(key):
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+    def page_path(self, digest):
+        return os.path.join(self.directory, "pages", digest[:2], f"{digest}.html.gz")
+
+    def get(self, key):
+        """This function returns the archived content of a key, or None if it was never stored (or evicted)."""
+        with self.lock:
+            row = self.connection.execute("SELECT digest FROM pages WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.connection.execute("UPDATE pages SET accessed = ? WHERE key = ?", (time.time(), key))
+                self.connection.commit()
+
+        content = None
+        if row is not None:
+            try:
+                with gzip.open(self.page_path(row[0]), 'rt', encoding='utf-8') as f:
+                    content = f.read()
+            except OSError:  # the file was removed by hand
+                pass
+
+        if content is None:
+            metrics.increment("archive_misses_total")
+            return None
+
+        metrics.increment("archive_hits_total")
+        return content
+
+    def put(self, key, content):
+        """This function stores the content of a key, replacing an earlier version."""
+        digest = self.digest(key)
+        page_path = self.page_path(digest)
+        os.makedirs(os.path.dirname(page_path), exist_ok=True)
+
+        compressed = gzip.compress(content.encode("utf-8"), compresslevel=6)
+        temporary_path = f"{page_path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(temporary_path, page_path)
+
+        now = time.time()
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO pages (key, digest, size, stored, accessed) "
+                                    "VALUES (?, ?, ?, ?, ?)", (key, digest, len(compressed), now, now))
+            self.connection.commit()
+            self.puts_since_eviction += 1
+            evict = self.puts_since_eviction >= self.evict_every
+
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """This function removes expired pages, and then the least recently used pages until the archive fits."""
+        with self.lock:
+            self.puts_since_eviction = 0
+            evicted = []
+            if self.ttl_days:
+                evicted += self.connection.execute("SELECT key, digest FROM pages WHERE stored < ?",
+                                                   (time.time() - self.ttl_days * 86400,)).fetchall()
+                self.connection.executemany("DELETE FROM pages WHERE key = ?", [(key,) for key, _ in evicted])
+
+            if self.max_size_mb:
+                max_size = self.max_size_mb * 1024 ** 2
+                total_size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+                if total_size > max_size:
+                    least_recently_used = []
+                    for key, digest, size in self.connection.execute(
+                            "SELECT key, digest, size FROM pages ORDER BY accessed").fetchall():
+                        if total_size <= max_size * 0.9:  # leave some room, so eviction does not run on every page
+                            break
+                        least_recently_used.append((key, digest))
+                        total_size -= size
+                    self.connection.executemany("DELETE FROM pages WHERE key = ?",
+                                                [(key,) for key, _ in least_recently_used])
+                    evicted += least_recently_used
+
+            self.connection.commit()
+            if not evicted:
+                return
+
+        for _, digest in evicted:
+            try:
+                os.remove(self.page_path(digest))
+            except OSError:
+                pass
+        metrics.increment("archive_evictions_total", len(evicted))
+        logging.info(f"Evicted {len(evicted)} pages from the page archive.")
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
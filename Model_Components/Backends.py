@@ -0,0 +1,410 @@
+import gzip
+import json
+import logging
+import os
+import time
+import threading
+import http.client
+from contextlib import contextmanager
+from queue import Queue, Empty, Full
+from urllib.parse import urlsplit, urlencode
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from Model_Components.Archiving import PageArchive
+from Model_Components.Metrics import metrics, BYTE_BUCKETS
+from Model_Components.Parsing import HtmlDocument
+from Model_Components.Scheduling import RequestScheduler
+from Model_Components.Sessions import BrowserPool
+
+"""This file contains the backends that DataScraper uses to fetch result pages. A backend opens the results for a
+postcode at any page, reports how many pages there are and returns the property cards on the current page.
+Result pages are opened directly by URL, using the postcode's Rightmove location identifier, which is looked up once
+and cached on disk. Cards returned by every backend support find_element(By.CSS_SELECTOR, ...) and .text, like
+Selenium web elements. Every request to the website goes through the backend's RequestScheduler, which paces and
+retries them. With a PageArchive, every fetched page is also recorded on disk, and ReplayBackend processes the
+recorded pages again without any requests."""
+
+
+class HttpError(Exception):
+    """Raised when the website answers with an error status."""
+
+
+class ConnectionPool:
+    """This class keeps a number of keep-alive HTTP connections to one host open, so pages are fetched without a new
+    TCP/TLS handshake each time. The scraping workers fetch concurrently, each on a connection of its own."""
+
+    def __init__(self, base_url, size=1, timeout=30):
+        parsed_url = urlsplit(base_url)
+        self.scheme = parsed_url.scheme
+        self.host = parsed_url.netloc
+        self.timeout = timeout
+        self.idle_connections = Queue(maxsize=size)
+        self.headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                          "Chrome/112.0.0.0 Safari/537.36",
+            "Accept": "text/html,application/json;q=0.9,*/*;q=0.8",
+            "Accept-Encoding": "gzip",
+            "Connection": "keep-alive",
+        }
+
+    def new_connection(self):
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, timeout=self.timeout)
+
+    def fetch(self, path):
+        """This function GETs a path on the host and returns the decoded body."""
+        try:
+            connection = self.idle_connections.get_nowait()
+            reused = True
+        except Empty:
+            connection = self.new_connection()
+            reused = False
+
+        try:
+            response, body = self.send(connection, path)
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            if not reused:
+                raise
+            # The server may have closed an idle keep-alive connection, try once more on a fresh one
+            connection = self.new_connection()
+            response, body = self.send(connection, path)
+
+        if response.will_close:
+            connection.close()
+        else:
+            try:
+                self.idle_connections.put_nowait(connection)
+            except Full:
+                connection.close()
+
+        if response.status >= 400:
+            raise HttpError(f"GET {path} returned status {response.status}")
+
+        return body
+
+    def send(self, connection, path):
+        connection.request("GET", path, headers=self.headers)
+        response = connection.getresponse()
+        body = response.read()
+        if response.getheader("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return response, body.decode(response.headers.get_content_charset() or "utf-8", errors="replace")
+
+    def close(self):
+        while True:
+            try:
+                self.idle_connections.get_nowait().close()
+            except Empty:
+                break
+
+
+class LocationResolver:
+    """This class looks up Rightmove's location identifier (eg. OUTCODE^1234) of a postcode through the typeahead
+    service. Identifiers never change, so they are kept in a file and every postcode is only looked up once."""
+
+    def __init__(self, connection_pool, scheduler, path=None):
+        self.connection_pool = connection_pool
+        self.scheduler = scheduler
+        self.path = path or os.path.join(os.getcwd(), "Outputs", "Cache", "locations.json")
+        self.lock = threading.Lock()
+
+        self.locations = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.locations = json.load(f)
+
+    def resolve(self, postal_code):
+        if postal_code in self.locations:
+            return self.locations[postal_code]
+
+        # The typeahead service expects the query split into chunks of two characters: AB10 -> AB/10/
+        query = postal_code.upper().replace(" ", "")
+        chunks = "/".join(query[i:i + 2] for i in range(0, len(query), 2))
+        response = json.loads(self.scheduler.call(self.connection_pool.fetch, f"/typeAhead/uknostreet/{chunks}/"))
+        locations = response.get("typeAheadLocations", [])
+        exact_matches = [location for location in locations
+                         if location.get("normalisedSearchTerm", "").replace(" ", "") == query]
+        location_identifier = (exact_matches or locations or [{}])[0].get("locationIdentifier")
+
+        if location_identifier is None:
+            raise HttpError(f"Could not find a Rightmove location for postcode {postal_code}")
+
+        with self.lock:
+            self.locations[postal_code] = location_identifier
+            self.save()
+        return location_identifier
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump(self.locations, f)
+        os.replace(temporary_path, self.path)
+
+
+class ResultsPage:
+    """This class holds the state of one postcode's search results: where they are, which page is open and the
+    HTML of the page (HTTP backend) or the browser showing it (Selenium backend)."""
+
+    def __init__(self, location_identifier, page_index, html=None, browser=None):
+        self.location_identifier = location_identifier
+        self.page_index = page_index
+        self.html = html
+        self.browser = browser
+        self.parsed_html = None
+        self.parsed_document = None
+        self.load_seconds = None  # how long the browser took to show the page
+        self.transferred_bytes = None  # bytes the browser transferred for the page, if traffic is measured
+
+    @property
+    def document(self):
+        """The HTML is only parsed when it is used, so a page can be fetched in one thread and parsed in another."""
+        if self.parsed_document is None or self.parsed_html is not self.html:
+            self.parsed_document = HtmlDocument(self.html or "")
+            self.parsed_html = self.html
+        return self.parsed_document
+
+
+class ScrapingBackend:
+    """This class is the interface every scraping backend implements."""
+
+    results_per_page = 24
+    pipelined = True  # pages can be processed from a snapshot, while the next page loads
+
+    def __init__(self, n_workers=1, rate_settings=None, base_url="https://www.rightmove.co.uk", timeout=30,
+                 archive=None):
+        self.n_workers = n_workers
+        self.base_url = base_url
+        self.archive = archive  # PageArchive that records every fetched results page, if any
+        self.scheduler = RequestScheduler(**(rate_settings or {}))
+        self.connection_pool = ConnectionPool(base_url, size=n_workers, timeout=timeout)
+        self.location_resolver = LocationResolver(self.connection_pool, self.scheduler)
+
+    @contextmanager
+    def session(self):
+        """This function lends out whatever a worker needs to scrape one postcode (a browser, a connection...)."""
+        raise NotImplementedError
+
+    def load_for_postal(self, session, postal_code, page_index=0):
+        """This function opens the given page of properties for the postcode and returns a page handle."""
+        raise NotImplementedError
+
+    def load_page(self, page, page_index):
+        """This function opens another page of the same postcode."""
+        raise NotImplementedError
+
+    def flip_page(self, page):
+        """This function flips to the next page in the list of properties."""
+        self.load_page(page, page.page_index + 1)
+
+    def record_depth(self, page):
+        """This function records how many pages there are on the website for the postcode."""
+        raise NotImplementedError
+
+    def property_elements(self, page):
+        """This function returns the property cards on the current page."""
+        raise NotImplementedError
+
+    def snapshot(self, page):
+        """This function returns a copy of the current page that stays the same when the page is flipped, so it can
+        be processed while the next page loads (see DataScraper.pipelined_postcodes)."""
+        return ResultsPage(page.location_identifier, page.page_index, html=page.html)
+
+    def results_path(self, location_identifier, page_index):
+        query = {"locationIdentifier": location_identifier}
+        if page_index:
+            query["index"] = page_index * self.results_per_page
+        return f"/property-for-sale/find.html?{urlencode(query)}"
+
+    def page_loaded(self, session):
+        """This function is called after each scraped page, so backends can keep track of usage."""
+
+    def archive_page(self, path, html):
+        if self.archive is not None:
+            self.archive.put(path, html)
+
+    def shutdown(self):
+        """This function releases all resources held by the backend."""
+        self.connection_pool.close()
+        if self.archive is not None:
+            self.archive.close()
+
+
+class SeleniumBackend(ScrapingBackend):
+    """This class scrapes Rightmove with pooled Chrome browsers. Every page is rendered, by default without images,
+    fonts and trackers (see BrowserProfile, set through session_settings["profile"]).
+    With bulk_extraction, the rendered page is pulled out of the browser in one page_source call and the cards are
+    parsed locally, instead of one WebDriver round trip per field of every card. It is off by default: the cards are
+    read from the browser one field at a time, until the parsed pages are shown to give identical rows on the live
+    website (compare the extraction_seconds metric and the rows of both settings)."""
+
+    def __init__(self, n_workers=1, session_settings=None, bulk_extraction=False, rate_settings=None, page_timeout=30,
+                 archive=None, base_url="https://www.rightmove.co.uk"):
+        super().__init__(n_workers, rate_settings, base_url=base_url, archive=archive)
+        # Browser sessions are borrowed from the pool and reused across postcodes, one per worker
+        self.browser_pool = BrowserPool(size=n_workers, **(session_settings or {}))
+        self.bulk_extraction = bulk_extraction
+        self.pipelined = bulk_extraction  # web elements go stale once the browser moves on, page source does not
+        self.page_timeout = page_timeout  # seconds to wait for the results to appear after a page change
+
+    @contextmanager
+    def session(self):
+        with self.browser_pool.session() as session:
+            yield session
+
+    def load_for_postal(self, session, postal_code, page_index=0):
+        location_identifier = self.location_resolver.resolve(postal_code)
+        page = ResultsPage(location_identifier, None, browser=session.browser)
+        self.load_page(page, page_index)
+        return page
+
+    def load_page(self, page, page_index):
+        path = self.results_path(page.location_identifier, page_index)
+        page.load_seconds = self.scheduler.call(self.open_url, page.browser, self.base_url + path)
+        page.page_index = page_index
+        self.measure_traffic(page)
+        if self.archive is not None:
+            self.archive_page(path, page.browser.page_source)
+
+    def open_url(self, browser, url):
+        """This function opens a page and returns how long it took, from the request until the results show."""
+        start_time = time.perf_counter()
+        browser.get(url)
+        self.wait_for_results(browser)
+        load_seconds = time.perf_counter() - start_time
+        metrics.observe("browser_load_seconds", load_seconds)
+        return load_seconds
+
+    def measure_traffic(self, page):
+        """This function records the bytes the browser transferred since the previous page (see BrowserProfile)."""
+        traffic = self.browser_pool.profile.read_traffic(page.browser)
+        if traffic is None:
+            return
+        page.transferred_bytes, blocked_requests = traffic
+        metrics.observe("page_bytes", page.transferred_bytes, buckets=BYTE_BUCKETS)
+        metrics.increment("transferred_bytes_total", page.transferred_bytes)
+        metrics.increment("requests_blocked_total", blocked_requests)
+
+    def wait_for_results(self, browser):
+        """This function waits until the results page shows its property cards (or its pagination, if it is empty)."""
+        WebDriverWait(browser, self.page_timeout).until(EC.any_of(
+            EC.presence_of_element_located((By.CSS_SELECTOR, '.l-searchResult.is-list')),
+            EC.presence_of_element_located((By.CSS_SELECTOR, 'div.pagination-pageSelect'))))
+
+    def record_depth(self, page):
+        try:
+            pages_string = page.browser.find_element(By.CSS_SELECTOR, 'div.pagination-pageSelect').text
+            return int(pages_string.split()[-1]) if pages_string else 0
+        except Exception:
+            logging.info("Could not find the amount of pages on the results page.")
+            return 0
+
+    def snapshot(self, page):
+        return ResultsPage(page.location_identifier, page.page_index, html=page.browser.page_source)
+
+    def property_elements(self, page):
+        if page.html is not None:  # a snapshot
+            return page.document.find_elements(By.CSS_SELECTOR, '.l-searchResult.is-list')
+        if self.bulk_extraction:
+            return HtmlDocument(page.browser.page_source).find_elements(By.CSS_SELECTOR, '.l-searchResult.is-list')
+        return page.browser.find_elements(By.CSS_SELECTOR, '.l-searchResult.is-list')
+
+    def page_loaded(self, session):
+        session.pages_loaded += 1
+
+    def shutdown(self):
+        super().shutdown()
+        self.browser_pool.shutdown()
+
+
+class HttpBackend(ScrapingBackend):
+    """This class scrapes Rightmove over plain HTTP and parses the server-rendered result pages locally.
+    No browser is involved, so a page costs a fraction of the CPU and memory of the Selenium backend."""
+
+    def __init__(self, n_workers=1, base_url="https://www.rightmove.co.uk", timeout=30, rate_settings=None,
+                 archive=None):
+        super().__init__(n_workers, rate_settings, base_url=base_url, timeout=timeout, archive=archive)
+
+    @contextmanager
+    def session(self):
+        yield self.connection_pool
+
+    def load_for_postal(self, session, postal_code, page_index=0):
+        location_identifier = self.location_resolver.resolve(postal_code)
+        page = ResultsPage(location_identifier, None)
+        self.load_page(page, page_index)
+        return page
+
+    def load_page(self, page, page_index):
+        path = self.results_path(page.location_identifier, page_index)
+        html = self.scheduler.call(self.connection_pool.fetch, path)
+        self.archive_page(path, html)
+        page.html = html
+        page.page_index = page_index
+
+    def record_depth(self, page):
+        try:
+            pages_string = page.document.find_element(By.CSS_SELECTOR, 'div.pagination-pageSelect').text
+            return int(pages_string.split()[-1]) if pages_string else 0
+        except Exception:
+            logging.info("Could not find the amount of pages on the results page.")
+            return 0
+
+    def property_elements(self, page):
+        return page.document.find_elements(By.CSS_SELECTOR, '.l-searchResult.is-list')
+
+
+class ReplayBackend(HttpBackend):
+    """This class scrapes the pages recorded in a PageArchive instead of Rightmove, at the speed of the disk.
+    Postcodes are found through the location cache of earlier runs. Postcodes and pages that were never recorded
+    come back empty."""
+
+    def load_for_postal(self, session, postal_code, page_index=0):
+        location_identifier = self.location_resolver.locations.get(postal_code)
+        page = ResultsPage(location_identifier, None)
+        if location_identifier is None:
+            logging.info(f"Postcode {postal_code} was never scraped, it has no pages to replay.")
+            page.html = ""
+            page.page_index = page_index
+            return page
+
+        self.load_page(page, page_index)
+        return page
+
+    def load_page(self, page, page_index):
+        path = self.results_path(page.location_identifier, page_index)
+        html = self.archive.get(path)
+        if html is None:
+            logging.info(f"Page {path} is not in the archive, replaying it as an empty page.")
+        page.html = html or ""
+        page.page_index = page_index
+
+
+def make_backend(backend, n_workers=1, session_settings=None, rate_settings=None, archive_settings=None):
+    """This function turns the backend setting into a backend. Besides 'selenium', 'http' and 'replay', an already
+    configured ScrapingBackend can be passed (eg. an HttpBackend or SeleniumBackend pointed at a local fixture server,
+    to compare browser profiles by the page_bytes and browser_load_seconds metrics).
+    With archive_settings {"record": True}, every fetched page is recorded in a PageArchive. The other archive settings
+    (ttl_days, max_size_mb) are passed on to the archive."""
+    if isinstance(backend, ScrapingBackend):
+        return backend
+
+    archive_settings = dict(archive_settings or {})
+    record = archive_settings.pop("record", False)
+    archive = PageArchive(**archive_settings) if record or backend == "replay" else None
+
+    if backend == "replay":
+        return ReplayBackend(n_workers=n_workers, archive=archive)
+    if backend == "http":
+        return HttpBackend(n_workers=n_workers, rate_settings=rate_settings, archive=archive)
+    if backend in (None, "selenium"):
+        session_settings = dict(session_settings or {})
+        bulk_extraction = session_settings.pop("bulk_extraction", False)
+        return SeleniumBackend(n_workers=n_workers, session_settings=session_settings,
+                               bulk_extraction=bulk_extraction, rate_settings=rate_settings, archive=archive)
+    raise ValueError(f"Unknown scraping backend: {backend}")
@@ -0,0 +1,100 @@
+import os
+import time
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from Model_Components.Scraping import DataScraper
+from Model_Components.Scheduling import RetriesExhausted
+from Model_Components.Metrics import metrics
+
+
+class QueueWorker(DataScraper):
+    """This class inherits from DataScraper and scrapes the tasks of a TaskQueue instead of a sample.
+    Each worker claims a few (postcode, page) tasks at a time, one per scraping thread, keeps their leases alive with a
+    heartbeat thread and stores the rows of every page in the queue. Any number of workers can work on one queue, in
+    one or more processes on one or more machines. The run ends when no task is pending or leased anymore.
+    Incremental runs are not supported, as pages of one postcode can be scraped by different workers."""
+
+    def __init__(self, queue, n_per_region, fields_of_interest, session_settings=None, n_workers=1,
+                 backend="selenium", rate_settings=None, archive_settings=None, poll_interval=5):
+        super().__init__(None, n_per_region, fields_of_interest, session_settings, n_workers, backend,
+                         incremental=False, rate_settings=rate_settings, archive_settings=archive_settings)
+        self.queue = queue
+        self.poll_interval = poll_interval  # seconds to wait for leases of other workers to finish or expire
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.held_tasks = set()
+        self.held_lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def run(self):
+        """This function scrapes tasks until the queue is drained."""
+        heartbeat = threading.Thread(target=self.send_heartbeats, daemon=True)
+        heartbeat.start()
+        executor = ThreadPoolExecutor(max_workers=self.n_workers)
+        logging.info(f"Worker {self.worker_id} started on queue: {self.queue.path}")
+
+        try:
+            while True:
+                tasks = self.queue.claim(self.worker_id, n=self.n_workers)
+                if not tasks:
+                    progress = self.queue.progress()
+                    if not progress["pending"] and not progress["leased"]:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+
+                with self.held_lock:
+                    self.held_tasks.update(tasks)
+                list(executor.map(self.scrape_task, tasks))
+
+                progress = self.queue.progress()
+                logging.info(f"Queue progress: {progress['done']} tasks done, {progress['pending']} pending, "
+                             f"{progress['leased']} leased, {progress['failed']} failed.")
+                metrics.maybe_export()
+        finally:
+            self.stopped.set()
+            executor.shutdown(wait=True)
+            heartbeat.join()
+            self.backend.shutdown()
+
+        logging.info(f"Worker {self.worker_id} finished, the queue is drained.")
+
+    def scrape_task(self, task):
+        """This function scrapes one page of one postcode and hands the rows to the queue. The first page of a postcode
+        also tells the queue how many pages there are."""
+        try:
+            with self.backend.session() as session:
+                with metrics.timer("page_load_seconds"):
+                    results_page = self.backend.load_for_postal(session, task.postcode, task.page)
+                n_pages = self.backend.record_depth(results_page) if task.page == 0 else None
+
+                page_data, _ = self.timed_extraction(results_page, task.postcode, task.page)
+                self.backend.page_loaded(session)
+
+            if self.queue.complete(task, self.worker_id, page_data, n_pages=n_pages):
+                metrics.increment("pages_scraped_total", region=task.region)
+                metrics.increment("listings_scraped_total", len(page_data), region=task.region)
+        except RetriesExhausted as error:
+            # The scheduler already retried the requests of the page, attempting it again would retry the retries
+            logging.info(f"Scraping page {task.page} of {task.postcode} failed after {error.attempts} attempts, "
+                         f"setting it aside: {error.__cause__!r}")
+            self.queue.release(task, self.worker_id, error=repr(error.__cause__), retry=False)
+        except Exception as error:
+            logging.info(f"Scraping page {task.page} of {task.postcode} failed, handing it back to the queue: "
+                         f"{error!r}")
+            self.queue.release(task, self.worker_id, error=repr(error))
+        finally:
+            with self.held_lock:
+                self.held_tasks.discard(task)
+
+    def send_heartbeats(self):
+        """This function renews the leases of the tasks in progress, three times per lease."""
+        while not self.stopped.wait(self.queue.lease_seconds / 3):
+            with self.held_lock:
+                tasks = list(self.held_tasks)
+            try:
+                self.queue.heartbeat(self.worker_id, tasks)
+            except Exception as error:  # a missed heartbeat is retried, the lease only expires after three
+                logging.info(f"Could not renew the task leases: {error!r}")
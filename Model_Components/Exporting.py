@@ -3,22 +3,139 @@ import logging
 from datetime import datetime
 import pandas as pd
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # parquet export is only available when pyarrow is installed
+    pa = None
+    pq = None
+
+
 class DataExporter:
-    """This class is responsible for exporting the clean data to a CSV file."""
-    def __init__(self, clean_data, output_id):
+    """This class is responsible for exporting the clean data (or only what changed since the last run) to a CSV or
+    Parquet file.
+    Parquet files are compressed and written one row group at a time, so data can be streamed in with write() and the
+    full dataset never has to be in memory. Optionally, the files are partitioned by run and region:
+        Outputs/rightmove_data/run_id=<output_id>/region_gpt=<region>/part-0.parquet"""
+
+    partition_column = "region_gpt"
+
+    def __init__(self, clean_data, output_id, export_format="csv", partition=False, compression="zstd",
+                 row_group_size=100000, delta=False, listing_index=None):
         self.clean_data = clean_data
         self.output_id = output_id
+        self.export_format = export_format
+        self.partition = partition
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self.delta = delta  # only export new, changed and removed listings, according to the listing index
+        self.listing_index = listing_index
+
+        if self.export_format == "parquet" and pq is None:
+            logging.info("pyarrow is not installed, exporting to CSV instead of Parquet.")
+            self.export_format = "csv"
+
+        self.writers = {}  # open ParquetWriter per output file
+        self.csv_started = False
 
     def export(self):
         while True:
             try:
                 if self.clean_data is None or (isinstance(self.clean_data, pd.DataFrame) and self.clean_data.empty):
                     break
-                output_path = os.getcwd() + f"/Outputs/rightmove_data_{self.output_id}.csv"
-                self.clean_data.to_csv(output_path, index=False)
+                if self.delta and self.listing_index:
+                    self.clean_data = self.listing_index.delta(self.clean_data)
+                    self.delta = False
+                if self.export_format == "csv":
+                    output_path = self.output_path()
+                    self.clean_data.to_csv(output_path, index=False)
+                else:
+                    for start in range(0, len(self.clean_data), self.row_group_size):
+                        self.write(self.clean_data.iloc[start:start + self.row_group_size])
+                    output_path = self.close()
 
                 logging.info(f"Terminating program. Data saved in the following location: {output_path}")
                 break
             except Exception:
+                self.close()
                 input("Could not save the data! Check if filepath is available before pressing Enter.")
 
+    def export_chunks(self, chunks):
+        """This function exports clean data that arrives in chunks (see DataTransformer.stream_clean_data), so it
+        never has to be in memory at once."""
+        last_chunk = None
+        for chunk in chunks:
+            last_chunk = chunk
+            if self.delta and self.listing_index:
+                chunk = self.listing_index.delta(chunk, removed=False)
+            self.write(chunk)
+
+        if last_chunk is None:
+            logging.info("There is no data to export.")
+            return
+        if self.delta and self.listing_index:
+            self.write(self.listing_index.delta(last_chunk.iloc[:0]))
+
+        output_path = self.close()
+        logging.info(f"Terminating program. Data saved in the following location: {output_path}")
+
+    def write(self, chunk):
+        """This function appends a chunk of clean data to the export, as one row group per output file."""
+        if chunk.empty:
+            return
+
+        if self.export_format == "csv":
+            chunk.to_csv(self.output_path(), mode="a" if self.csv_started else "w", header=not self.csv_started,
+                         index=False)
+            self.csv_started = True
+            return
+
+        if self.partition and self.partition_column in chunk.columns:
+            for region, region_chunk in chunk.groupby(self.partition_column, observed=True, sort=False):
+                self.write_row_group(self.output_path(region), region_chunk.drop(columns=self.partition_column))
+        else:
+            self.write_row_group(self.output_path(), chunk)
+
+    def write_row_group(self, output_path, chunk):
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if output_path not in self.writers:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            self.writers[output_path] = pq.ParquetWriter(output_path, stable_schema(table.schema),
+                                                         compression=self.compression)
+        writer = self.writers[output_path]
+        writer.write_table(table.cast(writer.schema))
+
+    def close(self):
+        """This function finishes all open files and returns where the data was saved."""
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+        return self.output_path(None if not self.partition else "")
+
+    def output_path(self, region=None):
+        outputs_directory = os.getcwd() + "/Outputs"
+        if self.export_format == "csv":
+            return outputs_directory + f"/rightmove_data_{self.output_id}.csv"
+        if not self.partition:
+            return outputs_directory + f"/rightmove_data_{self.output_id}.parquet"
+
+        run_directory = outputs_directory + f"/rightmove_data/run_id={self.output_id}"
+        if not region:
+            return run_directory
+        return run_directory + f"/{self.partition_column}={region}/part-0.parquet"
+
+
+def stable_schema(schema):
+    """Categorical columns are stored as dictionaries, whose index width depends on the number of categories in a
+    chunk. Using 32 bit indices for every chunk lets all row groups share one schema.
+    Columns without any value in the first chunk have the null type, which no later value can be cast to. These are
+    stored as text (the values of a null column of a later chunk can be cast to any type)."""
+    fields = []
+    for field in schema:
+        if pa.types.is_dictionary(field.type):
+            value_type = pa.large_string() if pa.types.is_null(field.type.value_type) else field.type.value_type
+            field = field.with_type(pa.dictionary(pa.int32(), value_type))
+        elif pa.types.is_null(field.type):
+            field = field.with_type(pa.large_string())
+        fields.append(field)
+    return pa.schema(fields, metadata=schema.metadata)
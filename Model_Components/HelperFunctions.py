@@ -3,6 +3,8 @@ import logging
 import os
 from functools import wraps
 
+from Model_Components.Metrics import metrics
+
 """This file contains general set up information and small functionalities
 that don't belong elsewhere."""
 
@@ -32,6 +34,7 @@ def timeit(func):
         result = func(*args, **kwargs)
         end_time = time.perf_counter()
         total_time = end_time - start_time
+        metrics.observe("function_seconds", total_time, function=func.__name__)
         if total_time < 60:
             logging.info(f'Function: {func.__name__} took {total_time:.4f} seconds')
             return result
@@ -45,19 +48,3 @@ def timeit(func):
                 return result
 
     return timeit_wrapper
-
-
-def ensure_connect(func, automatic_attempts=5, sleep_time=10, *args, **kwargs):
-    """This function can be wrapped around a function from the Selenium browser class to handle connection issues."""
-    attempt = 1
-    while True:
-        try:
-            func(*args, **kwargs)
-            break
-        except:
-            logging.info(
-                f"Could not connect to website. Retrying...(automatic attempt {attempt} of {automatic_attempts})")
-            attempt += 1
-            time.sleep(sleep_time)
-            if attempt == automatic_attempts:
-                input("Could not execute the function. Ensure you are connected to the internet and press Enter")
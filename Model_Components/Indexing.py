@@ -0,0 +1,133 @@
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+
+import pandas as pd
+
+
+class ListingIndex:
+    """This class keeps a persistent index of every listing seen across runs, keyed by Rightmove's listing ID.
+    Each listing has a fingerprint of its scraped content, so a refresh can tell new, changed and unchanged listings
+    apart. Listings are marked removed when a postcode was scraped to its last page without them."""
+
+    id_columns = ("listing_id", "postcode", "region_gpt")
+
+    def __init__(self, path=None, run_id=None):
+        self.path = path or os.path.join(os.getcwd(), "Outputs", "Index", "listings.sqlite")
+        self.run_id = run_id
+        self.lock = threading.Lock()  # scraping workers share the connection
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS listings (
+                listing_id TEXT PRIMARY KEY,
+                postcode TEXT,
+                region TEXT,
+                fingerprint TEXT,
+                first_run TEXT,
+                changed_run TEXT,
+                last_run TEXT,
+                removed_run TEXT
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS listings_postcode ON listings (postcode)")
+        self.connection.commit()
+
+    def fingerprint(self, record):
+        content = "\x1f".join(f"{key}={record[key]}" for key in sorted(record) if key not in self.id_columns)
+        return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+    def all_unchanged(self, records):
+        """This function checks if every listing on a page is already known with the same content (and still listed).
+        Such a page means the remaining, older pages of the postcode have been seen before as well."""
+        listing_ids = [record.get("listing_id") for record in records]
+        if not records or None in listing_ids:
+            return False
+
+        with self.lock:
+            placeholders = ",".join("?" * len(listing_ids))
+            known = dict(self.connection.execute(
+                f"SELECT listing_id, fingerprint FROM listings WHERE removed_run IS NULL "
+                f"AND listing_id IN ({placeholders})", listing_ids).fetchall())
+
+        return all(known.get(record["listing_id"]) == self.fingerprint(record) for record in records)
+
+    def record(self, records, postcode, region=None):
+        """This function stores the listings of a scraped page as seen in this run."""
+        rows = [(record["listing_id"], postcode, region, self.fingerprint(record)) for record in records
+                if record.get("listing_id")]
+
+        with self.lock:
+            self.connection.executemany("""
+                INSERT INTO listings (listing_id, postcode, region, fingerprint, first_run, changed_run, last_run)
+                VALUES (?1, ?2, ?3, ?4, ?5, ?5, ?5)
+                ON CONFLICT (listing_id) DO UPDATE SET
+                    postcode = excluded.postcode,
+                    region = excluded.region,
+                    changed_run = CASE WHEN listings.fingerprint != excluded.fingerprint
+                                       OR listings.removed_run IS NOT NULL
+                                  THEN excluded.last_run ELSE listings.changed_run END,
+                    fingerprint = excluded.fingerprint,
+                    last_run = excluded.last_run,
+                    removed_run = NULL
+                """, [row + (self.run_id,) for row in rows])
+            self.connection.commit()
+
+    def finish_postcode(self, postcode):
+        """This function marks the listings of a postcode that were not seen in this run as removed.
+        Only call it for postcodes that were scraped up to the last page."""
+        with self.lock:
+            removed = self.connection.execute("""
+                UPDATE listings SET removed_run = ?1
+                WHERE postcode = ?2 AND last_run != ?1 AND removed_run IS NULL
+                """, (self.run_id, postcode)).rowcount
+            self.connection.commit()
+
+        if removed:
+            logging.info(f"{removed} listings in {postcode} have been removed since the last run.")
+
+    def delta(self, clean_data, removed=True):
+        """This function keeps only the listings that are new or changed in this run and adds the listings that
+        were removed in this run. The 'change' column tells which is which.
+        When the data is processed in chunks, call it with removed=False for every chunk and add the removed listings
+        once, with an empty chunk."""
+        with self.lock:
+            changes = pd.read_sql_query("""
+                SELECT listing_id,
+                       CASE WHEN removed_run = ?1 THEN 'removed'
+                            WHEN first_run = ?1 THEN 'new'
+                            ELSE 'changed' END AS change
+                FROM listings
+                WHERE removed_run = ?1 OR (changed_run = ?1 AND removed_run IS NULL)
+                """, self.connection, params=(self.run_id,))
+            removed_listings = pd.read_sql_query(
+                "SELECT listing_id, postcode, region FROM listings WHERE removed_run = ?1 AND ?2", self.connection,
+                params=(self.run_id, removed))
+
+        listing_ids = clean_data["listing_id"].astype("string")
+        change = listing_ids.map(changes.set_index("listing_id")["change"])
+        delta_data = clean_data.loc[change.notna().to_numpy()].assign(change=change[change.notna()].astype("category"))
+
+        removed_data = pd.DataFrame({
+            "listing_id": pd.to_numeric(removed_listings["listing_id"]).astype(clean_data["listing_id"].dtype),
+            "postcode": removed_listings["postcode"],
+            "region_gpt": removed_listings["region"],
+            "change": "removed",
+        })
+        delta_data = pd.concat([delta_data, removed_data], ignore_index=True)
+
+        # Categories of different frames are concatenated as text, the delta keeps the types of the full export
+        categorical_columns = [column for column in clean_data.columns if clean_data[column].dtype == "category"]
+        for column in categorical_columns + ["change"]:
+            delta_data[column] = delta_data[column].astype("string").astype("category")
+
+        logging.info(f"Delta export: {(change == 'new').sum()} new, {(change == 'changed').sum()} changed and "
+                     f"{len(removed_data)} removed listings.")
+        return delta_data
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
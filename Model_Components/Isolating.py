@@ -0,0 +1,80 @@
+import time
+import logging
+import threading
+from collections import deque
+
+from Model_Components.Metrics import metrics
+
+
+class CircuitOpen(Exception):
+    """Raised when the circuit breaker keeps tripping. Scraping stops, and the run can be resumed later."""
+
+
+class CircuitBreaker:
+    """This class watches the outcomes of the latest postcode attempts of all workers. Once at least failure_rate of
+    the last window attempts failed (and at least min_attempts were made), the breaker trips: no postcode is attempted
+    for cooldown seconds, as the website (or the connection) is most likely down or blocking the scraper.
+    After the cooldown, one postcode is let through as a probe. If it succeeds, scraping continues as before, if it
+    fails the breaker trips again with twice the cooldown (at most max_cooldown). After max_trips trips in a row
+    without a successful probe, CircuitOpen is raised."""
+
+    poll_interval = 1  # seconds between checks of an open breaker
+
+    def __init__(self, failure_rate=0.5, window=20, min_attempts=10, cooldown=60, max_cooldown=900, max_trips=5):
+        self.failure_rate = failure_rate
+        self.min_attempts = min_attempts
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_trips = max_trips
+
+        self.outcomes = deque(maxlen=window)  # True for every attempt that succeeded, False for every failure
+        self.state = "closed"  # "closed": attempts go ahead, "open": cooling down, "half open": a probe is underway
+        self.open_until = 0
+        self.trips = 0  # trips since the last successful probe
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """This function is called before every postcode attempt, and blocks while the breaker is open. The first
+        caller after the cooldown becomes the probe, the others wait for its outcome."""
+        while True:
+            with self.lock:
+                if self.trips >= self.max_trips:
+                    raise CircuitOpen(f"The circuit breaker tripped {self.trips} times in a row.")
+                if self.state == "closed":
+                    return
+                if self.state == "open" and time.monotonic() >= self.open_until:
+                    self.state = "half open"
+                    logging.info("Circuit breaker cooled down, probing the website with the next postcode.")
+                    return
+            time.sleep(self.poll_interval)
+
+    def record(self, success):
+        with self.lock:
+            if self.state == "half open":
+                if success:
+                    logging.info("Probe succeeded, the circuit breaker is closed again.")
+                    self.state = "closed"
+                    self.trips = 0
+                else:
+                    self.trip("the probe failed")
+                return
+            if self.state == "open":  # attempts that were underway when the breaker tripped
+                return
+
+            self.outcomes.append(success)
+            failures = self.outcomes.count(False)
+            if len(self.outcomes) >= self.min_attempts and failures >= self.failure_rate * len(self.outcomes):
+                self.trip(f"{failures} of the last {len(self.outcomes)} postcode attempts failed")
+
+    def trip(self, reason):
+        self.trips += 1
+        self.outcomes.clear()
+        metrics.increment("circuit_trips_total")
+        if self.trips >= self.max_trips:
+            logging.info(f"The circuit breaker tripped {self.trips} times in a row, giving up.")
+            return
+
+        cooldown = min(self.cooldown * 2 ** (self.trips - 1), self.max_cooldown)
+        self.state = "open"
+        self.open_until = time.monotonic() + cooldown
+        logging.info(f"Circuit breaker tripped ({reason}), pausing scraping for {cooldown} seconds.")
@@ -0,0 +1,182 @@
+import csv
+import json
+import logging
+import os
+import shutil
+import pandas as pd
+
+"""This file contains the on-disk side of caching: the journal a scraping run appends to, and the recovery of the
+data of a journal (or of a cache from before the journal) without scraping. It does not depend on the scraping
+backends, so caches can be recovered without loading the browser stack."""
+
+
+class CacheJournal:
+    """This class is an append-only journal of a scraping run. Rows are appended to segment files, and a small
+    manifest records the position of the run and how many rows of each segment are complete.
+    A checkpoint only writes the new rows and the manifest. Small segments are compacted into larger ones as the run
+    grows, and the journals of old runs are removed."""
+
+    segment_rows = 5000  # start a new segment after this many rows
+    max_segments = 8  # compact once this many small segments have been closed
+    keep_caches = 5  # amount of previous journals kept on disk
+
+    def __init__(self, cache_id):
+        self.cache_id = cache_id
+        self.directory = os.path.join(journal_directory(), str(cache_id))
+        self.manifest_path = os.path.join(self.directory, "manifest.json")
+        self.manifest = {"cache_id": cache_id, "params": {}, "segments": [], "next_segment": 1}
+
+        self.segment = None  # manifest entry of the segment that is open for appending
+        self.segment_file = None
+        self.segment_writer = None
+
+    @staticmethod
+    def exists(cache_id):
+        return os.path.exists(os.path.join(journal_directory(), str(cache_id), "manifest.json"))
+
+    def start(self, pc_sample, params):
+        os.makedirs(self.directory, exist_ok=True)
+        pc_sample.to_csv(os.path.join(self.directory, "sample.csv"), index=False)
+        self.manifest["params"] = params
+        self.write_manifest()
+
+    def load(self):
+        with open(self.manifest_path, 'r') as f:
+            self.manifest = json.load(f)
+
+    def load_sample(self):
+        return pd.read_csv(os.path.join(self.directory, "sample.csv"))
+
+    def append(self, records, params, **constants):
+        """This function appends rows to the open segment and then commits them, with params, to the manifest."""
+        if records:
+            columns = list(records[0]) + [column for column in constants if column not in records[0]]
+            if self.segment is None or self.segment["columns"] != columns \
+                    or self.segment["rows"] >= self.segment_rows:
+                self.open_segment(columns)
+
+            for record in records:
+                self.segment_writer.writerow([constants[column] if column in constants else record.get(column)
+                                              for column in columns])
+            self.segment_file.flush()
+            os.fsync(self.segment_file.fileno())
+            self.segment["rows"] += len(records)
+
+        self.manifest["params"] = params
+        self.write_manifest()
+
+        closed_segments = [segment for segment in self.manifest["segments"][:-1] if not segment["compacted"]]
+        if len(closed_segments) >= self.max_segments:
+            self.compact(closed_segments)
+
+    def open_segment(self, columns):
+        self.close()
+        name = f"segment_{self.manifest['next_segment']:05d}.csv"
+        self.manifest["next_segment"] += 1
+
+        self.segment_file = open(os.path.join(self.directory, name), 'w', newline='', encoding='utf-8')
+        self.segment_writer = csv.writer(self.segment_file)
+        self.segment_writer.writerow(columns)
+        self.segment = {"name": name, "rows": 0, "columns": columns, "compacted": False}
+        self.manifest["segments"].append(self.segment)
+
+    def write_manifest(self):
+        """The manifest is replaced atomically, so a crash leaves either the old or the new version behind."""
+        temporary_path = self.manifest_path + ".tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump(self.manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, self.manifest_path)
+
+    def read_segment(self, segment):
+        # Rows written after the last manifest update were never committed and are ignored
+        return pd.read_csv(os.path.join(self.directory, segment["name"]), nrows=segment["rows"])
+
+    def compact(self, segments):
+        """This function merges closed segments into one, so resuming reads a few large files."""
+        compacted_data = pd.concat([self.read_segment(segment) for segment in segments], ignore_index=True)
+        name = f"segment_{self.manifest['next_segment']:05d}.csv"
+        self.manifest["next_segment"] += 1
+
+        with open(os.path.join(self.directory, name), 'w', newline='', encoding='utf-8') as f:
+            compacted_data.to_csv(f, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+        compacted_segment = {"name": name, "rows": len(compacted_data), "columns": list(compacted_data.columns),
+                             "compacted": True}
+        position = self.manifest["segments"].index(segments[0])
+        self.manifest["segments"] = [segment for segment in self.manifest["segments"] if segment not in segments]
+        self.manifest["segments"].insert(position, compacted_segment)
+        self.write_manifest()
+
+        for segment in segments:
+            os.remove(os.path.join(self.directory, segment["name"]))
+
+    def replay(self):
+        """This function returns all committed rows of the journal as one DataFrame."""
+        segments = [self.read_segment(segment) for segment in self.manifest["segments"] if segment["rows"]]
+        if not segments:
+            return pd.DataFrame()
+        return pd.concat(segments, ignore_index=True)
+
+    def replay_chunks(self, chunk_size):
+        """This function yields the committed rows of the journal in chunks of at most chunk_size rows."""
+        for segment in self.manifest["segments"]:
+            if segment["rows"]:
+                yield from pd.read_csv(os.path.join(self.directory, segment["name"]), nrows=segment["rows"],
+                                       chunksize=chunk_size)
+
+    def close(self):
+        if self.segment_file is not None:
+            self.segment_file.close()
+        self.segment = None
+        self.segment_file = None
+        self.segment_writer = None
+
+    @staticmethod
+    def collect_garbage(keep=5):
+        """This function removes all but the newest journals. Cache IDs are timestamps, so they sort by age."""
+        cache_ids = sorted(os.listdir(journal_directory()), reverse=True)
+        for cache_id in cache_ids[keep:]:
+            shutil.rmtree(os.path.join(journal_directory(), cache_id), ignore_errors=True)
+            logging.info(f"Removed stale cache {cache_id}.")
+
+
+def journal_directory():
+    return os.path.join(os.getcwd(), "Outputs", "Cache", "Journal")
+
+
+class CacheRecover:
+    """This class is responsible for preparing a cache for processing, instead of running the algorithm again."""
+
+    def __init__(self, import_cache):
+        self.import_cache = import_cache
+
+    def recover_cache(self, chunk_size=None):
+        """This function returns the raw data of the cache. With a chunk_size, it returns an iterator of chunks
+        instead, so the raw data never has to fit in memory at once."""
+        if self.import_cache and CacheJournal.exists(self.import_cache):
+            journal = CacheJournal(self.import_cache)
+            journal.load()
+            selected_params = journal.manifest["params"]
+            raw_data = journal.replay_chunks(chunk_size) if chunk_size else journal.replay()
+        elif self.import_cache:  # caches from before the journal was introduced
+            cache_path = os.getcwd() + "/Outputs/Cache/"
+            selected_cache = f"Data/data_{self.import_cache}.csv"
+            try:
+                selected_params = json.load(open(cache_path + f"Params/params_{self.import_cache}.json", 'r'))
+            except:
+                logging.info("Invalid cache! Terminating program.")
+                exit()
+            raw_data = pd.read_csv(cache_path + selected_cache, chunksize=chunk_size)
+        else:
+            return None
+
+        logging.info(f"This is a cache recovery program using cache: {self.import_cache}!")
+        cache_completion = (selected_params['current_completion'] or 0) * 100
+        final_run = selected_params["current_run"]
+        logging.info(f"At failure, cache was {round(cache_completion, 2)}% complete")
+        logging.info(f"This cache could not be completed after {final_run} runs.")
+        return raw_data
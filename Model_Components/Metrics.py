@@ -0,0 +1,239 @@
+import os
+import io
+import json
+import time
+import logging
+import pstats
+import cProfile
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+"""This file contains the metrics of a run: counters and latency histograms of every stage of the scraper.
+All components record into the shared registry below, eg.
+
+    with metrics.timer("page_load_seconds"):
+        ...
+    metrics.increment("pages_scraped_total", region="London")
+
+At the end of a run (and every export_interval seconds during a long run) a summary is written to
+Outputs/Metrics/metrics_<output_id>.json and, in Prometheus' text format, to metrics_<output_id>.prom."""
+
+# Upper bounds (seconds) of the histogram buckets, from 100 microseconds to 2 minutes
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60, 120)
+# Upper bounds (bytes) of the histogram buckets of sizes, from 1KB to 64MB
+BYTE_BUCKETS = tuple(1024 * 2 ** k for k in range(17))
+
+
+class Histogram:
+    """This class counts observations in fixed buckets, so recording one costs a binary search and two additions."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last bucket holds everything above the largest bound
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """This function estimates a quantile by interpolating within the bucket it falls in."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def summary(self):
+        return {"count": self.count, "sum": round(self.sum, 6),
+                "mean": round(self.sum / self.count, 6) if self.count else None,
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95), "p99": self.quantile(0.99)}
+
+
+class Timer:
+    """This class times a with-block into a histogram of the registry."""
+
+    __slots__ = ("registry", "key", "start_time")
+
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.record(self.key, time.perf_counter() - self.start_time)
+        return False
+
+
+class MetricsRegistry:
+    """This class holds the counters and histograms of a run. Metrics are identified by a name and optional labels.
+    Recording is thread safe and cheap enough to be used for every property card."""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+
+        self.output_id = None
+        self.export_interval = None  # seconds between exports during a run, None only exports at the end
+        self.profile_postcode = None  # postcode that is scraped under cProfile
+        self.last_export = time.monotonic()
+
+    def configure(self, output_id, export_interval=60, profile_postcode=None):
+        self.output_id = output_id
+        self.export_interval = export_interval
+        self.profile_postcode = profile_postcode
+        self.last_export = time.monotonic()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+            self.started = time.monotonic()
+
+    @staticmethod
+    def key(name, labels):
+        return (name, tuple(sorted(labels.items()))) if labels else (name, ())
+
+    def increment(self, name, value=1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        """Observations are in seconds by default, other units need their own buckets (eg. BYTE_BUCKETS)."""
+        self.record(self.key(name, labels), value, buckets)
+
+    def record(self, key, value, buckets=DEFAULT_BUCKETS):
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def timer(self, name, **labels):
+        return Timer(self, self.key(name, labels))
+
+    @contextmanager
+    def profile(self, postcode):
+        """This function runs the with-block under cProfile if the postcode is the one selected for profiling.
+        The statistics are saved next to the metrics and the most expensive functions are logged."""
+        if postcode != self.profile_postcode:
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            output_path = self.output_path(f"profile_{postcode.replace(' ', '')}", "prof")
+            profiler.dump_stats(output_path)
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(15)
+            logging.info(f"Profile of postcode {postcode} saved in {output_path}\n{report.getvalue()}")
+
+    def rates(self):
+        """This function computes the pages and listings per second of every region, over the time spent on it."""
+        rates = {}
+        for (name, labels), value in self.counters.items():
+            if name not in ("pages_scraped_total", "listings_scraped_total"):
+                continue
+            duration = self.histograms.get(("region_seconds", labels))
+            if duration is None or not duration.sum:
+                continue
+            region = dict(labels).get("region")
+            rates.setdefault(region, {})[name.replace("_scraped_total", "_per_second")] = round(value / duration.sum, 4)
+        return rates
+
+    def summary(self):
+        with self.lock:
+            return {
+                "output_id": self.output_id,
+                "elapsed_seconds": round(time.monotonic() - self.started, 3),
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                "histograms": [dict({"name": name, "labels": dict(labels)}, **histogram.summary())
+                               for (name, labels), histogram in sorted(self.histograms.items())],
+                "rates": self.rates(),
+            }
+
+    def to_prometheus(self):
+        """This function renders all metrics in Prometheus' text exposition format."""
+        lines = []
+        with self.lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE rightmove_{name} counter")
+                for (counter_name, labels), value in sorted(self.counters.items()):
+                    if counter_name == name:
+                        lines.append(f"rightmove_{name}{format_labels(labels)} {value}")
+
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE rightmove_{name} histogram")
+                for (histogram_name, labels), histogram in sorted(self.histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                        cumulative += bucket_count
+                        lines.append(f"rightmove_{name}_bucket{format_labels(labels + (('le', bound),))} "
+                                     f"{cumulative}")
+                    lines.append(f"rightmove_{name}_bucket{format_labels(labels + (('le', '+Inf'),))} "
+                                 f"{histogram.count}")
+                    lines.append(f"rightmove_{name}_sum{format_labels(labels)} {histogram.sum}")
+                    lines.append(f"rightmove_{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def maybe_export(self):
+        """This function exports the metrics if export_interval seconds have passed since the last export."""
+        if self.export_interval and time.monotonic() - self.last_export >= self.export_interval:
+            self.export()
+
+    def export(self):
+        """This function writes the metrics as JSON and in Prometheus' text format, replacing earlier versions."""
+        self.last_export = time.monotonic()
+        json_path = self.output_path(f"metrics_{self.output_id}", "json")
+        write_atomic(json_path, json.dumps(self.summary(), indent=2))
+        write_atomic(self.output_path(f"metrics_{self.output_id}", "prom"), self.to_prometheus())
+        return json_path
+
+    @staticmethod
+    def output_path(name, extension):
+        metrics_directory = os.path.join(os.getcwd(), "Outputs", "Metrics")
+        os.makedirs(metrics_directory, exist_ok=True)
+        return os.path.join(metrics_directory, f"{name}.{extension}")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels) + "}"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_atomic(path, content):
+    temporary_path = path + ".tmp"
+    with open(temporary_path, 'w') as f:
+        f.write(content)
+    os.replace(temporary_path, path)
+
+
+metrics = MetricsRegistry()
@@ -1,18 +1,158 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+
 class TextMiner:
-    """This class is responsible for mining any desired information out of text descriptions."""
-    def __init__(self, text, text_dictionary):
-        self.text = text.lower()
+    """This class is responsible for mining any desired information out of text descriptions.
+    The phrases are compiled once into a PhraseMatcher, which is then reused for every property."""
+    def __init__(self, text_dictionary):
         self.text_dictionary = text_dictionary
+        self.matcher = PhraseMatcher(text_dictionary)
 
-    def scan_contents(self):
+    def scan_contents(self, text):
         """
         This function takes the text description from a property as input and will fill the text_dictionary output
         with booleans marking if a certain string is present in the text."""
 
-        for key in self.text_dictionary.keys():
-            self.text_dictionary[key] = key.lower() in self.text
+        found = self.matcher.find(text)
+
+        return {key: key in found for key in self.text_dictionary.keys()}
+
+    def mine_series(self, texts):
+        """This function mines a whole Series of descriptions at once, with vectorized string operations. It returns a
+        frame with one boolean column per phrase, aligned with the Series. Missing descriptions give missing values."""
+
+        return self.matcher.find_series(texts)[list(self.text_dictionary.keys())]
+
+
+ALPHANUMERIC = re.compile(r"[^\W_]")  # a letter or digit, which can not be right before or after a whole word
+
+
+class PhraseMatcher:
+    """This class finds any number of phrases in a text. A few phrases are each looked up on their own, which is
+    fastest in C. More phrases are compiled into one regular expression shaped like a trie, so every position of the
+    text is checked against all phrases at once: each match is the longest phrase at its position, and the search goes
+    on from the next character, so overlapping phrases are all found.
+    The value of a phrase in the text dictionary sets how it is matched:
+        True/False: anywhere in the text, like 'in' (eg. "garden" also matches "gardens")
+        "word": only as whole words (eg. "bath" does not match "bathroom")
+        "regex": the phrase is a regular expression, these are searched separately
+    Matching is case insensitive."""
+
+    min_trie_size = 16  # phrases of one kind from which a trie is faster than looking them up one by one
+
+    def __init__(self, text_dictionary):
+        self.keys = {}  # (phrase, whole_word) -> keys of the phrase
+        self.expressions = []  # (compiled expression, keys), searched one by one
+
+        for key, match_type in text_dictionary.items():
+            if match_type == "regex":
+                self.expressions.append((re.compile(key, re.IGNORECASE), [key]))
+            else:
+                self.keys.setdefault((key.lower(), match_type == "word"), []).append(key)
+
+        self.phrases = []  # phrases that are looked up with 'in'
+        self.tries = []  # (compiled trie, whole_word, phrase -> phrases present wherever it matches, and their keys)
+        for whole_word in (False, True):
+            phrases = [phrase for phrase, word in self.keys if word == whole_word]
+            if len(phrases) >= self.min_trie_size:
+                self.tries.append(self.compile(phrases, whole_word))
+            elif whole_word:
+                self.expressions += [(re.compile(self.word_pattern(phrase)), self.keys[phrase, True])
+                                     for phrase in phrases]
+            else:
+                self.phrases = phrases
+
+    def compile(self, phrases, whole_word):
+        """This function builds the trie expression of the phrases. Phrases that are followed by more characters in
+        the trie become optional tails (eg. "garden" and "gardens": garden(?:s)?), and quantifiers are greedy, so a
+        match is the longest phrase at its position. The phrases that it starts with are present there as well (for
+        whole words, only if a space or punctuation follows them in the longer phrase)."""
+        trie = {}
+        for phrase in phrases:
+            node = trie
+            for character in phrase:
+                node = node.setdefault(character, {})
+            node[None] = True  # a phrase ends here
+
+        def expression(node):
+            branches = [re.escape(character) + expression(child) for character, child in node.items()
+                        if character is not None]
+            if not branches:
+                return ""
+            branch = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+            return f"(?:{branch})?" if None in node else branch
+
+        pattern = expression(trie)
+        if whole_word:  # the character before the match is checked separately, see find
+            pattern = rf"(?:{pattern})(?![^\W_])"
+
+        prefixes = {phrase: [prefix for prefix in phrases if phrase.startswith(prefix) and
+                             not (whole_word and ALPHANUMERIC.match(phrase[len(prefix):len(prefix) + 1]))]
+                    for phrase in phrases}
+        prefix_keys = {phrase: [key for prefix in prefixes[phrase] for key in self.keys[prefix, whole_word]]
+                       for phrase in phrases}
+        return re.compile(pattern), whole_word, prefixes, prefix_keys
+
+    @staticmethod
+    def word_pattern(phrase):
+        """The expression of a whole word. The character before it is checked after the phrase, so the expression
+        starts with the phrase, which the regex engine skips to directly."""
+        phrase = re.escape(phrase)
+        return rf"{phrase}(?<![^\W_]{phrase})(?![^\W_])"
+
+    def find(self, text):
+        """This function returns the keys of all phrases present in the text."""
+        text = text.lower()
+        found = set()
+
+        for phrase in self.phrases:
+            if phrase in text:
+                found.update(self.keys[phrase, False])
+
+        for trie, whole_word, _, prefix_keys in self.tries:
+            search = trie.search
+            match = search(text)
+            while match:
+                start = match.start()
+                if not (whole_word and start and ALPHANUMERIC.match(text, start - 1)):
+                    found.update(prefix_keys[match.group()])
+                match = search(text, start + 1)
+
+        for expression, keys in self.expressions:
+            if expression.search(text):
+                found.update(keys)
+
+        return found
+
+    def find_series(self, texts):
+        """This function is the vectorized version of find, for a Series of texts. It returns a frame with a nullable
+        boolean column per key, aligned with the Series and missing where the text is missing."""
+        lowered = texts.astype("string").str.lower().reset_index(drop=True)
+        found = {}
+
+        for phrase in self.phrases:
+            present = lowered.str.contains(phrase, regex=False).fillna(False).to_numpy(dtype=bool)
+            found.update(dict.fromkeys(self.keys[phrase, False], present))
 
-        return self.text_dictionary
+        for trie, whole_word, prefixes, _ in self.tries:
+            # A lookahead matches at every position, so findall returns the longest phrase at each of them
+            start = r"(?<![^\W_])" if whole_word else ""
+            matches = lowered.str.findall(re.compile(f"(?={start}({trie.pattern}))")).explode().dropna()
+            phrases = list(prefixes)
+            codes = {phrase: [phrases.index(prefix) for prefix in prefixes[phrase]] for phrase in phrases}
+            hits = matches.map(codes).explode()
+            table = np.zeros((len(lowered), len(phrases)), dtype=bool)
+            table[hits.index.to_numpy(), hits.to_numpy(dtype=int)] = True
+            for column, phrase in enumerate(phrases):
+                found.update(dict.fromkeys(self.keys[phrase, whole_word], table[:, column]))
 
-        return self.text_dictionary
+        for expression, keys in self.expressions:
+            present = lowered.str.contains(expression).fillna(False).to_numpy(dtype=bool)
+            found.update(dict.fromkeys(keys, present))
 
+        missing = lowered.isna().to_numpy()
+        return pd.DataFrame({key: pd.arrays.BooleanArray(present & ~missing, missing) for key, present in found.items()},
+                            index=texts.index, columns=list(found))
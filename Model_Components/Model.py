@@ -1,21 +1,44 @@
+import os
 import logging
 from datetime import datetime
+import pandas as pd
 
 from Model_Components.Sampling import PostcodeSampler
 from Model_Components.Caching import CachedScraper, CacheRecover
 from Model_Components.Transforming import DataTransformer
 from Model_Components.Exporting import DataExporter
+from Model_Components.Indexing import ListingIndex
+from Model_Components.Aggregating import RegionalAggregates
 from Model_Components.HelperFunctions import configure_logging
+from Model_Components.Metrics import metrics
 
 
 
 
 class RightMoveModel:
-    def __init__(self, import_cache=None, fields_of_interest=None, set_seed=None, n_per_region=1):
+    def __init__(self, import_cache=None, fields_of_interest=None, set_seed=None, n_per_region=1,
+                 session_settings=None, n_workers=1, backend="selenium", resume_cache=None,
+                 export_settings=None, incremental=False, rate_settings=None, metrics_settings=None,
+                 archive_settings=None, sampling_settings=None, chunk_size=None, quota_settings=None,
+                 aggregate_settings=None, fault_settings=None):
         self.import_cache = import_cache
+        self.resume_cache = resume_cache
         self.fields_of_interest = fields_of_interest
         self.n_per_region = n_per_region
         self.set_seed = set_seed
+        self.session_settings = session_settings
+        self.n_workers = n_workers
+        self.backend = backend
+        self.export_settings = export_settings or {}
+        self.incremental = incremental
+        self.rate_settings = rate_settings
+        self.metrics_settings = metrics_settings or {}
+        self.archive_settings = archive_settings
+        self.sampling_settings = sampling_settings or {}
+        self.chunk_size = chunk_size  # clean and export the data in chunks of this many rows
+        self.quota_settings = quota_settings
+        self.aggregate_settings = aggregate_settings or {}
+        self.fault_settings = fault_settings
 
     def run(self):
         """This function linearly passes through all separate components of the model.
@@ -25,25 +48,69 @@ class RightMoveModel:
         output_id = datetime.now().strftime('%Y%m%d%H%M%S')
         configure_logging(output_id)
         logging.info(f"Starting program.")
+        metrics.configure(output_id, **self.metrics_settings)
 
         # Recover cache if any
         cache_recover = CacheRecover(import_cache=self.import_cache)
 
         # 1. Sample postal codes
 
-        raw_data = cache_recover.recover_cache()
+        raw_data = cache_recover.recover_cache(chunk_size=self.chunk_size)
 
-        pc_sampler = PostcodeSampler(n_per_region=self.n_per_region, set_seed=self.set_seed)
-        pc_sample = pc_sampler.pc_sampler(import_cache=self.import_cache)
+        pc_sampler = PostcodeSampler(n_per_region=self.n_per_region, set_seed=self.set_seed, **self.sampling_settings)
+        pc_sample = pc_sampler.pc_sampler(import_cache=self.import_cache or self.resume_cache)
 
         # 2. Scrape data
+        listing_index = ListingIndex(run_id=self.import_cache) if self.incremental and self.import_cache else None
+        sampling_weights = None
+        run_id = self.import_cache or output_id
         if not self.import_cache:
-            raw_data = CachedScraper(pc_sample, n_per_region=self.n_per_region,
-                                     fields_of_interest=self.fields_of_interest).run()
+            scraper = CachedScraper(pc_sample, n_per_region=self.n_per_region,
+                                    fields_of_interest=self.fields_of_interest,
+                                    session_settings=self.session_settings, n_workers=self.n_workers,
+                                    backend=self.backend, incremental=self.incremental,
+                                    rate_settings=self.rate_settings, archive_settings=self.archive_settings,
+                                    quota_settings=self.quota_settings, fault_settings=self.fault_settings)
+            if self.resume_cache:  # the sample and progress come from the interrupted run
+                scraper.resume(self.resume_cache)
+            raw_data = scraper.run()
+            listing_index = scraper.listing_index
+            sampling_weights = scraper.sampling_weights()
+            run_id = scraper.cache_id
+            if scraper.dead_letters:
+                dead_letters_path = f"{os.getcwd()}/Outputs/dead_letters_{output_id}.csv"
+                pd.DataFrame(scraper.dead_letters).to_csv(dead_letters_path, index=False)
+                logging.info(f"The postcodes that could not be scraped are listed in: {dead_letters_path}")
 
-        # 3. Transform output into desired form
-        clean_data = DataTransformer(raw_data).clean_data
+        aggregate_settings = dict(self.aggregate_settings)
+        aggregates = None
+        if aggregate_settings.pop("enabled", False):
+            aggregates = RegionalAggregates(run_id=run_id, **aggregate_settings)
+            aggregates.reset()
 
-        # 4. Export data
-        DataExporter(clean_data, output_id).export()
+        if self.chunk_size:
+            # 3 and 4. Transform and export the data chunk by chunk, so it never has to be in memory at once
+            if isinstance(raw_data, pd.DataFrame):
+                raw_data = (raw_data.iloc[start:start + self.chunk_size]
+                            for start in range(0, len(raw_data), self.chunk_size))
+            clean_chunks = DataTransformer(raw_data, sampling_weights).stream_clean_data()
+            if aggregates:
+                clean_chunks = aggregates.tap(clean_chunks)
+            exporter = DataExporter(None, output_id, listing_index=listing_index, **self.export_settings)
+            exporter.export_chunks(clean_chunks)
+        else:
+            # 3. Transform output into desired form
+            clean_data = DataTransformer(raw_data, sampling_weights).clean_data
+            if aggregates:
+                aggregates.add(clean_data)
+
+            # 4. Export data
+            DataExporter(clean_data, output_id, listing_index=listing_index, **self.export_settings).export()
+
+        if aggregates:
+            aggregates.export_summaries()
+            aggregates.close()
+
+        metrics_path = metrics.export()
+        logging.info(f"Run metrics saved in: {metrics_path}")
 
@@ -0,0 +1,216 @@
+import re
+from html.parser import HTMLParser
+
+"""This file contains a small HTML parser for Rightmove result pages. Parsed elements offer the same find_element,
+find_elements and text interface as Selenium web elements, so the extraction code works on both."""
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg"}
+BLOCK_TAGS = {"address", "article", "aside", "blockquote", "dd", "div", "dl", "dt", "footer", "form", "h1", "h2",
+              "h3", "h4", "h5", "h6", "header", "li", "main", "nav", "ol", "p", "section", "table", "tr", "ul"}
+
+
+class ElementNotFound(Exception):
+    """Raised when a selector does not match any element, like Selenium's NoSuchElementException."""
+
+
+class HtmlElement:
+    """This class is one element of a parsed HTML document."""
+
+    def __init__(self, tag, attrs, parent=None):
+        self.tag = tag
+        self.attrs = attrs
+        self.classes = set(attrs.get("class", "").split())
+        self.parent = parent
+        self.children = []  # HtmlElement objects and text strings, in document order
+
+    def find_element(self, by, selector):
+        """This function returns the first descendant matching the CSS selector. The 'by' argument is only there to
+        mirror Selenium, selectors are always CSS."""
+        for element in self.iter_matches(selector):
+            return element
+        raise ElementNotFound(selector)
+
+    def find_elements(self, by, selector):
+        """This function returns all descendants matching the CSS selector."""
+        return list(self.iter_matches(selector))
+
+    def iter_matches(self, selector):
+        steps = parse_selector(selector)
+        for element in self.descendants():
+            if matches(element, steps, len(steps) - 1):
+                yield element
+
+    def descendants(self):
+        for child in self.children:
+            if isinstance(child, HtmlElement):
+                yield child
+                yield from child.descendants()
+
+    def element_children(self):
+        return [child for child in self.children if isinstance(child, HtmlElement)]
+
+    def previous_sibling(self):
+        if self.parent is None:
+            return None
+        siblings = self.parent.element_children()
+        position = siblings.index(self)
+        return siblings[position - 1] if position > 0 else None
+
+    @property
+    def text(self):
+        """The visible text of the element, with whitespace collapsed like a browser renders it."""
+        parts = []
+        self.collect_text(parts)
+        lines = (re.sub(r"\s+", " ", line).strip() for line in "".join(parts).split("\n"))
+        return "\n".join(line for line in lines if line)
+
+    def collect_text(self, parts):
+        if self.tag in SKIPPED_TAGS:
+            return
+        if self.tag in BLOCK_TAGS:
+            parts.append("\n")
+        for child in self.children:
+            if isinstance(child, HtmlElement):
+                child.collect_text(parts)
+            else:
+                parts.append(child.replace("\n", " "))
+        if self.tag in BLOCK_TAGS or self.tag == "br":
+            parts.append("\n")
+
+    def get_attribute(self, name):
+        return self.attrs.get(name)
+
+
+class HtmlDocument(HTMLParser):
+    """This class parses an HTML page into a tree of HtmlElement objects."""
+
+    def __init__(self, html):
+        super().__init__(convert_charrefs=True)
+        self.root = HtmlElement("document", {})
+        self.stack = [self.root]
+        self.feed(html)
+        self.close()
+
+    def handle_starttag(self, tag, attrs):
+        element = HtmlElement(tag, {name: value or "" for name, value in attrs}, parent=self.stack[-1])
+        self.stack[-1].children.append(element)
+        if tag not in VOID_TAGS:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        # Close the nearest open element with this tag, implicitly closing anything left open inside it
+        for depth in range(len(self.stack) - 1, 0, -1):
+            if self.stack[depth].tag == tag:
+                del self.stack[depth:]
+                return
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+    def find_element(self, by, selector):
+        return self.root.find_element(by, selector)
+
+    def find_elements(self, by, selector):
+        return self.root.find_elements(by, selector)
+
+
+SELECTOR_TOKEN = re.compile(r'\s*([>+~])\s*|\s+|([^\s>+~\[]*(?:\[[^\]]*\][^\s>+~\[]*)*)')
+COMPOUND_PART = re.compile(r'([.#]?)([\w-]+)|\[([\w-]+)(?:([~^$*|]?=)"?([^"\]]*)"?)?\]')
+SELECTOR_CACHE = {}
+
+
+def parse_selector(selector):
+    """This function splits a CSS selector into (combinator, compound) steps. Supported are tag, class, id and
+    attribute selectors, combined with descendant (' '), child ('>'), adjacent ('+') and sibling ('~') combinators."""
+    if selector in SELECTOR_CACHE:
+        return SELECTOR_CACHE[selector]
+
+    steps = []
+    combinator = " "
+    position = 0
+    selector = selector.strip()
+    while position < len(selector):
+        match = SELECTOR_TOKEN.match(selector, position)
+        if match.group(2):
+            steps.append((combinator, parse_compound(match.group(2))))
+            combinator = " "
+        elif match.group(1):
+            combinator = match.group(1)
+        position = match.end()
+
+    SELECTOR_CACHE[selector] = steps
+    return steps
+
+
+def parse_compound(compound):
+    tag, classes, conditions = None, [], []
+    for prefix, name, attr, operator, value in COMPOUND_PART.findall(compound):
+        if attr:
+            conditions.append((attr, operator, value))
+        elif prefix == ".":
+            classes.append(name)
+        elif prefix == "#":
+            conditions.append(("id", "=", name))
+        else:
+            tag = name
+    return tag, classes, conditions
+
+
+def matches_compound(element, compound):
+    tag, classes, conditions = compound
+    if tag and element.tag != tag:
+        return False
+    if not element.classes.issuperset(classes):
+        return False
+    for attr, operator, value in conditions:
+        actual = element.attrs.get(attr)
+        if actual is None:
+            return False
+        if operator == "=" and actual != value:
+            return False
+        if operator == "~=" and value not in actual.split():
+            return False
+        if operator == "^=" and not actual.startswith(value):
+            return False
+        if operator == "$=" and not actual.endswith(value):
+            return False
+        if operator == "*=" and value not in actual:
+            return False
+    return True
+
+
+def matches(element, steps, index):
+    """This function checks if the element matches steps[:index + 1], walking the selector from right to left."""
+    combinator, compound = steps[index]
+    if not matches_compound(element, compound):
+        return False
+    if index == 0:
+        return True
+
+    if combinator == " ":
+        ancestor = element.parent
+        while ancestor is not None:
+            if matches(ancestor, steps, index - 1):
+                return True
+            ancestor = ancestor.parent
+        return False
+    if combinator == ">":
+        parent = element.parent
+        return parent is not None and matches(parent, steps, index - 1)
+    if combinator == "+":
+        sibling = element.previous_sibling()
+        return sibling is not None and matches(sibling, steps, index - 1)
+    if combinator == "~":
+        sibling = element.previous_sibling()
+        while sibling is not None:
+            if matches(sibling, steps, index - 1):
+                return True
+            sibling = sibling.previous_sibling()
+        return False
+    return False
@@ -0,0 +1,124 @@
+import time
+import queue
+import threading
+
+from Model_Components.Metrics import metrics
+
+_END = object()  # marks the end of the items, passed down from stage to stage
+
+
+class Pipeline:
+    """This class runs a source and a chain of stages, each in its own thread, connected by bounded queues. Items are
+    taken from the source and passed through the stages in order, and the results are read by iterating the pipeline.
+    All stages work at the same time on different items, so a page can be parsed while the next one loads.
+    A stage that gets ahead blocks once the queue to the next stage is full (backpressure), so at most queue_size items
+    wait between two stages. An error in any stage stops all stages and is raised to whoever iterates the pipeline.
+
+        with Pipeline(pages(), [("extract", extract), ("mine", mine)]) as pipeline:
+            for result in pipeline:
+                ...
+    """
+
+    poll_interval = 0.1  # seconds between checks for a stopped pipeline, while waiting on a queue
+
+    def __init__(self, source, stages, queue_size=8, name="pipeline"):
+        self.source = source
+        self.stages = stages  # list of (name, function) pairs, every function maps one item to one item
+        self.name = name
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+        self.stopped = threading.Event()
+        self.error = None
+        self.threads = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def start(self):
+        self.threads = [threading.Thread(target=self.run_source, name=f"{self.name}-source", daemon=True)]
+        self.threads += [threading.Thread(target=self.run_stage, args=(k, stage_name, function),
+                                          name=f"{self.name}-{stage_name}", daemon=True)
+                         for k, (stage_name, function) in enumerate(self.stages)]
+        for thread in self.threads:
+            thread.start()
+
+    def __iter__(self):
+        while True:
+            item = self.get(len(self.stages))
+            if self.error is not None:
+                raise self.error
+            if item is _END:
+                return
+            yield item
+
+    def close(self):
+        """This function stops all stages and waits for them to finish. Items still in the queues are dropped."""
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def run_source(self):
+        try:
+            while not self.stopped.is_set():
+                start = time.perf_counter()
+                try:
+                    item = next(self.source)
+                except StopIteration:
+                    break
+                metrics.observe("pipeline_stage_seconds", time.perf_counter() - start, stage="source")
+                if not self.put(0, item, "source"):
+                    break
+        except BaseException as error:
+            self.fail(error)
+        finally:
+            if hasattr(self.source, "close"):  # lets the source release what it holds (eg. a browser session)
+                self.source.close()
+            self.put(0, _END, "source")
+
+    def run_stage(self, k, stage_name, function):
+        while True:
+            item = self.get(k)
+            if item is _END:
+                self.put(k + 1, _END, stage_name)
+                return
+            try:
+                start = time.perf_counter()
+                result = function(item)
+                metrics.observe("pipeline_stage_seconds", time.perf_counter() - start, stage=stage_name)
+            except BaseException as error:
+                self.fail(error)
+                return
+            if not self.put(k + 1, result, stage_name):
+                return
+
+    def get(self, k):
+        """This function takes the next item from queue k, or the end marker once the pipeline is stopped."""
+        while True:
+            try:
+                return self.queues[k].get(timeout=self.poll_interval)
+            except queue.Empty:
+                if self.stopped.is_set():
+                    return _END
+
+    def put(self, k, item, stage_name):
+        """This function passes an item on to queue k, waiting while it is full. It returns False if the pipeline was
+        stopped in the meantime."""
+        start = time.perf_counter()
+        while True:
+            try:
+                self.queues[k].put(item, timeout=self.poll_interval)
+                break
+            except queue.Full:
+                if self.stopped.is_set():
+                    return False
+        metrics.observe("pipeline_blocked_seconds", time.perf_counter() - start, stage=stage_name)
+        return True
+
+    def fail(self, error):
+        if self.error is None:
+            self.error = error
+        self.stopped.set()
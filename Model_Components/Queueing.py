@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+import pandas as pd
+
+from Model_Components.Metrics import metrics
+
+Task = namedtuple("Task", ["postcode", "page", "region", "position"])
+
+
+class TaskQueue:
+    """This class is a durable queue of (postcode, page) tasks in a SQLite file, shared by any number of worker
+    processes (see QueueWorker), on one machine or on several machines with the file on a shared disk.
+    Every postcode starts with a task for its first page. Finishing that task adds the tasks for the other pages.
+    Workers claim tasks with a lease of lease_seconds and renew it with heartbeats while they work. A lease that is not
+    renewed in time (the worker died or hangs) expires, and the task is handed to the next worker that asks. A task
+    that failed max_attempts times is set aside as failed.
+    The rows of every page are stored under their task, so a task that is done twice still gives its rows once."""
+
+    def __init__(self, path, lease_seconds=120, max_attempts=5):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()  # the threads of a worker share the connection
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Transactions are started explicitly (see transaction)
+        self.connection = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                postcode TEXT,
+                page INTEGER,
+                region TEXT,
+                position INTEGER,
+                state TEXT DEFAULT 'pending',
+                owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER DEFAULT 0,
+                error TEXT,
+                PRIMARY KEY (postcode, page)
+            )""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, position, page)")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                postcode TEXT,
+                page INTEGER,
+                rows TEXT,
+                owner TEXT,
+                finished REAL,
+                PRIMARY KEY (postcode, page)
+            )""")
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """This function runs a block of statements as one transaction. Immediate transactions take the write lock
+        right away, so no other process can claim the same tasks in between reading and updating them."""
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def seed(self, pc_sample):
+        """This function adds the first page of every postcode in the sample. Seeding again adds nothing twice, so
+        a sample can be seeded into a queue that already has progress."""
+        with self.transaction() as connection:
+            connection.executemany("INSERT OR IGNORE INTO tasks (postcode, page, region, position) VALUES (?, 0, ?, ?)",
+                                   [(pc, region, position) for position, (pc, region)
+                                    in enumerate(zip(pc_sample["postcode"], pc_sample["region_gpt"]))])
+        logging.info(f"Queued {len(pc_sample)} postcodes in: {self.path}")
+
+    def claim(self, owner, n=1):
+        """This function leases up to n pending tasks to the owner. Tasks with an expired lease are pending again, and
+        tasks are handed out in sample order, so the queue drains roughly like a serial run."""
+        now = time.time()
+        with self.transaction(immediate=True) as connection:
+            expired = connection.execute(
+                "SELECT postcode, page FROM tasks WHERE state = 'leased' AND lease_expires < ?", (now,)).fetchall()
+            if expired:
+                logging.info(f"Reclaiming {len(expired)} tasks with an expired lease.")
+                metrics.increment("task_leases_expired_total", len(expired))
+                connection.execute("UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                                   "error = COALESCE(error, 'lease expired') "
+                                   "WHERE state = 'leased' AND lease_expires < ?", (self.max_attempts, now))
+
+            rows = connection.execute("SELECT postcode, page, region, position FROM tasks WHERE state = 'pending' "
+                                      "ORDER BY position, page LIMIT ?", (n,)).fetchall()
+            connection.executemany("UPDATE tasks SET state = 'leased', owner = ?, lease_expires = ?, "
+                                   "attempts = attempts + 1 WHERE postcode = ? AND page = ?",
+                                   [(owner, now + self.lease_seconds, pc, page) for pc, page, _, _ in rows])
+
+        return [Task(*row) for row in rows]
+
+    def heartbeat(self, owner, tasks):
+        """This function renews the leases the owner still holds on the tasks."""
+        if not tasks:
+            return
+        with self.transaction() as connection:
+            connection.executemany("UPDATE tasks SET lease_expires = ? WHERE postcode = ? AND page = ? "
+                                   "AND owner = ? AND state = 'leased'",
+                                   [(time.time() + self.lease_seconds, task.postcode, task.page, owner)
+                                    for task in tasks])
+
+    def complete(self, task, owner, records, n_pages=None):
+        """This function stores the rows of a task and marks it done, if the owner still holds its lease. A worker
+        whose lease expired may finish after another worker took the task over, its rows are then dropped. For the
+        first page of a postcode, n_pages adds the tasks for its other pages. It returns if the task was completed."""
+        with self.transaction(immediate=True) as connection:
+            completed = connection.execute("UPDATE tasks SET state = 'done', error = NULL WHERE postcode = ? "
+                                           "AND page = ? AND owner = ? AND state = 'leased'",
+                                           (task.postcode, task.page, owner)).rowcount
+            if completed:
+                connection.execute("INSERT OR REPLACE INTO results (postcode, page, rows, owner, finished) "
+                                   "VALUES (?, ?, ?, ?, ?)",
+                                   (task.postcode, task.page, json.dumps(records), owner, time.time()))
+                if n_pages:
+                    connection.executemany("INSERT OR IGNORE INTO tasks (postcode, page, region, position) "
+                                           "VALUES (?, ?, ?, ?)",
+                                           [(task.postcode, page, task.region, task.position)
+                                            for page in range(task.page + 1, n_pages)])
+
+        if not completed:
+            logging.info(f"The lease of page {task.page} of {task.postcode} expired before it was finished, another "
+                         f"worker took it over.")
+            metrics.increment("tasks_lost_total")
+            return False
+        metrics.increment("tasks_completed_total")
+        return True
+
+    def release(self, task, owner, error=None, retry=True):
+        """This function hands a task back after a failed attempt, or sets it aside once it ran out of attempts.
+        Without retry, it is set aside right away (eg. its requests were already retried by the scheduler)."""
+        with self.transaction() as connection:
+            connection.execute("UPDATE tasks SET state = CASE WHEN ? OR attempts >= ? THEN 'failed' ELSE 'pending' "
+                               "END, owner = NULL, error = ? WHERE postcode = ? AND page = ? AND owner = ? "
+                               "AND state = 'leased'",
+                               (not retry, self.max_attempts, error, task.postcode, task.page, owner))
+        metrics.increment("tasks_failed_total")
+
+    def retry_failed(self):
+        """This function gives failed tasks a fresh set of attempts."""
+        with self.transaction() as connection:
+            retried = connection.execute("UPDATE tasks SET state = 'pending', attempts = 0 "
+                                         "WHERE state = 'failed'").rowcount
+        logging.info(f"Queued {retried} failed tasks again.")
+
+    def progress(self):
+        """This function returns the number of tasks per state."""
+        with self.lock:
+            counts = dict(self.connection.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+        return {state: counts.get(state, 0) for state in ("pending", "leased", "done", "failed")}
+
+    def results(self):
+        """This function returns the rows of all finished tasks in sample order, the same as a serial run."""
+        with self.lock:
+            results = self.connection.execute(
+                "SELECT tasks.postcode, tasks.region, results.rows FROM results JOIN tasks "
+                "ON tasks.postcode = results.postcode AND tasks.page = results.page "
+                "ORDER BY tasks.position, tasks.page").fetchall()
+
+        records = []
+        for pc, region, rows in results:
+            for record in json.loads(rows):
+                record.update(postcode=pc, region_gpt=region)
+                records.append(record)
+        return pd.DataFrame.from_records(records)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
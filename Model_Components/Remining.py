@@ -0,0 +1,167 @@
+import os
+import glob
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from Model_Components.Mining import TextMiner
+from Model_Components.Metrics import metrics
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from Model_Components.Exporting import stable_schema
+except ImportError:  # Parquet files can only be re-mined when pyarrow is installed
+    pa = None
+    pq = None
+
+"""This file contains the re-mining of descriptions that were scraped before, for when the text_values change. The
+saved text is mined again with the new phrases, so adding a phrase does not take a new scrape."""
+
+
+class TextReminer:
+    """This class mines the descriptions in existing CSV, Parquet and pickle files (raw data, clean data or exports) again
+    with a new dictionary of phrases, and adds or updates one boolean column per phrase. Other columns, including the
+    columns of phrases that are not in the new dictionary, are left as they are.
+    Files are read and written in chunks of chunk_size rows, and the descriptions of a chunk are mined by a pool of
+    n_processes processes (all cores by default). Every file is replaced only once it is completely re-mined."""
+
+    batch_size = 5000  # descriptions per task of the process pool
+
+    def __init__(self, text_values, n_processes=None, chunk_size=100000, compression="zstd"):
+        self.text_values = text_values
+        self.phrases = list(text_values.keys())
+        self.n_processes = n_processes or os.cpu_count()
+        self.chunk_size = chunk_size or 100000
+        self.compression = compression  # of the Parquet files that are written
+        self.executor = None
+
+    def __enter__(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.n_processes, initializer=start_worker,
+                                            initargs=(self.text_values,))
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.executor = None
+
+    def remine(self, paths):
+        """This function re-mines every CSV, Parquet and pickle file in the paths, which can be files or directories (eg. the
+        partitioned export of a run)."""
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files += sorted(glob.glob(os.path.join(path, "**", "*.parquet"), recursive=True))
+                files += sorted(glob.glob(os.path.join(path, "**", "*.csv"), recursive=True))
+                files += sorted(glob.glob(os.path.join(path, "**", "*.pkl"), recursive=True))
+            else:
+                files.append(path)
+
+        for path in files:
+            self.remine_file(path)
+
+    def remine_file(self, path):
+        with metrics.timer("remining_seconds"):
+            if path.endswith(".parquet"):
+                n_rows = self.remine_parquet(path)
+            elif path.endswith(".csv"):
+                n_rows = self.remine_csv(path)
+            elif path.endswith(".pkl"):
+                n_rows = self.remine_pickle(path)
+            else:
+                raise ValueError(f"Can only re-mine CSV, Parquet and pickle files: {path}")
+        metrics.increment("remined_rows_total", n_rows)
+        logging.info(f"Re-mined {n_rows} descriptions in: {path}")
+
+    def remine_csv(self, path):
+        temporary_path = path + ".tmp"
+        n_rows = 0
+        for k, chunk in enumerate(self.remine_chunks(pd.read_csv(path, chunksize=self.chunk_size))):
+            chunk.to_csv(temporary_path, mode="w" if k == 0 else "a", header=k == 0, index=False)
+            n_rows += len(chunk)
+        if n_rows:
+            os.replace(temporary_path, path)
+        return n_rows
+
+    def remine_pickle(self, path):
+        """Pickles (the clean data of a job without pyarrow) are read at once, but still mined in chunks."""
+        data = pd.read_pickle(path)
+        chunks = (data.iloc[start:start + self.chunk_size] for start in range(0, len(data), self.chunk_size))
+        remined_chunks = list(self.remine_chunks(chunks))
+        if remined_chunks:
+            pd.concat(remined_chunks).to_pickle(path + ".tmp")
+            os.replace(path + ".tmp", path)
+        return len(data)
+
+    def remine_parquet(self, path):
+        if pq is None:
+            raise ImportError(f"pyarrow is needed to re-mine {path}")
+
+        temporary_path = path + ".tmp"
+        parquet_file = pq.ParquetFile(path)
+        chunks = (batch.to_pandas() for batch in parquet_file.iter_batches(batch_size=self.chunk_size))
+        writer = None
+        n_rows = 0
+        try:
+            for chunk in self.remine_chunks(chunks):
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(temporary_path, stable_schema(table.schema),
+                                              compression=self.compression)
+                writer.write_table(table.cast(writer.schema))
+                n_rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        if n_rows:
+            os.replace(temporary_path, path)
+        return n_rows
+
+    def remine_chunks(self, chunks):
+        """This function yields every chunk with its phrase columns mined again. The next chunk is already being mined
+        by the pool while the current one is written."""
+        pending = None
+        for chunk in chunks:
+            submitted = (chunk, self.submit(chunk))
+            if pending is not None:
+                yield self.collect(*pending)
+            pending = submitted
+        if pending is not None:
+            yield self.collect(*pending)
+
+    def submit(self, chunk):
+        if "text" not in chunk.columns:
+            raise KeyError("The data has no text column to re-mine.")
+        texts = chunk["text"].astype(object).where(chunk["text"].notna(), None).tolist()
+        return [self.executor.submit(mine_batch, texts[start:start + self.batch_size])
+                for start in range(0, len(texts), self.batch_size)]
+
+    def collect(self, chunk, futures):
+        mined = np.concatenate([future.result() for future in futures]) if futures \
+            else np.zeros((0, len(self.phrases)), dtype=np.int8)
+        chunk = chunk.copy()
+        for k, phrase in enumerate(self.phrases):
+            values = pd.array(mined[:, k] == 1, dtype="boolean")
+            values[mined[:, k] == -1] = pd.NA  # descriptions that are missing
+            chunk[phrase] = values
+        return chunk
+
+
+_text_miner = None  # the TextMiner of a pool process
+
+
+def start_worker(text_values):
+    global _text_miner
+    _text_miner = TextMiner(text_values)
+
+
+def mine_batch(texts):
+    """This function mines a batch of descriptions in a pool process. The result holds one row per description and
+    one column per phrase: 1 if the phrase was found, 0 if not and -1 if there is no description."""
+    mined = np.full((len(texts), len(_text_miner.text_dictionary)), -1, dtype=np.int8)
+    for row, text in enumerate(texts):
+        if text is not None:
+            mined[row] = list(_text_miner.scan_contents(str(text)).values())
+    return mined
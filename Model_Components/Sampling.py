@@ -1,58 +1,164 @@
 import pandas as pd
+import numpy as np
 import os
 import logging
 
 from Model_Components.HelperFunctions import timeit
 
+try:
+    import pyarrow  # noqa: F401 (only needed for the Parquet copy of the postcode table)
+    TABLE_FORMAT = "parquet"
+except ImportError:
+    TABLE_FORMAT = "pickle"
 
-class PostcodeSampler:
-    """This class is responsible for randomly selecting postcodes for which to scrape data."""
 
-    def __init__(self, n_per_region=5, set_seed=None):
+class PostcodeSampler:
+    """This class is responsible for randomly selecting postcodes for which to scrape data.
+    The postcode list is read from Inputs/postalcodes.csv once and then kept as a binary copy, sorted by region, which
+    is only rebuilt when the CSV changes. All regions are sampled together in one vectorized pass.
+    How many postcodes each region gets depends on the allocation:
+        "equal": n_per_region postcodes per region
+        "proportional": sample_size postcodes in total, divided in proportion to the number of postcodes per region
+        "weighted": sample_size postcodes in total, divided in proportion to the given weights per region
+    sample_size defaults to n_per_region times the number of regions. No region gets more than max_per_region
+    postcodes, or more than it has."""
+
+    excluded_countries = ["Isle of Man", "Guernsey", "Jersey"]
+
+    def __init__(self, n_per_region=5, set_seed=None, allocation="equal", sample_size=None, weights=None,
+                 max_per_region=None):
         self.pc_list = None
         self.n_per_region = n_per_region
         self.set_seed = set_seed
+        self.allocation = allocation
+        self.sample_size = sample_size
+        self.weights = weights or {}  # region -> weight, for the weighted allocation (regions left out weigh 1)
+        self.max_per_region = max_per_region
         self.sample = pd.DataFrame(columns=["postcode", "region_gpt"])
 
     @timeit
     def pc_sampler(self, import_cache=None):
-        """This function samples n*regions postcodes from the supplied list of postcodes.
+        """This function samples postcodes from every region of the supplied list of postcodes.
             Countries: England, Scotland, Northern Ireland, Isle of Man, Wales, Guernsey, Isle of Man, Jersey
         """
         if import_cache:
             return
 
-        self.pc_list = self.filter_sample(pc_list=pd.read_csv(os.getcwd() + "/Inputs/postalcodes.csv"))
-
-        for region in self.pc_list["region_gpt"].unique():
-            pc_region = self.pc_list.loc[self.pc_list["region_gpt"] == region]
-            pc_region_sample = self.sample_from_country(pc_region, region)
-            self.sample = pd.concat([self.sample, pc_region_sample], ignore_index=True)
+        self.pc_list = self.load_postcodes()
 
-        logging.info(f"Sampling {len(self.sample)} postcodes in total")
+        region_codes = self.pc_list["region_gpt"].cat.codes.to_numpy()
+        regions, region_starts, region_sizes = np.unique(region_codes, return_index=True, return_counts=True)
+        region_names = self.pc_list["region_gpt"].cat.categories[regions]
+        allocation = self.allocate(region_names, region_sizes)
 
-        return self.sample
+        # Give every postcode a random key and keep the postcodes with the smallest keys of each region. Sorting by
+        # region first, then by key, ranks the postcodes within their region in a single sort.
+        rng = np.random.default_rng(self.set_seed)
+        random_keys = rng.random(len(region_codes))
+        order = np.lexsort((random_keys, region_codes))
+        group = np.repeat(np.arange(len(regions)), region_sizes)
+        rank = np.arange(len(order)) - region_starts[group]
+        selected = order[rank < allocation[group]]
 
-    def sample_from_country(self, pc_region, region):
-        """This samples n postcodes from the list of postcodes in a region."""
+        sample = self.pc_list.iloc[selected]
+        self.sample = pd.DataFrame({"postcode": sample["postcode"].to_numpy(),
+                                    "region_gpt": sample["region_gpt"].astype(str).to_numpy()})
 
-        pc_region_sample = pd.DataFrame(index=range(0, self.n_per_region), columns=pc_region.columns)
-        pc_region_sample["region_gpt"] = region
+        logging.info(f"Sampling {len(self.sample)} postcodes in total")
 
-        # sample n from list of strings
+        return self.sample
 
-        sampled_strings = pc_region["postcode"].sample(self.n_per_region, random_state=self.set_seed)
-        pc_region_sample["postcode"] = sampled_strings.reset_index(drop=True)
+    def allocate(self, region_names, region_sizes):
+        """This function returns the number of postcodes to sample from each region."""
+
+        if self.allocation == "equal":
+            allocation = np.full(len(region_sizes), self.n_per_region)
+        elif self.allocation in ("proportional", "weighted"):
+            sample_size = self.sample_size or self.n_per_region * len(region_sizes)
+            if self.allocation == "proportional":
+                weights = region_sizes.astype(float)
+            else:
+                weights = np.array([self.weights.get(region, 1) for region in region_names], dtype=float)
+            allocation = largest_remainder(sample_size, weights)
+        else:
+            raise ValueError(f"Unknown allocation: {self.allocation}")
+
+        if self.max_per_region:
+            allocation = np.minimum(allocation, self.max_per_region)
+
+        short_regions = region_names[allocation > region_sizes]
+        if len(short_regions):
+            logging.info(f"The following regions have fewer postcodes than requested, all of them are sampled: "
+                         f"{list(short_regions)}")
+        return np.minimum(allocation, region_sizes)
+
+    def load_postcodes(self):
+        """This function returns the postcode list sorted by region, from the binary copy if it is up to date."""
+
+        csv_path = os.getcwd() + "/Inputs/postalcodes.csv"
+        table_path = os.getcwd() + f"/Outputs/Cache/postalcodes.{TABLE_FORMAT}"
+
+        if os.path.exists(table_path) and os.path.getmtime(table_path) >= os.path.getmtime(csv_path):
+            if TABLE_FORMAT == "parquet":
+                return pd.read_parquet(table_path)
+            return pd.read_pickle(table_path)
+
+        logging.info("The postcode list changed, indexing it...")
+        pc_list = self.filter_sample(pc_list=pd.read_csv(csv_path, usecols=["postcode", "region_gpt",
+                                                                            "country_string"]))
+        # Regions are stored as categories in order of appearance, so the sample keeps the order of the CSV
+        pc_list = pd.DataFrame({
+            "postcode": pc_list["postcode"].to_numpy(),
+            "region_gpt": pd.Categorical(pc_list["region_gpt"], categories=pc_list["region_gpt"].unique()),
+        })
+        pc_list = pc_list.sort_values("region_gpt", kind="stable", ignore_index=True)
+
+        os.makedirs(os.path.dirname(table_path), exist_ok=True)
+        temporary_path = table_path + ".tmp"
+        if TABLE_FORMAT == "parquet":
+            pc_list.to_parquet(temporary_path, index=False)
+        else:
+            pc_list.to_pickle(temporary_path)
+        os.replace(temporary_path, table_path)
 
-        return pc_region_sample
+        return pc_list
 
     def filter_sample(self, pc_list):
         """This function removes offshore countries."""
 
-        excluded_countries = ["Isle of Man", "Guernsey", "Jersey"]
-        pc_list = pc_list.loc[~pc_list["country_string"].isin(excluded_countries)]
-        logging.info(f"Removed the following countries from the sample: {excluded_countries}")
-
-        # np.savetxt('real_estate_data.csv', pc_list["region_gpt"].unique(), delimiter=',', fmt='%s')
+        pc_list = pc_list.loc[~pc_list["country_string"].isin(self.excluded_countries)]
+        logging.info(f"Removed the following countries from the sample: {self.excluded_countries}")
 
         return pc_list
+
+
+def largest_remainder(total, weights):
+    """This function divides a total into whole numbers in proportion to the weights, handing the remaining units to
+    the largest fractions (Hamilton's method)."""
+    if weights.sum() <= 0:
+        return np.zeros(len(weights), dtype=int)
+    quotas = total * weights / weights.sum()
+    allocation = np.floor(quotas).astype(int)
+    remainders = quotas - allocation
+    allocation[np.argsort(-remainders, kind="stable")[:total - allocation.sum()]] += 1
+    return allocation
+
+
+def fill_quotas(budget, capacities):
+    """This function divides a budget of whole units as equally as possible, without giving anyone more than their
+    capacity. What is left by those with a small capacity goes to the others (water-filling). Units that do not divide
+    equally go to the first in line."""
+    capacities = np.asarray(capacities, dtype=int)
+    quotas = np.zeros(len(capacities), dtype=int)
+    budget = min(int(budget), int(capacities.sum()))
+
+    while budget > 0:
+        open_positions = np.flatnonzero(quotas < capacities)
+        share = budget // len(open_positions)
+        if share == 0:
+            quotas[open_positions[:budget]] += 1
+            break
+        added = np.minimum(share, capacities[open_positions] - quotas[open_positions])
+        quotas[open_positions] += added
+        budget -= added.sum()
+    return quotas
@@ -0,0 +1,89 @@
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+
+from Model_Components.Metrics import metrics
+
+
+class RetriesExhausted(Exception):
+    """Raised when a request failed on every attempt, with the error of the last attempt as its cause."""
+
+    def __init__(self, attempts, error):
+        super().__init__(f"Request failed {attempts} times, last with {error!r}")
+        self.attempts = attempts
+
+
+class RequestScheduler:
+    """This class paces every request to the website through one token bucket shared by all workers.
+    The allowed rate adapts to the health of the website: it climbs step by step towards max_rate while requests
+    succeed, and halves on every failure. Failed requests are retried with exponential backoff and jitter."""
+
+    def __init__(self, max_rate=1.0, min_rate=0.05, burst=1, max_attempts=5, backoff_base=2, backoff_max=120):
+        self.max_rate = max_rate  # requests per second when the website is healthy
+        self.min_rate = min_rate
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.rate = max_rate / 2  # start carefully, the rate climbs to max_rate when requests succeed
+        self.tokens = burst
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """This function blocks until a request may be sent."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+    def success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+    def failure(self):
+        metrics.increment("request_failures_total")
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            logging.info(f"Request failed, slowing down to {self.rate:.2f} requests per second.")
+
+    @contextmanager
+    def request(self):
+        """This function paces one request and reports its outcome, without retrying it."""
+        with metrics.timer("request_wait_seconds"):
+            self.acquire()
+        try:
+            yield
+        except Exception:
+            self.failure()
+            raise
+        self.success()
+
+    def call(self, func, *args, **kwargs):
+        """This function runs a request that is safe to repeat, retrying it with backoff until max_attempts.
+        After that, RetriesExhausted is raised, so callers know not to retry it again themselves."""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with self.request():
+                    return func(*args, **kwargs)
+            except Exception as error:
+                if attempt == self.max_attempts:
+                    raise RetriesExhausted(attempt, error) from error
+                delay = self.backoff_delay(attempt)
+                metrics.increment("request_retries_total")
+                logging.info(f"Request failed ({error.__class__.__name__}). Retrying in {delay:.1f} seconds..."
+                             f"(automatic attempt {attempt} of {self.max_attempts})")
+                time.sleep(delay)
+
+    def backoff_delay(self, attempt):
+        """Exponential backoff with full jitter: a random delay up to base * 2^attempt, capped at backoff_max."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
@@ -1,27 +1,68 @@
-import os
 import logging
+import math
 import time
+from datetime import datetime
+import numpy as np
 import pandas as pd
-import re
-from selenium import webdriver
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 
-from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
 
-from Model_Components.HelperFunctions import timeit, ensure_connect
+from Model_Components.HelperFunctions import timeit
 from Model_Components.Mining import TextMiner
+from Model_Components.Sampling import fill_quotas
+from Model_Components.Backends import make_backend
+from Model_Components.Accumulating import RowAccumulator
+from Model_Components.Indexing import ListingIndex
+from Model_Components.Pipelining import Pipeline
+from Model_Components.Isolating import CircuitBreaker
+from Model_Components.Scheduling import RetriesExhausted
+from Model_Components.Metrics import metrics
 
 
 class DataScraper:
     """This class handles the connecting and scraping of Rightmove"""
-    def __init__(self, pc_sample, n_per_region, fields_of_interest):
+
+    pipeline_size = 8  # pages waiting between the stages of the scraping pipeline, 0 scrapes the pages one by one
+    def __init__(self, pc_sample, n_per_region, fields_of_interest, session_settings=None, n_workers=1,
+                 backend="selenium", incremental=False, rate_settings=None, archive_settings=None,
+                 quota_settings=None, fault_settings=None):
         # Base parameters
         self.pc_sample = pc_sample
         self.n_per_region = n_per_region
         self.fields_of_interest = fields_of_interest
-        self.raw_data_cols = (["postcode"] + list(self.fields_of_interest.keys()))
+        self.raw_data_cols = (["listing_id", "postcode", "region_gpt"] + list(self.fields_of_interest.keys()))
         self.raw_data = pd.DataFrame(columns=self.raw_data_cols)
+        self.rows = RowAccumulator(self.raw_data_cols)  # raw_data is only built from the rows when needed
+        self.text_miner = TextMiner(self.fields_of_interest["text_values"])  # phrases are compiled once per run
+        self.n_workers = n_workers
+
+        # Incremental runs keep an index of all listings seen before, and stop paginating once a page has no news
+        self.listing_index = ListingIndex(run_id=datetime.now().strftime("%Y%m%d%H%M%S")) if incremental else None
+        self.early_stopped = set()
+
+        # With listing quotas, every postcode gets its first page and the pages left in the budget of the region are
+        # shared out afterwards, instead of paginating every postcode to its last page
+        quota_settings = quota_settings or {}
+        self.listings_per_region = quota_settings.get("listings_per_region")
+        self.listings_per_postcode = quota_settings.get("listings_per_postcode")
+        self.quota_phase = 0  # 0: scraping the first pages of the region, 1: scraping the pages allocated after that
+        self.page_quotas = {}  # postcode -> pages to scrape, for the current region
+        self.page_counts = {}  # postcode -> [pages available, pages scraped, listings scraped]
+        self.page_depths = {}  # postcode -> pages available, as found by the scraping workers
+
+        # A postcode that fails is retried from the page it failed at, up to max_attempts times, and then set aside
+        # in the dead letters, so the rest of the run goes on. The circuit breaker pauses scraping when many fail.
+        fault_settings = dict(fault_settings or {})
+        self.max_attempts = fault_settings.pop("max_attempts", 3)
+        self.circuit_breaker = CircuitBreaker(**fault_settings)
+        self.dead_letters = []  # {"postcode", "first_page", "last_page" (exclusive, None: all), "attempts", "error"}
+
+        # The backend fetches the result pages, eg. with pooled browsers (selenium), plain HTTP requests (http) or
+        # from the pages recorded in earlier runs (replay)
+        self.backend = make_backend(backend, n_workers=n_workers, session_settings=session_settings,
+                                    rate_settings=rate_settings, archive_settings=archive_settings)
 
 
     @timeit
@@ -29,121 +70,376 @@ class DataScraper:
         """This function scrapes all the data that is of interest, for all properties in the sample range."""
 
         unique_regions = self.pc_sample["region_gpt"].unique()
+        region_sizes = self.pc_sample.groupby("region_gpt", sort=False).size()  # regions can differ in sample size
         remaining_regions = unique_regions[self.current_j:]
 
         for region in remaining_regions:
+            region_pcs = list(self.pc_sample.loc[self.pc_sample["region_gpt"] == region, "postcode"])
+            region_start = time.perf_counter()
 
-            for pc in self.pc_sample.loc[self.pc_sample["region_gpt"] == region, "postcode"]:
-                self.current_pc = pc
-                browser = self.load_for_postal(pc)
-                pages_to_scrape = self.record_depth(browser)
-                page_index = self.current_page
-                for page in range(page_index, pages_to_scrape):
-                    self.current_page = page
-
-                    if page > 0:
-                        self.flip_page(browser)
-
-                    page_data = self.extract_data(browser, pc)
-                    self.raw_data = pd.concat([self.raw_data, page_data], ignore_index=True)
-                self.current_page = 1
-
-                if self.current_i >= self.n_per_region:
-                    self.current_i = 0
-                    self.current_j += 1
-
-                self.current_completion = ((self.current_j * self.n_per_region + self.current_i) / len(self.pc_sample['region_gpt']))
-                logging.info(f"Scraping {round(100 * self.current_completion, 1)}% complete.")
-                self.current_i += 1
-
-
+            if not self.has_quotas():
+                self.scrape_postcodes(region, region_pcs, region_sizes)
+            else:
+                if self.quota_phase == 0:  # the first pages tell how many pages every postcode has
+                    self.scrape_postcodes(region, region_pcs, region_sizes, page_limits=dict.fromkeys(region_pcs, 1),
+                                          last_pass=False)
+                self.scrape_postcodes(region, region_pcs, region_sizes, start_page=1, page_limits=self.page_quotas)
 
+            metrics.observe("region_seconds", time.perf_counter() - region_start, region=region)
             self.current_region = region
             logging.info(f"Scraping {region} complete.")
 
+        self.raw_data = self.rows.to_frame()
         logging.info(f"Scraping completed. {len(self.raw_data)} properties have been found.")
+        if self.dead_letters:
+            logging.info(f"{len(self.dead_letters)} postcodes (or pages) could not be scraped and were set aside: "
+                         f"{', '.join(letter['postcode'] for letter in self.dead_letters)}")
 
         return self.raw_data
 
-    def load_for_postal(self, postal_code):
-        """This function accesses Rightmove and navigates to the first page of available properties."""
+    def scrape_postcodes(self, region, region_pcs, region_sizes, start_page=0, page_limits=None, last_pass=True):
+        """This function scrapes one pass over the postcodes of a region, from start_page up to the page limit of each
+        postcode (all pages by default). Regions with quotas take two passes, the first one for the first pages."""
 
-        chrome_driver_path = Service(os.getcwd() + "/chromedriver_win32/chromedriver.exe")
+        remaining_pcs = region_pcs[self.current_i - 1:]  # current_i - 1 postcodes of the region are done
 
-        browser = webdriver.Chrome(service=chrome_driver_path)
-        url = "https://www.rightmove.co.uk/"
-        ensure_connect(lambda: browser.get(url))
-
-        search_box = browser.find_element(By.CSS_SELECTOR, 'input[name="typeAheadInputField"]')
-        search_box.send_keys(postal_code)
-        search_box.send_keys(Keys.RETURN)
-
-        find_properties_button = browser.find_element(By.ID, 'submit')
-        find_properties_button.click()
-
-        return browser
-
-    def record_depth(self, browser):
-        """This function records how many pages there are on the website for the postcode."""
+        # Closing the postcodes right away stops the workers of this pass when it fails
+        with closing(self.iterate_postcodes(remaining_pcs, start_page, page_limits)) as postcodes:
+            for pc, pages in postcodes:
+                self.current_pc = pc
+                page_counts = self.page_counts.setdefault(pc, [0, 0, 0]) if self.has_quotas() else None
+                for page, page_data in pages:
+                    with metrics.timer("accumulation_seconds"):
+                        self.rows.append(page_data, postcode=pc, region_gpt=region)
+                    metrics.increment("pages_scraped_total", region=region)
+                    metrics.increment("listings_scraped_total", len(page_data), region=region)
+                    if page_counts is not None:
+                        # The pages available are cached with the first page, a resumed run does not load it again
+                        page_counts[0] = self.page_depths.get(pc, page_counts[0])
+                        page_counts[1] += 1
+                        page_counts[2] += len(page_data)
+                    self.current_page = page + 1
+                    self.checkpoint(page_data, postcode=pc, region_gpt=region)
+                    if self.listing_index:
+                        self.listing_index.record(page_data, pc, region)
+                self.current_page = 0
+
+                depth = self.page_depths.pop(pc, None)
+                if page_counts is not None and depth is not None:
+                    page_counts[0] = depth
+
+                # Listings missing from a postcode only count as removed if it was scraped to its last page
+                if self.listing_index and last_pass and pc not in self.early_stopped and not self.quarantined(pc) \
+                        and (page_counts is None or page_counts[1] >= page_counts[0]):
+                    self.listing_index.finish_postcode(pc)
+
+                if self.current_i >= len(region_pcs):
+                    self.current_i = 0
+                    if last_pass:
+                        self.current_j += 1
+                        self.quota_phase = 0
+                    else:
+                        self.quota_phase = 1
+                        self.page_quotas = self.allocate_pages(region_pcs)
+
+                region_progress = self.current_i if not self.has_quotas() \
+                    else (self.current_i + self.quota_phase * len(region_pcs)) / 2
+                self.current_completion = ((region_sizes.iloc[:self.current_j].sum() + region_progress) / len(self.pc_sample['region_gpt']))
+                logging.info(f"Scraping {round(100 * self.current_completion, 1)}% complete.")
+                self.current_i += 1
+                self.checkpoint()
+                if last_pass:
+                    metrics.increment("postcodes_scraped_total", region=region)
+                metrics.maybe_export()
+
+    def has_quotas(self):
+        return bool(self.listings_per_region or self.listings_per_postcode)
+
+    def allocate_pages(self, region_pcs):
+        """This function decides how many pages to scrape of every postcode of a region, once their first pages are
+        scraped. The pages left in the budget of the region are shared out equally, and what postcodes with fewer
+        pages leave goes to the postcodes with more pages. No postcode gets more than its quota."""
+
+        per_page = self.backend.results_per_page
+        page_counts = [self.page_counts.get(pc, [0, 0, 0]) for pc in region_pcs]
+
+        capacities = np.array([0 if pc in self.early_stopped or self.quarantined(pc) else max(available - 1, 0)
+                               for pc, (available, _, _) in zip(region_pcs, page_counts)])
+        if self.listings_per_postcode:
+            capacities = np.minimum(capacities, max(math.ceil(self.listings_per_postcode / per_page) - 1, 0))
+
+        if self.listings_per_region:
+            listings_left = max(self.listings_per_region - sum(listings for _, _, listings in page_counts), 0)
+            budget = math.ceil(listings_left / per_page)
+        else:
+            budget = int(capacities.sum())
+
+        extra_pages = fill_quotas(budget, capacities)
+        logging.info(f"Scraping {int(extra_pages.sum())} more pages of {int(capacities.sum())} available in this region.")
+        metrics.increment("pages_skipped_total", int(capacities.sum() - extra_pages.sum()))
+        return {pc: 1 + int(pages) for pc, pages in zip(region_pcs, extra_pages)}
+
+    def sampling_weights(self):
+        """This function returns the sampling weight of every postcode scraped with quotas: the pages it has divided by
+        the pages that were scraped. Weighting the listings by it corrects for the pages that were skipped."""
+        if not self.has_quotas():
+            return None
+        weights = {pc: available / scraped for pc, (available, scraped, _) in self.page_counts.items() if scraped}
+        return pd.Series(weights, name="sampling_weight", dtype="float64").rename_axis("postcode")
+
+    def checkpoint(self, page_data=None, **constants):
+        """This function is called after every scraped page and every finished postcode. Caching scrapers use it to
+        save their progress, the plain scraper keeps everything in memory."""
+
+    def iterate_postcodes(self, region_pcs, start_page=0, page_limits=None):
+        """This function yields the pages of every postcode in the region, in sample order.
+        With more than one worker, postcodes are scraped ahead in parallel browsers and merged back in order,
+        so the output is identical to the serial run."""
+
+        page_limits = page_limits or {}
+
+        if self.n_workers <= 1 and self.pipeline_size and self.backend.pipelined:
+            yield from self.pipelined_postcodes(region_pcs, start_page, page_limits)
+            return
+
+        if self.n_workers <= 1:
+            first_page = max(self.current_page, start_page)
+            for pc in region_pcs:
+                yield pc, self.isolated_postcode(pc, first_page, page_limits.get(pc))
+                first_page = start_page
+            return
+
+        executor = ThreadPoolExecutor(max_workers=self.n_workers)
         try:
-            pages_element = browser.find_element(By.CSS_SELECTOR, 'div.pagination-pageSelect')
-            pages_string = pages_element.text
-
-            if not pages_string == '':
-                total_pages = int(pages_string.split()[-1])
-            else:
-                total_pages = 0
-
-            if isinstance(total_pages, type(None)):
-                print("glitch1")
-
-            return total_pages
-
-        except:
-            print("glitch2")
-
-    def flip_page(self, browser):
-        """This function flips to the next page in the list of properties."""
-
-        next_button = browser.find_element(By.CSS_SELECTOR, 'button.pagination-direction--next')
-        next_button.click()
-        time.sleep(1)
-        return
-
-    def extract_data(self, browser, pc):
-        """This function loops through every property on the current page and extracts all fields of interest."""
+            futures = [executor.submit(lambda pc, first_page: list(self.isolated_postcode(pc, first_page,
+                                                                                          page_limits.get(pc))),
+                                       pc, max(self.current_page, start_page) if k == 0 else start_page)
+                       for k, pc in enumerate(region_pcs)]
+            for pc, future in zip(region_pcs, futures):
+                yield pc, future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def pipelined_postcodes(self, region_pcs, start_page, page_limits):
+        """This function is the pipelined version of scraping the postcodes one by one. Pages are fetched, extracted
+        and text mined in separate threads, while the pages before them are still in the next stages, and the caller
+        accumulates and caches them. The fetching thread stops once a postcode stops early, and the pages it already
+        fetched beyond that are dropped, so the output is identical to the serial run."""
+
+        pipeline = Pipeline(self.fetch_pages(region_pcs, start_page, page_limits),
+                            [("extract", lambda item: item[:2] + (self.extract_page(*item),)),
+                             ("mine", lambda item: item[:2] + (self.mine_page(item[2]),))],
+                            queue_size=self.pipeline_size, name="scraping")
+        with pipeline:
+            items = iter(pipeline)
+            for pc in region_pcs:
+                yield pc, self.postcode_pages(pc, items)
+
+    def fetch_pages(self, region_pcs, start_page, page_limits):
+        """This function is the first stage of the pipeline: it yields a snapshot of every page to scrape, and
+        (postcode, None, None) at the end of every postcode."""
+        first_page = max(self.current_page, start_page)
+        for pc in region_pcs:
+            page_limit = page_limits.get(pc)
+            next_page = first_page
+            for attempt in range(1, self.max_attempts + 1):  # a failed postcode is retried from the failed page
+                if page_limit is not None and next_page >= page_limit:
+                    break
+                self.circuit_breaker.wait()
+                attempt_page = next_page
+                try:
+                    with metrics.profile(pc), self.backend.session() as session:
+                        with metrics.timer("page_load_seconds"):
+                            results_page = self.backend.load_for_postal(session, pc, attempt_page)
+                        pages_to_scrape = self.backend.record_depth(results_page)
+                        self.page_depths[pc] = pages_to_scrape
+                        last_page = pages_to_scrape if page_limit is None else min(pages_to_scrape, page_limit)
+                        for page in range(attempt_page, last_page):
+                            if pc in self.early_stopped:
+                                break
+                            if page > attempt_page:
+                                with metrics.timer("page_load_seconds"):
+                                    self.backend.flip_page(results_page)
+                            snapshot = self.backend.snapshot(results_page)
+                            next_page = page + 1
+                            yield pc, page, snapshot
+                            self.backend.page_loaded(session)
+                except Exception as error:
+                    if self.postcode_failed(pc, next_page, page_limit, attempt, error):
+                        continue
+                    break
+                self.circuit_breaker.record(True)
+                break
+            yield pc, None, None
+            first_page = start_page
+
+    def extract_page(self, pc, page, snapshot):
+        """A page that can not be extracted is set aside on its own, the pages after it were fetched already. The
+        circuit breaker is not told: fetching the postcode was recorded already, and the website did respond."""
+        if page is None:
+            return None
+        try:
+            page_data, _ = self.timed_extraction(snapshot, pc, page, mine=False)
+        except Exception as error:
+            self.quarantine(pc, page, page + 1, 1, error)
+            return None
+        return page_data
+
+    def mine_page(self, page_data):
+        if page_data is None or not self.fields_of_interest["text"]:
+            return page_data
+        return self.mine_data(page_data)
+
+    def postcode_pages(self, pc, items):
+        """This function yields the pages of one postcode that come out of the pipeline, like scrape_postcode."""
+        for _, page, page_data in items:
+            if page is None:
+                return
+            if pc in self.early_stopped or page_data is None:  # fetched before the fetching thread knew, or failed
+                continue
+
+            unchanged = self.listing_index is not None and self.listing_index.all_unchanged(page_data)
+            yield page, page_data
+
+            if unchanged and page < self.page_depths.get(pc, 0) - 1:
+                logging.info(f"Page {page} of {pc} only has unchanged listings, skipping the older pages.")
+                self.early_stopped.add(pc)
+
+    def isolated_postcode(self, pc, first_page=0, last_page=None):
+        """This function yields the pages of a postcode like scrape_postcode, but an error only affects the postcode:
+        it is attempted again from the page that failed (pages are opened by URL), and set aside in the dead letters
+        once max_attempts attempts failed. Errors of the caller (eg. while caching a page) are not caught."""
+        next_page = first_page
+        for attempt in range(1, self.max_attempts + 1):
+            self.circuit_breaker.wait()
+            try:
+                for page, page_data in self.scrape_postcode(pc, next_page, last_page):
+                    next_page = page + 1
+                    yield page, page_data
+            except Exception as error:
+                if self.postcode_failed(pc, next_page, last_page, attempt, error):
+                    continue
+                return
+            self.circuit_breaker.record(True)
+            return
+
+    def postcode_failed(self, pc, page, last_page, attempt, error):
+        """This function records a failed attempt at a postcode and tells if it should be attempted again.
+        Requests that failed were already retried with backoff by the scheduler, so these are not attempted again:
+        a bad page is requested rate_settings["max_attempts"] times in total. Other errors (eg. a browser that
+        crashed, or a page that could not be read) get max_attempts attempts."""
+        self.circuit_breaker.record(False)
+        metrics.increment("postcode_failures_total")
+        if isinstance(error, RetriesExhausted):
+            self.quarantine(pc, page, last_page, error.attempts, error.__cause__)
+            return False
+        if attempt < self.max_attempts:
+            logging.info(f"Scraping {pc} failed at page {page} (attempt {attempt} of {self.max_attempts}), "
+                         f"retrying from that page: {error!r}")
+            return True
+        self.quarantine(pc, page, last_page, attempt, error)
+        return False
+
+    def quarantine(self, pc, first_page, last_page, attempts, error):
+        """This function sets pages of a postcode aside in the dead letters, which are kept with the cache."""
+        logging.info(f"Could not scrape {pc} from page {first_page}, setting it aside after {attempts} attempt(s): "
+                     f"{error!r}")
+        metrics.increment("postcodes_quarantined_total")
+        self.dead_letters.append({"postcode": pc, "first_page": first_page, "last_page": last_page,
+                                  "attempts": attempts, "error": repr(error)})
+
+    def quarantined(self, pc):
+        return any(letter["postcode"] == pc for letter in self.dead_letters)
+
+    def scrape_postcode(self, pc, first_page=0, last_page=None):
+        """This function yields the data of every page of properties for one postcode, up to last_page (exclusive)."""
+
+        if last_page is not None and first_page >= last_page:
+            return
+
+        extraction_time = 0
+        pages_extracted = 0
+
+        with metrics.profile(pc), self.backend.session() as session:
+            # Pages are opened by URL, so a resumed postcode starts right at the first page that was not scraped yet
+            with metrics.timer("page_load_seconds"):
+                results_page = self.backend.load_for_postal(session, pc, first_page)
+            pages_to_scrape = self.backend.record_depth(results_page)
+            self.page_depths[pc] = pages_to_scrape
+            last_page = pages_to_scrape if last_page is None else min(pages_to_scrape, last_page)
+            for page in range(first_page, last_page):
+
+                if page > first_page:
+                    with metrics.timer("page_load_seconds"):
+                        self.backend.flip_page(results_page)
+
+                page_data, page_time = self.timed_extraction(results_page, pc, page)
+                extraction_time += page_time
+                pages_extracted += 1
+
+                self.backend.page_loaded(session)
+                unchanged = self.listing_index is not None and self.listing_index.all_unchanged(page_data)
+                yield page, page_data
+
+                if unchanged and page < pages_to_scrape - 1:  # also stops the pages a quota would add later
+                    logging.info(f"Page {page} of {pc} only has unchanged listings, skipping the older pages.")
+                    self.early_stopped.add(pc)
+                    break
+
+        if pages_extracted:
+            logging.info(f"Extracted {pages_extracted} pages for {pc}, "
+                         f"taking {extraction_time / pages_extracted:.4f} seconds per page.")
+
+    def timed_extraction(self, results_page, pc, page, mine=True):
+        """This function extracts the data of a page like extract_data, and reports how long it took."""
+        start_time = time.perf_counter()
+        page_data = self.extract_data(results_page, pc, mine)
+        page_time = time.perf_counter() - start_time
+        metrics.observe("extraction_seconds", page_time)
+        logging.info(f"Extracted {len(page_data)} properties from page {page} of {pc} in {page_time:.4f} seconds.")
+        return page_data, page_time
+
+    def extract_data(self, results_page, pc, mine=True):
+        """This function loops through every property on the current page and extracts all fields of interest.
+        The rows are returned as dictionaries, the postcode and region are added when they are accumulated.
+        Without mine, the descriptions are left for mine_data."""
 
         properties_data = []
 
-        property_elements = browser.find_elements(By.CSS_SELECTOR, '.l-searchResult.is-list')
+        property_elements = self.backend.property_elements(results_page)
 
         for prop in property_elements:
-            property_data = self.extract_fields(prop)
+            property_data = self.extract_fields(prop, mine)
             properties_data.append(property_data)
 
-        properties_data = pd.DataFrame(properties_data)
-
-        properties_data["postcode"] = pc
+        return properties_data
 
+    def mine_data(self, properties_data):
+        """This function text mines the descriptions of the properties of a page extracted without mining."""
+        for property_data in properties_data:
+            self.mine_text(property_data)
         return properties_data
 
-    def extract_fields(self, prop):
-        """This function extracts the fields of interest from one property."""
+    def extract_fields(self, prop, mine=True):
+        """This function extracts the fields of interest from one property. Values are kept as the raw text of the
+        page, DataTransformer parses them into their proper types."""
 
         property_data = dict.fromkeys(self.raw_data_cols)
+        property_data["listing_id"] = self.extract_listing_id(prop)
 
         if self.fields_of_interest["price"]:
             try:
                 price_element = prop.find_element(By.CSS_SELECTOR, '.propertyCard-priceValue')
-                price = self.format_field(price_element.text)
+                price = price_element.text
             except:
                 price = None
             property_data["price"] = price
 
         if self.fields_of_interest["property_type"]:
             try:
-                property_type_element = prop.find_element(By.CSS_SELECTOR, '.property-information')
-                property_type = self.format_field(property_type_element.text)
+                # The type is the first text of the heading, the bedroom and bathroom counts follow it
+                property_type_element = prop.find_element(By.CSS_SELECTOR, '.property-information .text')
+                property_type = property_type_element.text
             except:
                 property_type = None
             property_data["property_type"] = property_type
@@ -151,7 +447,7 @@ class DataScraper:
         if self.fields_of_interest["bedrooms"]:
             try:
                 bedrooms_element = prop.find_element(By.CSS_SELECTOR, '.no-svg-bed-icon + .text')
-                bedrooms = self.format_field(bedrooms_element.text)
+                bedrooms = bedrooms_element.text
             except:
                 bedrooms = None
             property_data["bedrooms"] = bedrooms
@@ -159,57 +455,42 @@ class DataScraper:
         if self.fields_of_interest["bathrooms"]:
             try:
                 bathrooms_element = prop.find_element(By.CSS_SELECTOR, '.no-svg-bathroom-icon + .text')
-                bathrooms = self.format_field(bathrooms_element.text)
+                bathrooms = bathrooms_element.text
             except:
                 bathrooms = None
             property_data["bathrooms"] = bathrooms
 
         if self.fields_of_interest["text"]:
-            text_values, text = self.mine_text(prop)
-            property_data.update(text_values)
-            property_data["text"] = text
+            property_data.update(dict.fromkeys(self.fields_of_interest["text_values"].keys()))
+            property_data["text"] = self.extract_text(prop)
+            if mine:
+                self.mine_text(property_data)
 
         return property_data
 
-    def format_field(self, field_value):
-        """
-        Cleans and formats the input field_value by removing specific characters and converting to integer if possible.
-        """
-
-        field_value = field_value.replace('"', '')
-
+    def extract_listing_id(self, prop):
+        """This function extracts Rightmove's ID of the listing from the card (id="property-123456")."""
         try:
-            characters_to_remove = '£,'
-            result = field_value.translate(str.maketrans("", "", characters_to_remove))
-
-            try:
-                result = int(result)
-            except ValueError:
-                result = result
-
-            try:
-                pattern = r'\n\d+'
-                result = re.sub(pattern, '', result)
-            except:
-                result = result
-
+            card_id = prop.get_attribute("id") or ""
+            listing_id = card_id.replace("property-", "")
+            return listing_id if listing_id.isdigit() else None
         except:
-            result = field_value
-
-        return result
-
-    def mine_text(self, prop):
-        """Extract useful information from the property description using text mining. WIP"""
-
-        text_values = dict.fromkeys(self.fields_of_interest["text_values"].keys())
+            return None
 
+    def extract_text(self, prop):
+        """This function extracts the description of the property."""
         try:
             text_element = prop.find_element(By.CSS_SELECTOR, 'span[data-test="property-description"] span')
-            text = text_element.text.replace('"', '')
-            text_values = TextMiner(text, text_values).scan_contents()
+            return text_element.text
+        except:
+            return None
 
-            return text_values, text
+    def mine_text(self, property_data):
+        """Extract useful information from the property description using text mining. WIP"""
 
-        except:
+        text = property_data.get("text")
+        if text is None:
+            return
 
-            return text_values, None
+        with metrics.timer("text_mining_seconds"):
+            property_data.update(self.text_miner.scan_contents(text))
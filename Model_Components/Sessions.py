@@ -0,0 +1,235 @@
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from queue import Queue, Empty
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+
+from Model_Components.Metrics import metrics
+
+try:
+    import psutil
+except ImportError:  # memory based recycling is only available when psutil is installed
+    psutil = None
+
+
+class BrowserSession:
+    """This class wraps one Chrome instance and keeps track of how much it has been used."""
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.pages_loaded = 0
+
+    def is_alive(self):
+        """This function checks if the browser still responds to WebDriver commands."""
+        try:
+            self.browser.current_url
+            return True
+        except Exception:
+            return False
+
+    def memory_usage(self):
+        """This function returns the resident memory (MB) of chromedriver and all the Chrome processes it spawned."""
+        if psutil is None:
+            return None
+
+        try:
+            driver_process = psutil.Process(self.browser.service.process.pid)
+            processes = [driver_process] + driver_process.children(recursive=True)
+            return sum(process.memory_info().rss for process in processes) / 1024 ** 2
+        except Exception:
+            return None
+
+    def quit(self):
+        """This function closes the browser and all of its processes."""
+        try:
+            self.browser.quit()
+        except Exception:
+            logging.info("Browser session could not be closed cleanly, it was probably already dead.")
+
+
+# URL patterns of trackers and advertising on the result pages, which are never needed to read the listings
+TRACKER_URLS = ["*google-analytics.com*", "*googletagmanager.com*", "*googlesyndication.com*", "*doubleclick.net*",
+                "*adservice.google.*", "*facebook.net*", "*facebook.com/tr*", "*hotjar.com*", "*hotjar.io*",
+                "*bing.com/bat*", "*clarity.ms*", "*tiqcdn.com*", "*tealiumiq.com*", "*optimizely.com*",
+                "*criteo.*", "*taboola.com*", "*outbrain.com*", "*adsrvr.org*", "*amazon-adsystem.com*",
+                "*scorecardresearch.com*", "*quantserve.com*", "*onetrust.com*", "*cookielaw.org*", "*newrelic.com*",
+                "*nr-data.net*", "*sentry.io*", "*segment.io*", "*mpulse*", "*akstat.io*"]
+FONT_URLS = ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot", "*fonts.googleapis.com*", "*fonts.gstatic.com*"]
+IMAGE_URLS = ["*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*media.rightmove.co.uk*"]
+STYLESHEET_URLS = ["*.css"]
+
+
+class BrowserProfile:
+    """This class holds the options Chrome is started with. Scraping only reads the HTML of the result pages, so by
+    default Chrome runs headless, returns from a page load once the HTML is parsed (page_load_strategy "eager",
+    instead of waiting for every image and script) and does not download images, fonts or the URLs in blocked_urls
+    (trackers and advertising). Requests are blocked through the DevTools protocol (Network.setBlockedURLs), where
+    patterns can use * as a wildcard.
+    With measure_traffic, Chrome logs its network events, from which the bytes every page transferred are counted."""
+
+    def __init__(self, headless=True, page_load_strategy="eager", block_images=True, block_fonts=True,
+                 block_stylesheets=False, blocked_urls=None, measure_traffic=True, window_size=(1366, 900),
+                 driver_path=None):
+        self.headless = headless
+        self.page_load_strategy = page_load_strategy  # "normal", "eager" or "none"
+        self.block_images = block_images
+        self.block_fonts = block_fonts
+        self.block_stylesheets = block_stylesheets  # the result cards are found without CSS, but not styled
+        self.blocked_urls = TRACKER_URLS if blocked_urls is None else list(blocked_urls)
+        self.measure_traffic = measure_traffic
+        self.window_size = window_size
+        self.driver_path = driver_path or os.getcwd() + "/chromedriver_win32/chromedriver.exe"
+
+    def options(self):
+        options = webdriver.ChromeOptions()
+        options.page_load_strategy = self.page_load_strategy
+        if self.headless:
+            options.add_argument("--headless=new")
+        options.add_argument(f"--window-size={self.window_size[0]},{self.window_size[1]}")
+        options.add_argument("--disable-extensions")
+        options.add_argument("--disable-background-networking")  # no update checks, safe browsing lists...
+        options.add_argument("--no-first-run")
+        options.add_argument("--mute-audio")
+
+        if self.block_images:
+            options.add_argument("--blink-settings=imagesEnabled=false")
+            options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+
+        if self.measure_traffic:
+            options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+            options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+        return options
+
+    def url_patterns(self):
+        """This function lists the URL patterns that are blocked, by type of resource and explicitly."""
+        patterns = list(self.blocked_urls)
+        if self.block_images:
+            patterns += IMAGE_URLS
+        if self.block_fonts:
+            patterns += FONT_URLS
+        if self.block_stylesheets:
+            patterns += STYLESHEET_URLS
+        return patterns
+
+    def start_browser(self):
+        browser = webdriver.Chrome(service=Service(self.driver_path), options=self.options())
+        patterns = self.url_patterns()
+        if patterns:
+            browser.execute_cdp_cmd("Network.enable", {})
+            browser.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        return browser
+
+    def read_traffic(self, browser):
+        """This function returns the bytes transferred over the network (compressed, with headers) and the number
+        of blocked requests since it was last called, or None if traffic is not measured."""
+        if not self.measure_traffic:
+            return None
+
+        transferred_bytes = 0
+        blocked_requests = 0
+        for entry in browser.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            if message["method"] == "Network.loadingFinished":
+                transferred_bytes += message["params"].get("encodedDataLength", 0)
+            elif message["method"] == "Network.loadingFailed" and (
+                    message["params"].get("blockedReason") or
+                    message["params"].get("errorText") == "net::ERR_BLOCKED_BY_CLIENT"):
+                blocked_requests += 1
+        return int(transferred_bytes), blocked_requests
+
+
+class BrowserPool:
+    """This class manages a pool of warm browser sessions that are reused across postcodes.
+    Sessions are recycled after max_pages pages or once they exceed max_memory MB, dead sessions are replaced.
+    Every browser is started with the settings of profile (see BrowserProfile)."""
+
+    def __init__(self, size=1, max_pages=50, max_memory=None, profile=None):
+        self.size = size
+        self.max_pages = max_pages
+        self.max_memory = max_memory
+        self.profile = BrowserProfile(**(profile or {}))
+
+        self.idle_sessions = Queue()
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    def start_browser(self):
+        """This function starts a new Chrome instance."""
+        return self.profile.start_browser()
+
+    def borrow(self):
+        """This function hands out an idle session, starting a new one if the pool is not full yet."""
+        while True:
+            session = self.add_session() if self.idle_sessions.empty() else None
+            if session is None:  # reuse a warm session, or wait for another worker to return one
+                try:
+                    session = self.idle_sessions.get(timeout=1)
+                except Empty:
+                    continue
+
+            if session.is_alive():
+                return session
+
+            logging.info("Found a dead browser session. Replacing it...")
+            metrics.increment("browsers_died_total")
+            self.discard(session)
+
+    def give_back(self, session):
+        """This function returns a session to the pool or recycles it once it has been used up."""
+        if self.needs_recycling(session):
+            logging.info(f"Recycling browser session after {session.pages_loaded} pages.")
+            metrics.increment("browsers_recycled_total")
+            self.discard(session)
+        else:
+            self.idle_sessions.put(session)
+
+    @contextmanager
+    def session(self):
+        """This function lends out a session for the duration of a with-block.
+        A session that was in use when an error occurred is discarded, as its state can no longer be trusted."""
+        session = self.borrow()
+        try:
+            yield session
+        except BaseException:
+            self.discard(session)
+            raise
+        self.give_back(session)
+
+    def add_session(self):
+        with self.lock:
+            if len(self.sessions) >= self.size:
+                return None
+            with metrics.timer("browser_start_seconds"):
+                session = BrowserSession(self.start_browser())
+            self.sessions.append(session)
+        return session
+
+    def needs_recycling(self, session):
+        if self.max_pages and session.pages_loaded >= self.max_pages:
+            return True
+        if self.max_memory:
+            memory_usage = session.memory_usage()
+            if memory_usage and memory_usage >= self.max_memory:
+                logging.info(f"Browser session uses {memory_usage:.0f}MB of memory (limit is {self.max_memory}MB).")
+                return True
+        return False
+
+    def discard(self, session):
+        with self.lock:
+            if session in self.sessions:
+                self.sessions.remove(session)
+        session.quit()
+
+    def shutdown(self):
+        """This function closes every session in the pool."""
+        with self.lock:
+            sessions, self.sessions = self.sessions, []
+        for session in sessions:
+            session.quit()
+        self.idle_sessions = Queue()
+        if sessions:
+            logging.info(f"Closed {len(sessions)} browser session(s).")
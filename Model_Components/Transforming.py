@@ -1,30 +1,172 @@
 import logging
 
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401 (only needed for the compact string dtype)
+    TEXT_DTYPE = pd.StringDtype("pyarrow")
+except ImportError:
+    TEXT_DTYPE = pd.StringDtype()
+
+
 class DataTransformer:
-    """This class is responsible for transforming the raw data to clean data ready for export."""
-    def __init__(self, raw_data):
+    """This class is responsible for transforming the raw data to clean data ready for export.
+    The raw data holds the text as it was scraped, the schema declares the type every column is parsed into."""
+
+    schema = {
+        "listing_id": "Int64",
+        "postcode": "category",
+        "region_gpt": "category",
+        "price": "Int32",
+        "property_type": "category",
+        "bedrooms": "Int8",
+        "bathrooms": "Int8",
+        "text": "text",
+        "text_values": "text",  # placeholder column of the scraper, the phrases each get a column of their own
+    }
+    id_columns = ["listing_id", "postcode", "region_gpt"]  # columns that are filled for every row, even if nothing was scraped
+
+    def __init__(self, raw_data, sampling_weights=None):
         self.raw_data = raw_data
+        self.sampling_weights = sampling_weights  # weight per postcode, for runs scraped with listing quotas
 
     @property
     def clean_data(self):
-        """Removes duplicates and empty rows from the dataset and report clean sample size"""
+        """Parses the raw data, removes duplicates and empty rows from the dataset and report clean sample size"""
 
         while True:
             try:
                 if len(self.raw_data) == 0:
                     logging.info("Dataset is empty.Exiting program!")
                     break
-                nonduplicated_data = self.raw_data.drop_duplicates()
-                duplicates_attrition = (len(self.raw_data) - len(nonduplicated_data)) / len(self.raw_data) * 100
-                logging.info(f"Attrition due to duplicates is {round(duplicates_attrition,1)}%")
-
-                clean_data = nonduplicated_data[nonduplicated_data.iloc[:, 1:].notnull().any(axis=1)]
-                true_sample = len(clean_data)
-                attrition = (len(nonduplicated_data) - true_sample) / len(nonduplicated_data) * 100
-                logging.info(f"Attrition due to empty rows is {round(attrition,1)}%")
-                logging.info(f"After removing duplicates and empty rows, a sample of {true_sample} remains.")
-                return clean_data
+                typed_data = self.apply_schema(self.raw_data)
+                nonduplicated_data = typed_data.drop_duplicates()
+                clean_data = self.drop_empty_rows(nonduplicated_data)
+                self.report_attrition(len(self.raw_data), len(nonduplicated_data), len(clean_data))
+                return self.add_sampling_weights(clean_data)
             except Exception:
                 print(Exception)
                 input("Could not transform data! Figure out why and press Enter")
 
+    def stream_clean_data(self):
+        """This function is the streaming version of clean_data, for raw data that does not fit in memory. The raw
+        data is an iterable of chunks (eg. pd.read_csv with a chunksize), which are cleaned and yielded one at a time.
+        Duplicates are found across chunks with a set of row fingerprints, which takes 8 bytes per unique row."""
+
+        fingerprints = FingerprintSet()
+        n_raw = n_nonduplicated = n_clean = 0
+
+        for raw_chunk in self.raw_data:
+            typed_chunk = self.apply_schema(raw_chunk)
+            row_fingerprints = pd.util.hash_pandas_object(typed_chunk, index=False).to_numpy()
+            nonduplicated_chunk = typed_chunk[fingerprints.add(row_fingerprints)]
+            clean_chunk = self.drop_empty_rows(nonduplicated_chunk)
+
+            n_raw += len(raw_chunk)
+            n_nonduplicated += len(nonduplicated_chunk)
+            n_clean += len(clean_chunk)
+            if len(clean_chunk):
+                yield self.add_sampling_weights(clean_chunk)
+
+        if n_raw == 0:
+            logging.info("Dataset is empty.")
+            return
+        self.report_attrition(n_raw, n_nonduplicated, n_clean)
+
+    def drop_empty_rows(self, data):
+        data_columns = [column for column in data.columns if column not in self.id_columns]
+        return data[data[data_columns].notnull().any(axis=1)]
+
+    def add_sampling_weights(self, data):
+        """Listings of postcodes that were not scraped to their last page weigh more, see DataScraper.allocate_pages.
+        Postcodes without a weight were scraped completely and weigh 1."""
+        if self.sampling_weights is None:
+            return data
+        weights = data["postcode"].astype("string").map(self.sampling_weights).astype("Float32").fillna(1)
+        return data.assign(sampling_weight=weights)
+
+    @staticmethod
+    def report_attrition(n_raw, n_nonduplicated, n_clean):
+        duplicates_attrition = (n_raw - n_nonduplicated) / n_raw * 100
+        logging.info(f"Attrition due to duplicates is {round(duplicates_attrition,1)}%")
+        attrition = (n_nonduplicated - n_clean) / n_nonduplicated * 100 if n_nonduplicated else 0
+        logging.info(f"Attrition due to empty rows is {round(attrition,1)}%")
+        logging.info(f"After removing duplicates and empty rows, a sample of {n_clean} remains.")
+
+    def apply_schema(self, raw_data):
+        """This function parses every column into the type the schema declares, with vectorized string operations.
+        Columns outside the schema are the mined text values, which become nullable booleans. Types only depend on
+        the columns, never on the values, so every chunk of a stream gets the same types."""
+
+        typed_data = {}
+        for column in raw_data.columns:
+            values = raw_data[column]
+            dtype = self.schema.get(column)
+
+            if dtype in ("Int8", "Int16", "Int32", "Int64"):
+                typed_data[column] = self.parse_integers(values, dtype)
+            elif column == "property_type":
+                typed_data[column] = self.parse_property_type(values).astype(dtype)
+            elif dtype == "category":
+                typed_data[column] = self.parse_text(values).astype("category")
+            elif dtype == "text":
+                typed_data[column] = self.parse_text(values).astype(TEXT_DTYPE)
+            else:
+                typed_data[column] = self.parse_booleans(values)
+
+        return pd.DataFrame(typed_data, index=raw_data.index)
+
+    @staticmethod
+    def parse_text(values):
+        """Removes quotes, trailing counters on new lines (eg. "Flat\\n2") and surrounding whitespace."""
+        return (values.astype("string")
+                .str.replace('"', '', regex=False)
+                .str.replace(r'\n\d+', '', regex=True)
+                .str.strip()
+                .replace("", pd.NA))
+
+    @classmethod
+    def parse_property_type(cls, values):
+        """Keeps the type of the property, without the bedroom and bathroom counts that follow it when the whole
+        heading was scraped, on new lines (eg. "Flat\\n2\\n1") or on the same line (eg. "Flat 2 1")."""
+        return cls.parse_text(values).str.replace(r'(?:\s+\d+)+$', '', regex=True).replace("", pd.NA)
+
+    @classmethod
+    def parse_integers(cls, values, dtype):
+        """Keeps the first number of a value (eg. "£350,000" -> 350000, "2.0" -> 2).
+        Values without a number (eg. "POA") are missing."""
+        digits = cls.parse_text(values).str.replace(',', '', regex=False).str.extract(r'(\d+)', expand=False)
+        return pd.to_numeric(digits, errors="coerce").astype(dtype)
+
+    @staticmethod
+    def parse_booleans(values):
+        """Keeps True and False (also as text, when read back from a CSV), anything else is missing."""
+        return values.map({True: True, False: False, "True": True, "False": False}).astype("boolean")
+
+
+class FingerprintSet:
+    """This class is a compact set of 64 bit row fingerprints, kept as a few sorted arrays. New fingerprints are added
+    as a new sorted array, and the arrays are merged once there are more than max_runs of them."""
+
+    max_runs = 8
+
+    def __init__(self):
+        self.runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    def add(self, fingerprints):
+        """This function adds an array of fingerprints and returns a mask of the ones that were not in the set yet.
+        Of a fingerprint that occurs several times in the array, only the first occurrence counts as new."""
+        new = ~pd.Series(fingerprints).duplicated().to_numpy()
+        for run in self.runs:
+            positions = np.minimum(np.searchsorted(run, fingerprints), len(run) - 1)
+            new &= run[positions] != fingerprints
+
+        if new.any():
+            self.runs.append(np.sort(fingerprints[new]))
+        if len(self.runs) > self.max_runs:
+            self.runs = [np.sort(np.concatenate(self.runs))]
+        return new
@@ -0,0 +1,68 @@
+import json
+import os
+import sys
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Benchmarks import Fixtures  # noqa: E402
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serves Rightmove-like pages: the typeahead of every postcode, result pages generated by Benchmarks.Fixtures
+    (POSTCODE^<postcode>, 3 pages each) and the images and stylesheet these pages link to."""
+
+    protocol_version = "HTTP/1.1"
+    pages = 3
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        self.server.requests[self.path] += 1
+
+        if self.path in self.server.failing_paths:
+            return self.respond(500, b"", "text/plain")
+        if url.path.startswith("/typeAhead/uknostreet/"):
+            postcode = url.path[len("/typeAhead/uknostreet/"):].replace("/", "")
+            location = {"locationIdentifier": f"POSTCODE^{postcode}", "normalisedSearchTerm": postcode}
+            return self.respond(200, json.dumps({"typeAheadLocations": [location]}).encode(), "application/json")
+        if url.path == "/property-for-sale/find.html":
+            postcode = query["locationIdentifier"][0].split("^")[1]
+            page = int(query.get("index", ["0"])[0]) // 24
+            seed = sum(map(ord, postcode)) * 10 + page  # every page of every postcode has listings of its own
+            html = Fixtures.result_page_html(pages=self.pages, page=page, seed=seed)
+            return self.respond(200, html.encode(), "text/html; charset=utf-8")
+        if url.path.startswith("/img/"):
+            return self.respond(200, bytes(20000), "image/jpeg")
+        if url.path == "/styles.css":
+            return self.respond(200, b"body { margin: 0; }", "text/css")
+        return self.respond(404, b"", "text/plain")
+
+    def respond(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def fixture_server():
+    """A local HTTP server with the fixture pages. It counts the requests per path, and answers the paths in
+    failing_paths with an error."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    server.requests = Counter()
+    server.failing_paths = set()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
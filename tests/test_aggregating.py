@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Model_Components.Aggregating import RegionalAggregates
+
+
+def clean_data(n_rows, seed=0):
+    """Clean data with log-normal prices, about 3% of them missing."""
+    rng = np.random.default_rng(seed)
+    prices = np.round(np.exp(rng.normal(12.5, 0.6, size=n_rows)))
+    prices[rng.random(n_rows) < 0.03] = np.nan
+    return pd.DataFrame({
+        "postcode": pd.Categorical(rng.choice(["AB10", "AB11", "G1", "G2"], size=n_rows)),
+        "region_gpt": pd.Categorical(rng.choice(["Scotland", "Wales"], size=n_rows)),
+        "price": pd.array(prices, dtype="Float64").astype("Int32"),
+        "property_type": pd.Categorical(rng.choice(["Flat", "Detached house"], size=n_rows)),
+        "bedrooms": pd.array(rng.integers(1, 4, size=n_rows), dtype="Int8"),
+        "garden": pd.array(rng.random(n_rows) < 0.4, dtype="boolean"),
+    })
+
+
+def aggregate(path, run_id, chunks, relative_accuracy=0.01):
+    aggregates = RegionalAggregates(str(path), run_id=run_id, relative_accuracy=relative_accuracy)
+    aggregates.reset()
+    for chunk in chunks:
+        aggregates.add(chunk)
+    return aggregates
+
+
+@pytest.mark.parametrize("relative_accuracy", [0.01, 0.05])
+def test_quantiles_are_within_the_relative_accuracy(tmp_path, relative_accuracy):
+    data = clean_data(20000)
+    aggregates = aggregate(tmp_path / "aggregates.sqlite", "run", [data], relative_accuracy)
+
+    summary = aggregates.summary("region", by=[], quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)).set_index("region")
+    for region, prices in data.groupby("region_gpt", observed=True)["price"]:
+        prices = prices.dropna().to_numpy()
+        for q in (0.05, 0.25, 0.5, 0.75, 0.95):
+            true_price = np.quantile(prices, q, method="inverted_cdf")
+            estimate = summary.loc[region, f"p{round(q * 100):g}_price"]
+            assert abs(estimate - true_price) <= relative_accuracy * true_price + 0.5, (region, q)
+        assert summary.loc[region, "listings"] == (data["region_gpt"] == region).sum()
+        assert summary.loc[region, "mean_price"] == pytest.approx(prices.mean())
+    aggregates.close()
+
+
+def test_chunks_and_runs_merge_into_the_summary_of_all_data(tmp_path):
+    data = clean_data(6000, seed=1)
+    at_once = aggregate(tmp_path / "at_once.sqlite", "run", [data])
+
+    path = tmp_path / "chunked.sqlite"
+    aggregate(path, "first", [data.iloc[:1000], data.iloc[1000:3000]]).close()
+    second = aggregate(path, "second", [data.iloc[3000:4500]])
+    second.add(data.iloc[4500:])
+    second.close()
+    merged = RegionalAggregates(str(path), run_id="second")  # reopened, the state is kept in SQLite
+
+    for level in ("region", "postcode"):
+        expected = at_once.summary(level)
+        pd.testing.assert_frame_equal(merged.summary(level, run_ids=["first", "second"]), expected)
+    assert merged.runs() == ["first", "second"]
+    assert merged.summary("region", by=[])["listings"].sum() == 4500 - 3000 + 1500
+    at_once.close()
+    merged.close()
+
+
+def test_sampling_weights_count_listings(tmp_path):
+    data = clean_data(4000, seed=2)
+    weighted = data.assign(sampling_weight=np.where(data["region_gpt"] == "Wales", 2.0, 1.0))
+    summary = aggregate(tmp_path / "aggregates.sqlite", "run", [weighted]).summary("region", by=[]).set_index("region")
+
+    assert summary.loc["Wales", "weight"] == 2 * summary.loc["Wales", "listings"]
+    assert summary.loc["Scotland", "weight"] == summary.loc["Scotland", "listings"]
+    garden_share = data.loc[data["region_gpt"] == "Wales", "garden"].mean()
+    assert summary.loc["Wales", "garden"] == pytest.approx(garden_share)
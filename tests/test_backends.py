@@ -0,0 +1,129 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+from selenium.webdriver.common.by import By
+
+from Model_Components.Archiving import PageArchive
+from Model_Components.Backends import HttpBackend, LocationResolver, ReplayBackend, SeleniumBackend
+from Model_Components.Caching import CachedScraper
+from Model_Components.Parsing import HtmlDocument
+from Model_Components.Scraping import DataScraper
+from Model_Components.Sessions import BrowserProfile
+from Benchmarks import Fixtures
+
+FIELDS_OF_INTEREST = {"price": True, "property_type": True, "bedrooms": True, "bathrooms": True, "text": True,
+                      "text_values": {"garden": True, "parking space": True, "en-suite": "word"}}
+FAST_RATE = {"max_rate": 1000, "burst": 100}
+POSTCODES = pd.DataFrame({"postcode": ["AB10", "AB11", "G1"], "region_gpt": ["Scotland", "Scotland", "Glasgow"]})
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """The scrapers keep their caches, location cache and archive under Outputs/ in the working directory."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def scrape(backend):
+    scraper = CachedScraper(POSTCODES, 2, FIELDS_OF_INTEREST, backend=backend)
+    try:
+        return scraper.run().reset_index(drop=True)
+    finally:
+        scraper.backend.shutdown()
+
+
+def selenium_profile(**settings):
+    """The settings of a browser profile with a local chromedriver, the test is skipped without one."""
+    driver_path = os.environ.get("CHROMEDRIVER") or shutil.which("chromedriver")
+    if driver_path is None:
+        pytest.skip("chromedriver is not installed")
+    profile = dict(settings, driver_path=driver_path)
+    try:
+        BrowserProfile(**profile).start_browser().quit()
+    except Exception as error:
+        pytest.skip(f"Chrome could not be started: {error!r}")
+    return profile
+
+
+def test_http_and_replay_give_the_same_rows(workdir, fixture_server):
+    archive_directory = str(workdir / "archive")
+    recorded = scrape(HttpBackend(base_url=fixture_server.url, rate_settings=FAST_RATE,
+                                  archive=PageArchive(directory=archive_directory)))
+    requests = sum(fixture_server.requests.values())
+    replayed = scrape(ReplayBackend(archive=PageArchive(directory=archive_directory)))
+
+    assert len(recorded) == len(POSTCODES) * 3 * 24  # 3 pages of 24 cards per postcode
+    assert recorded["property_type"].isin(Fixtures.PROPERTY_TYPES).all()
+    pd.testing.assert_frame_equal(replayed, recorded)
+    assert sum(fixture_server.requests.values()) == requests  # the replay did not connect
+
+
+def test_selenium_and_http_give_the_same_rows(workdir, fixture_server):
+    profile = selenium_profile()
+    fetched = scrape(HttpBackend(base_url=fixture_server.url, rate_settings=FAST_RATE))
+    rendered = scrape(SeleniumBackend(session_settings={"profile": profile}, rate_settings=FAST_RATE,
+                                      base_url=fixture_server.url))
+
+    for column in fetched.columns:
+        assert rendered[column].tolist() == fetched[column].tolist(), column
+
+
+def test_parser_and_browser_read_the_same_fields(workdir, fixture_server):
+    """Every field of a card is read the same from the parsed page as from the rendered page, and property_type is
+    only the type (not "Detached house 3 1", the text of the whole heading)."""
+    profile = selenium_profile()
+    scraper = DataScraper(POSTCODES, 2, FIELDS_OF_INTEREST, backend=HttpBackend(base_url=fixture_server.url))
+    html = Fixtures.result_page_html(pages=3, seed=sum(map(ord, "AB10")) * 10)
+    parsed = [scraper.extract_fields(card) for card in HtmlDocument(html).find_elements(
+        By.CSS_SELECTOR, '.l-searchResult.is-list')]
+
+    browser = BrowserProfile(**profile).start_browser()
+    try:
+        browser.get(fixture_server.url + "/property-for-sale/find.html?locationIdentifier=POSTCODE%5EAB10")
+        rendered = [scraper.extract_fields(card) for card in browser.find_elements(
+            By.CSS_SELECTOR, '.l-searchResult.is-list')]
+    finally:
+        browser.quit()
+        scraper.backend.shutdown()
+
+    assert rendered == parsed
+    assert all(row["property_type"] in Fixtures.PROPERTY_TYPES for row in parsed)
+
+
+def test_lean_profile_transfers_less(workdir, fixture_server):
+    """The lean default profile leaves out the images of the fixture pages, which the default Chrome settings load."""
+    profiles = {"lean": selenium_profile(),
+                "full": selenium_profile(block_images=False, block_fonts=False, blocked_urls=[],
+                                         page_load_strategy="normal")}
+    transferred_bytes = {}
+    for name, profile in profiles.items():
+        backend = SeleniumBackend(session_settings={"profile": profile}, rate_settings=FAST_RATE,
+                                  base_url=fixture_server.url)
+        try:
+            with backend.session() as session:
+                page = backend.load_for_postal(session, "AB10")
+                transferred_bytes[name] = page.transferred_bytes
+        finally:
+            backend.shutdown()
+
+    assert transferred_bytes["full"] > transferred_bytes["lean"] + 24 * 20000  # the images of 24 cards
+
+
+def test_locations_are_looked_up_once(workdir, fixture_server):
+    path = str(workdir / "locations.json")
+    backend = HttpBackend(base_url=fixture_server.url, rate_settings=FAST_RATE)
+    resolver = LocationResolver(backend.connection_pool, backend.scheduler, path=path)
+
+    assert resolver.resolve("AB10") == "POSTCODE^AB10"
+    assert resolver.resolve("AB10") == "POSTCODE^AB10"
+    assert fixture_server.requests["/typeAhead/uknostreet/AB/10/"] == 1
+
+    cached = LocationResolver(backend.connection_pool, backend.scheduler, path=path)  # a later run
+    assert cached.resolve("AB10") == "POSTCODE^AB10"
+    assert cached.resolve("G1 2") == "POSTCODE^G12"
+    assert fixture_server.requests["/typeAhead/uknostreet/AB/10/"] == 1
+    assert fixture_server.requests["/typeAhead/uknostreet/G1/2/"] == 1
+    assert LocationResolver(None, None, path=path).locations == {"AB10": "POSTCODE^AB10", "G1 2": "POSTCODE^G12"}
+    backend.shutdown()
@@ -0,0 +1,49 @@
+import os
+
+import pandas as pd
+import pytest
+
+from Benchmarks import Fixtures
+from Model_Components.Exporting import DataExporter
+from Model_Components.Transforming import DataTransformer
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+@pytest.fixture
+def outputs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("Outputs")
+    return tmp_path / "Outputs"
+
+
+def test_stream_export_with_empty_columns(outputs):
+    """Columns that are empty in the first chunks must not fix the type of the export."""
+    raw_data = Fixtures.raw_data_frame(50000)
+    raw_data.loc[:6999, ["garden", "property_type"]] = None
+    raw_data["text_values"] = None
+    chunks = (raw_data.iloc[start:start + 5000] for start in range(0, len(raw_data), 5000))
+
+    DataExporter(None, "stream", export_format="parquet").export_chunks(DataTransformer(chunks).stream_clean_data())
+
+    exported = pq.read_table(outputs / "rightmove_data_stream.parquet").to_pandas()
+    expected = DataTransformer(raw_data).clean_data
+    assert len(exported) == len(expected)
+    assert exported["garden"].sum() == expected["garden"].sum()
+    assert exported["property_type"].astype("string").tolist() == expected["property_type"].astype("string").tolist()
+
+
+def test_null_columns_are_cast_to_the_file_schema(outputs):
+    category = lambda values: pd.Series(values, dtype="string").astype("category")
+    exporter = DataExporter(None, "null", export_format="parquet")
+    exporter.write(pd.DataFrame({"agent": [None, None], "property_type": category([None, None]),
+                                 "garden": pd.array([None, None], dtype="boolean")}))
+    exporter.write(pd.DataFrame({"agent": ["Estate agent", None], "property_type": category(["Flat", "Bungalow"]),
+                                 "garden": pd.array([True, None], dtype="boolean")}))
+    exporter.write(pd.DataFrame({"agent": [None], "property_type": category([None]), "garden": [None]}))
+    exporter.close()
+
+    exported = pq.read_table(outputs / "rightmove_data_null.parquet").to_pandas()
+    assert exported["agent"].tolist()[2] == "Estate agent"
+    assert exported["property_type"].astype("string").tolist()[2:4] == ["Flat", "Bungalow"]
+    assert exported["garden"].tolist()[2] is True
@@ -0,0 +1,24 @@
+from Benchmarks import Fixtures
+from Model_Components.Indexing import ListingIndex
+from Model_Components.Transforming import DataTransformer
+
+
+def test_delta_keeps_the_types_of_the_clean_data(tmp_path):
+    clean_data = DataTransformer(Fixtures.raw_data_frame(200)).clean_data.head(100)
+    records = [{"listing_id": str(listing_id), "price": price}
+               for listing_id, price in zip(clean_data["listing_id"], clean_data["price"])]
+
+    listing_index = ListingIndex(path=str(tmp_path / "listings.sqlite"), run_id="1")
+    listing_index.record(records[:50], "PC1", "London")
+    listing_index.record(records[50:], "ZZ9", "Wales")
+    listing_index.run_id = "2"
+    listing_index.record([dict(record, price=1) for record in records[:10]], "PC1", "London")
+    listing_index.finish_postcode("ZZ9")
+
+    delta_data = listing_index.delta(clean_data.head(50))
+
+    assert delta_data["change"].value_counts().to_dict() == {"removed": 50, "changed": 10}
+    assert delta_data.dtypes.drop("change").astype(str).equals(clean_data.dtypes.astype(str))
+    assert delta_data["change"].dtype == "category"
+    assert set(delta_data["postcode"].cat.categories) == set(clean_data.head(10)["postcode"]) | {"ZZ9"}
+    listing_index.close()
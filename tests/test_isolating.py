@@ -0,0 +1,123 @@
+import pandas as pd
+import pytest
+
+from Model_Components import Isolating
+from Model_Components.Backends import HttpBackend
+from Model_Components.Caching import CachedScraper
+from Model_Components.Isolating import CircuitBreaker, CircuitOpen
+
+FIELDS_OF_INTEREST = {"price": True, "property_type": True, "bedrooms": True, "bathrooms": True, "text": True,
+                      "text_values": {"garden": True}}
+POSTCODES = pd.DataFrame({"postcode": [f"AB{k}" for k in range(10, 16)], "region_gpt": ["Scotland"] * 6})
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(Isolating, "time", clock)
+    return clock
+
+
+def test_breaker_trips_on_the_failure_rate(clock):
+    breaker = CircuitBreaker(failure_rate=0.5, window=4, min_attempts=4, cooldown=10)
+    for success in (True, False, True):
+        breaker.record(success)
+    breaker.wait()
+    assert breaker.state == "closed"  # fewer than min_attempts
+
+    for success in (True, True, False):
+        breaker.record(success)
+    assert breaker.state == "closed"  # 1 of the last 4 failed
+    breaker.record(False)
+    assert breaker.state == "open"  # 2 of the last 4 failed
+
+    breaker.wait()
+    assert clock.now == pytest.approx(10) and breaker.state == "half open"
+
+
+def test_failing_probes_double_the_cooldown_until_max_trips(clock):
+    breaker = CircuitBreaker(window=2, min_attempts=2, cooldown=10, max_trips=3)
+    breaker.record(False)
+    breaker.record(False)  # trip 1
+
+    breaker.wait()
+    breaker.record(False)  # trip 2, the probe failed
+    assert clock.now == pytest.approx(10)
+    breaker.wait()
+    assert clock.now == pytest.approx(30)
+    breaker.record(False)  # trip 3 of 3
+
+    with pytest.raises(CircuitOpen, match="3 times"):
+        breaker.wait()
+    assert clock.now == pytest.approx(30)  # it gives up right away, without a third pause
+
+
+def test_successful_probe_closes_the_breaker(clock):
+    breaker = CircuitBreaker(window=2, min_attempts=2, cooldown=10, max_trips=2)
+    breaker.record(False)
+    breaker.record(False)
+    breaker.wait()
+    breaker.record(True)
+
+    assert (breaker.state, breaker.trips) == ("closed", 0)
+    breaker.record(False)
+    breaker.record(False)
+    breaker.wait()  # tripped once since the probe succeeded, so it pauses again
+    assert breaker.state == "half open"
+
+
+def make_scraper(fixture_server, fault_settings=None):
+    rate_settings = {"max_attempts": 1, "max_rate": 1000, "burst": 100}
+    scraper = CachedScraper(POSTCODES, 6, FIELDS_OF_INTEREST, rate_settings=rate_settings,
+                            fault_settings=fault_settings,
+                            backend=HttpBackend(base_url=fixture_server.url, rate_settings=rate_settings))
+    scraper.circuit_breaker.poll_interval = 0.01
+    return scraper
+
+
+def test_breaker_stops_a_run_against_a_failing_website(tmp_path, monkeypatch, fixture_server):
+    monkeypatch.chdir(tmp_path)
+    fixture_server.failing_paths.update(f"/typeAhead/uknostreet/AB/{k}/" for k in range(10, 16))
+    scraper = make_scraper(fixture_server, {"window": 2, "min_attempts": 2, "cooldown": 0.01, "max_trips": 2})
+    scraper.start_cache()
+
+    with pytest.raises(CircuitOpen):
+        scraper.scrape_data()
+    scraper.backend.shutdown()
+
+    # Two postcodes trip the breaker, the third one is the probe that trips it for the second time
+    assert [letter["postcode"] for letter in scraper.dead_letters] == ["AB10", "AB11", "AB12"]
+    assert sum(fixture_server.requests.values()) == 3
+    assert scraper.journal.manifest["params"]["dead_letters"] == scraper.dead_letters  # kept with the cache
+
+
+def test_page_that_can_not_be_read_is_set_aside_alone(tmp_path, monkeypatch, fixture_server):
+    monkeypatch.chdir(tmp_path)
+    extract_data = CachedScraper.extract_data
+
+    def failing_extract_data(self, results_page, pc, mine=True):
+        if (pc, results_page.page_index) == ("AB11", 1):
+            raise ValueError("unexpected card layout")
+        return extract_data(self, results_page, pc, mine)
+
+    monkeypatch.setattr(CachedScraper, "extract_data", failing_extract_data)
+    scraper = make_scraper(fixture_server)
+    recorded = []
+    monkeypatch.setattr(scraper.circuit_breaker, "record", recorded.append)
+    raw_data = scraper.run()
+
+    assert [(letter["postcode"], letter["first_page"], letter["last_page"]) for letter in scraper.dead_letters] == \
+           [("AB11", 1, 2)]
+    assert len(raw_data) == (len(POSTCODES) * 3 - 1) * 24
+    assert recorded == [True] * len(POSTCODES)  # one outcome per postcode attempt
@@ -0,0 +1,117 @@
+import os
+
+import pandas as pd
+import pytest
+
+from Model_Components.Backends import HttpBackend
+from Model_Components.Caching import CachedScraper
+from Model_Components.Journaling import CacheJournal
+
+FIELDS_OF_INTEREST = {"price": True, "property_type": True, "bedrooms": True, "bathrooms": True, "text": True,
+                      "text_values": {"garden": True}}
+FAST_RATE = {"max_rate": 1000, "burst": 100}
+POSTCODES = pd.DataFrame({"postcode": ["AB10", "AB11", "G1"], "region_gpt": ["Scotland", "Scotland", "Glasgow"]})
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def records(start, n):
+    return [{"listing_id": str(i), "price": f"£{i},000"} for i in range(start, start + n)]
+
+
+def test_journal_replays_committed_rows(workdir):
+    journal = CacheJournal("1")
+    journal.segment_rows = 10
+    journal.max_segments = 3
+    journal.start(POSTCODES, {"current_i": 1})
+    for page in range(10):
+        journal.append(records(page * 4, 4), {"current_i": page + 1}, postcode="AB10")
+    journal.close()
+
+    resumed = CacheJournal("1")
+    resumed.load()
+    replayed = resumed.replay()
+    assert replayed["listing_id"].tolist() == list(range(40))
+    assert (replayed["postcode"] == "AB10").all()
+    assert resumed.manifest["params"] == {"current_i": 10}
+    assert any(segment["compacted"] for segment in resumed.manifest["segments"])
+    assert sorted(os.listdir(resumed.directory)) == sorted(
+        ["manifest.json", "sample.csv"] + [segment["name"] for segment in resumed.manifest["segments"]])
+    assert resumed.load_sample().equals(POSTCODES)
+
+
+def test_torn_segment_is_ignored(workdir):
+    """Rows written after the last manifest update (a process killed halfway through a page) are not replayed."""
+    journal = CacheJournal("1")
+    journal.start(POSTCODES, {})
+    journal.append(records(0, 3), {"current_page": 1})
+    journal.segment_writer.writerow(["3", "£3,"])  # the manifest of this page was never written
+    journal.segment_file.flush()
+    open(journal.manifest_path + ".tmp", 'w').write('{"cache_id": "1", "segm')  # torn manifest update
+    journal.close()
+
+    resumed = CacheJournal("1")
+    resumed.load()
+    assert resumed.manifest["params"] == {"current_page": 1}
+    assert resumed.replay()["listing_id"].tolist() == [0, 1, 2]
+
+
+class CrashingScraper(CachedScraper):
+    """Stops like a killed process (not caught by run) right after the given number of pages were journaled."""
+
+    def __init__(self, *args, crash_after, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.crash_after = crash_after
+
+    def checkpoint(self, page_data=None, **constants):
+        super().checkpoint(page_data, **constants)
+        if page_data:
+            self.crash_after -= 1
+            if not self.crash_after:
+                raise KeyboardInterrupt
+
+
+def scraper_settings(fixture_server):
+    return dict(rate_settings=FAST_RATE, backend=HttpBackend(base_url=fixture_server.url, rate_settings=FAST_RATE))
+
+
+@pytest.mark.parametrize("crash_after", [1, 3, 4, 7])
+def test_resumed_run_gives_the_rows_of_an_uninterrupted_run(workdir, fixture_server, crash_after):
+    expected = CachedScraper(POSTCODES, 3, FIELDS_OF_INTEREST, **scraper_settings(fixture_server)).run()
+
+    crashed = CrashingScraper(POSTCODES, 3, FIELDS_OF_INTEREST, crash_after=crash_after,
+                              **scraper_settings(fixture_server))
+    with pytest.raises(KeyboardInterrupt):
+        crashed.run()
+    resumed = CachedScraper(None, 3, FIELDS_OF_INTEREST, **scraper_settings(fixture_server))
+    resumed.resume(crashed.cache_id)
+    assert len(resumed.rows) == crash_after * 24
+
+    pd.testing.assert_frame_equal(resumed.run().astype(str).reset_index(drop=True),
+                                  expected.astype(str).reset_index(drop=True))
+
+
+@pytest.mark.parametrize("crash_after", [1, 2, 4, 5])
+def test_resumed_quota_run_keeps_the_sampling_weights(workdir, fixture_server, crash_after):
+    """The pages every postcode has are known from its first page on, also when a run is resumed after it."""
+    quota_settings = {"listings_per_postcode": 48}  # 2 of the 3 pages of every postcode
+    expected_scraper = CachedScraper(POSTCODES, 3, FIELDS_OF_INTEREST, quota_settings=quota_settings,
+                                     **scraper_settings(fixture_server))
+    expected = expected_scraper.run()
+
+    crashed = CrashingScraper(POSTCODES, 3, FIELDS_OF_INTEREST, crash_after=crash_after,
+                              quota_settings=quota_settings, **scraper_settings(fixture_server))
+    with pytest.raises(KeyboardInterrupt):
+        crashed.run()
+    resumed = CachedScraper(None, 3, FIELDS_OF_INTEREST, quota_settings=quota_settings,
+                            **scraper_settings(fixture_server))
+    resumed.resume(crashed.cache_id)
+    raw_data = resumed.run()
+
+    assert len(raw_data) == len(expected) == len(POSTCODES) * 2 * 24
+    assert resumed.sampling_weights().to_dict() == expected_scraper.sampling_weights().to_dict() == \
+           dict.fromkeys(POSTCODES["postcode"], 1.5)
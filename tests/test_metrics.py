@@ -0,0 +1,37 @@
+import json
+
+from Model_Components.Metrics import MetricsRegistry
+
+
+def test_export_writes_json_and_prometheus_text(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    registry = MetricsRegistry()
+    registry.configure("run")
+    registry.increment("pages_scraped_total", 3, region="London")
+    registry.increment("pages_scraped_total", region='South "East"')
+    for seconds in (0.2, 0.3, 4):
+        registry.observe("page_load_seconds", seconds)
+    registry.observe("region_seconds", 1.5, region="London")
+
+    json_path = registry.export()
+
+    summary = json.load(open(json_path))
+    assert summary["output_id"] == "run"
+    assert summary["counters"] == [{"name": "pages_scraped_total", "labels": {"region": "London"}, "value": 3},
+                                   {"name": "pages_scraped_total", "labels": {"region": 'South "East"'}, "value": 1}]
+    page_load = summary["histograms"][0]
+    assert (page_load["name"], page_load["count"], page_load["sum"]) == ("page_load_seconds", 3, 4.5)
+    assert 0.25 <= page_load["p50"] <= 0.5  # within the bucket of the median
+    assert summary["rates"] == {"London": {"pages_per_second": 2.0}}
+
+    lines = (tmp_path / "Outputs" / "Metrics" / "metrics_run.prom").read_text().splitlines()
+    assert lines[:3] == ["# TYPE rightmove_pages_scraped_total counter",
+                         'rightmove_pages_scraped_total{region="London"} 3',
+                         'rightmove_pages_scraped_total{region="South \\"East\\""} 1']
+    assert "# TYPE rightmove_page_load_seconds histogram" in lines
+    assert 'rightmove_page_load_seconds_bucket{le="0.25"} 1' in lines
+    assert 'rightmove_page_load_seconds_bucket{le="0.5"} 2' in lines
+    assert 'rightmove_page_load_seconds_bucket{le="5"} 3' in lines
+    assert 'rightmove_page_load_seconds_bucket{le="+Inf"} 3' in lines
+    assert "rightmove_page_load_seconds_count 3" in lines
+    assert 'rightmove_region_seconds_sum{region="London"} 1.5' in lines
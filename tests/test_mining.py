@@ -0,0 +1,58 @@
+import itertools
+import re
+
+import pandas as pd
+import pytest
+
+from Benchmarks import Fixtures
+from Model_Components.Mining import TextMiner, PhraseMatcher
+
+
+def expected_contents(text_values, text):
+    """The matches of every phrase on its own, as the text miner matched them before the phrases were compiled."""
+    lowered = text.lower()
+    contents = {}
+    for key, match_type in text_values.items():
+        if match_type == "regex":
+            contents[key] = re.search(key, text, re.IGNORECASE) is not None
+        elif match_type == "word":
+            contents[key] = re.search(rf"(?<![^\W_]){re.escape(key.lower())}(?![^\W_])", lowered) is not None
+        else:
+            contents[key] = key.lower() in lowered
+    return contents
+
+
+def vocabulary(size):
+    """Overlapping phrases of the description words, every third one as a whole word, and a few special cases."""
+    pairs = [f"{first} {second}" for first, second in itertools.product(Fixtures.DESCRIPTION_WORDS, repeat=2)]
+    phrases = (Fixtures.DESCRIPTION_WORDS + pairs)[:size]
+    text_values = {phrase: "word" if k % 3 == 0 else True for k, phrase in enumerate(phrases)}
+    text_values.update({"en": "word", "en-suite": "word", "Garden": "word", "park": "word", "bath": "word",
+                        r"\bviews?\b": "regex", "Chain Free": True, "gardens": True})
+    return text_values
+
+
+@pytest.mark.parametrize("size", [2, 20, 200])
+def test_matches_every_phrase_on_its_own(size):
+    text_values = vocabulary(size)
+    texts = Fixtures.descriptions(300) + ["En-suite, bath.", "park_en suite", "", "Gardens; chain-free"]
+    text_miner = TextMiner(text_values)
+
+    for text in texts:
+        assert text_miner.scan_contents(text) == expected_contents(text_values, text)
+
+    series = pd.Series(texts + [None], index=range(0, 2 * len(texts) + 2, 2))
+    mined_data = text_miner.mine_series(series)
+    assert list(mined_data.index) == list(series.index)
+    assert list(mined_data.columns) == list(text_values)
+    assert (mined_data.dtypes == "boolean").all()
+    assert mined_data.iloc[-1].isna().all()
+    assert mined_data.iloc[:-1].astype(bool).to_dict("records") == [expected_contents(text_values, text)
+                                                                     for text in texts]
+
+
+def test_large_vocabularies_are_compiled_into_tries():
+    matcher = PhraseMatcher(vocabulary(200))
+    assert [whole_word for _, whole_word, _, _ in matcher.tries] == [False, True]
+    assert not matcher.phrases
+    assert PhraseMatcher(Fixtures.TEXT_VALUES).tries == []
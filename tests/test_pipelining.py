@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from Model_Components.Pipelining import Pipeline
+
+
+def test_items_come_out_in_order():
+    with Pipeline(iter(range(200)), [("double", lambda x: 2 * x), ("add", lambda x: x + 1)], queue_size=2) as pipeline:
+        results = list(pipeline)
+
+    assert results == [2 * x + 1 for x in range(200)]
+
+
+def test_source_waits_for_slow_stages():
+    taken = []
+    release = threading.Event()
+
+    def source():
+        for x in range(100):
+            taken.append(x)
+            yield x
+
+    def slow(x):
+        release.wait()
+        return x
+
+    with Pipeline(source(), [("slow", slow)], queue_size=3) as pipeline:
+        items = iter(pipeline)
+        threading.Timer(0.3, release.set).start()
+        first = next(items)
+        assert len(taken) <= 3 + 1 + 3 + 1  # the queues, the stage and the source each hold one item at most
+        assert [first] + list(items) == list(range(100))
+
+
+def test_error_stops_every_stage_and_closes_the_source():
+    closed = threading.Event()
+
+    def source():
+        try:
+            x = 0
+            while True:  # would never end without the error
+                yield x
+                x += 1
+        finally:
+            closed.set()
+
+    def extract(x):
+        if x == 50:
+            raise ValueError("page could not be read")
+        return x
+
+    pipeline = Pipeline(source(), [("extract", extract), ("mine", lambda x: x)], queue_size=4)
+    with pytest.raises(ValueError, match="page could not be read"):
+        with pipeline:
+            for _ in pipeline:
+                pass
+
+    assert closed.is_set()
+    assert pipeline.threads == []
+    assert not any(thread.name.startswith("pipeline-") for thread in threading.enumerate())
+
+
+def test_closing_early_stops_the_stages():
+    with Pipeline(iter(range(10 ** 6)), [("copy", lambda x: x)], queue_size=4) as pipeline:
+        assert next(iter(pipeline)) == 0
+
+    assert not any(thread.name.startswith("pipeline-") for thread in threading.enumerate())
@@ -0,0 +1,129 @@
+import pandas as pd
+import pytest
+
+from Model_Components import Queueing
+from Model_Components.Backends import HttpBackend
+from Model_Components.Distributing import QueueWorker
+from Model_Components.Queueing import TaskQueue
+
+FIELDS_OF_INTEREST = {"price": True, "property_type": True, "bedrooms": True, "bathrooms": True, "text": True,
+                      "text_values": {"garden": True}}
+POSTCODES = pd.DataFrame({"postcode": ["AB10", "AB11", "G1"], "region_gpt": ["Scotland", "Scotland", "Glasgow"]})
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(Queueing, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = TaskQueue(str(tmp_path / "queue.sqlite"), lease_seconds=60, max_attempts=3)
+    queue.seed(POSTCODES)
+    yield queue
+    queue.close()
+
+
+def rows(listing_id):
+    return [{"listing_id": listing_id, "price": "£100,000"}]
+
+
+def test_tasks_are_leased_in_sample_order(queue, clock):
+    first = queue.claim("worker-1", n=2)
+    second = queue.claim("worker-2", n=2)
+
+    assert [(task.postcode, task.page) for task in first] == [("AB10", 0), ("AB11", 0)]
+    assert [(task.postcode, task.page) for task in second] == [("G1", 0)]
+    assert queue.claim("worker-3") == []
+    assert queue.progress() == {"pending": 0, "leased": 3, "done": 0, "failed": 0}
+
+
+def test_first_page_adds_the_other_pages(queue, clock):
+    task, = queue.claim("worker-1")
+    assert queue.complete(task, "worker-1", rows(1), n_pages=3)
+
+    assert [(task.postcode, task.page) for task in queue.claim("worker-1", n=3)] == \
+           [("AB10", 1), ("AB10", 2), ("AB11", 0)]
+
+
+def test_heartbeat_keeps_the_lease_of_its_owner(queue, clock):
+    task, = queue.claim("worker-1")
+    clock.now += 50
+    queue.heartbeat("worker-1", [task])
+    queue.heartbeat("worker-2", [task])  # not the owner, nothing changes
+    clock.now += 50
+
+    assert [claimed.postcode for claimed in queue.claim("worker-2", n=3)] == ["AB11", "G1"]
+    assert queue.progress()["leased"] == 3
+
+
+def test_expired_lease_is_reclaimed_and_the_late_result_dropped(queue, clock):
+    task, = queue.claim("worker-1")
+    clock.now += 61  # worker-1 hangs, its lease expires
+
+    reclaimed, = queue.claim("worker-2")
+    assert (reclaimed.postcode, reclaimed.page) == (task.postcode, task.page)
+    queue.heartbeat("worker-1", [task])  # a late heartbeat does not take the task back
+
+    assert not queue.complete(task, "worker-1", rows("late"), n_pages=2)
+    assert queue.complete(reclaimed, "worker-2", rows("reclaimed"), n_pages=2)
+    assert not queue.complete(task, "worker-1", rows("late"), n_pages=2)  # also not once it is done
+    assert queue.results()["listing_id"].tolist() == ["reclaimed"]
+
+
+def test_tasks_fail_after_max_attempts(queue, clock):
+    for attempt in range(3):
+        task, = queue.claim("worker-1")
+        assert task.postcode == "AB10"
+        queue.release(task, "worker-1", error="timeout")
+
+    assert queue.claim("worker-1")[0].postcode == "AB11"
+    assert queue.progress()["failed"] == 1
+
+    task, = queue.claim("worker-1")
+    queue.release(task, "worker-1", error="retries exhausted", retry=False)
+    assert queue.progress()["failed"] == 2
+
+    queue.retry_failed()
+    assert queue.progress()["pending"] == 2
+
+
+def test_results_are_in_sample_order(queue, clock):
+    tasks = queue.claim("worker-1", n=3)
+    for task in reversed(tasks):
+        queue.complete(task, "worker-1", rows(task.postcode), n_pages=2 if task.postcode == "AB10" else 1)
+    extra_page, = queue.claim("worker-1")
+    queue.complete(extra_page, "worker-1", rows("AB10 page 1"))
+
+    results = queue.results()
+    assert results["listing_id"].tolist() == ["AB10", "AB10 page 1", "AB11", "G1"]
+    assert results["postcode"].tolist() == ["AB10", "AB10", "AB11", "G1"]
+    assert results["region_gpt"].tolist() == ["Scotland", "Scotland", "Scotland", "Glasgow"]
+
+
+def test_worker_sets_failing_pages_aside_without_retrying_the_retries(tmp_path, monkeypatch, fixture_server):
+    monkeypatch.chdir(tmp_path)
+    bad_page = "/property-for-sale/find.html?locationIdentifier=POSTCODE%5EAB11&index=24"
+    fixture_server.failing_paths.add(bad_page)
+    rate_settings = {"max_attempts": 4, "backoff_base": 0.001, "max_rate": 1000, "burst": 100}
+    queue = TaskQueue(str(tmp_path / "queue.sqlite"), max_attempts=3)
+    queue.seed(POSTCODES)
+
+    worker = QueueWorker(queue, 3, FIELDS_OF_INTEREST, n_workers=2, rate_settings=rate_settings, poll_interval=0.01,
+                         backend=HttpBackend(n_workers=2, base_url=fixture_server.url, rate_settings=rate_settings))
+    worker.run()
+
+    assert fixture_server.requests[bad_page] == 4
+    assert queue.progress() == {"pending": 0, "leased": 0, "done": 8, "failed": 1}
+    assert queue.results()["postcode"].value_counts().to_dict() == {"AB10": 72, "G1": 72, "AB11": 48}
+    queue.close()
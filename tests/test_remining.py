@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from Benchmarks import Fixtures
+from Model_Components.Mining import TextMiner
+from Model_Components.Remining import TextReminer
+from Model_Components.Transforming import DataTransformer
+
+NEW_TEXT_VALUES = {"garden": True, "south facing": True, "en-suite": "word", "double bedroom": True}
+
+
+def serially_mined(raw_data):
+    """The phrase columns as the scraper mines them, one description at a time."""
+    text_miner = TextMiner(NEW_TEXT_VALUES)
+    rows = [text_miner.scan_contents(text) if isinstance(text, str) else dict.fromkeys(NEW_TEXT_VALUES)
+            for text in raw_data["text"]]
+    return pd.DataFrame(rows, columns=list(NEW_TEXT_VALUES)).astype("boolean")
+
+
+@pytest.fixture
+def reminer():
+    with TextReminer(NEW_TEXT_VALUES, n_processes=2, chunk_size=3000) as reminer:
+        reminer.batch_size = 700
+        yield reminer
+
+
+def test_parallel_remining_equals_serial_mining(tmp_path, reminer):
+    raw_data = Fixtures.raw_data_frame(10000)
+    raw_data.to_csv(tmp_path / "raw.csv", index=False)
+    saved_raw = pd.read_csv(tmp_path / "raw.csv")
+    DataTransformer(raw_data).clean_data.to_pickle(tmp_path / "clean.pkl")
+
+    reminer.remine([str(tmp_path)])
+
+    remined_raw = pd.read_csv(tmp_path / "raw.csv")
+    expected = serially_mined(raw_data)
+    for phrase in NEW_TEXT_VALUES:
+        assert remined_raw[phrase].astype("boolean").tolist() == expected[phrase].tolist(), phrase
+    unchanged = [column for column in raw_data.columns if column not in NEW_TEXT_VALUES]
+    pd.testing.assert_frame_equal(remined_raw[unchanged], saved_raw[unchanged])  # also the phrases no longer mined
+
+    remined_clean = pd.read_pickle(tmp_path / "clean.pkl")
+    expected_clean = serially_mined(DataTransformer(raw_data).clean_data).set_axis(remined_clean.index)
+    pd.testing.assert_frame_equal(remined_clean[list(NEW_TEXT_VALUES)], expected_clean)
+
+
+def test_remining_parquet_keeps_the_schema(tmp_path, reminer):
+    pytest.importorskip("pyarrow.parquet")
+    clean_data = DataTransformer(Fixtures.raw_data_frame(5000)).clean_data
+    clean_data.to_parquet(tmp_path / "part-0.parquet", index=False)
+
+    reminer.remine([str(tmp_path / "part-0.parquet")])
+
+    remined = pd.read_parquet(tmp_path / "part-0.parquet")
+    assert remined["property_type"].dtype == "category"
+    pd.testing.assert_frame_equal(remined[list(NEW_TEXT_VALUES)], serially_mined(clean_data))
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Model_Components.Sampling import PostcodeSampler, largest_remainder, fill_quotas, TABLE_FORMAT
+
+REGION_SIZES = {"London": 50, "Wales": 7, "Scotland": 23, "Jersey": 5, "North East": 15}
+
+
+@pytest.fixture
+def postcode_list(tmp_path, monkeypatch):
+    """A postcode list with the regions interleaved, like Inputs/postalcodes.csv."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("Inputs")
+    regions = [region for region, size in REGION_SIZES.items() for _ in range(size)]
+    rows = pd.DataFrame({"postcode": [f"{region[:2].upper()}{k}" for k, region in enumerate(regions)],
+                         "region_gpt": regions,
+                         "country_string": ["Jersey" if region == "Jersey" else "United Kingdom" for region in regions]})
+    rows.sample(frac=1, random_state=0).to_csv("Inputs/postalcodes.csv", index=False)
+    return tmp_path / "Inputs" / "postalcodes.csv"
+
+
+def region_counts(sample):
+    return sample["region_gpt"].value_counts().to_dict()
+
+
+@pytest.mark.parametrize("settings, expected", [
+    ({"allocation": "equal", "n_per_region": 10}, {"London": 10, "Wales": 7, "Scotland": 10, "North East": 10}),
+    ({"allocation": "proportional", "n_per_region": 10}, dict(zip(
+        ["London", "Wales", "Scotland", "North East"], largest_remainder(40, np.array([50, 7, 23, 15.]))))),
+    ({"allocation": "weighted", "sample_size": 30, "weights": {"London": 3, "Wales": 0}, "max_per_region": 15},
+     {"London": 15, "Scotland": 6, "North East": 6}),
+])
+def test_sample_has_the_allocated_postcodes_per_region(postcode_list, settings, expected):
+    sample = PostcodeSampler(set_seed=1, **settings).pc_sampler()
+
+    assert region_counts(sample) == {region: count for region, count in expected.items() if count}
+    assert sample["postcode"].is_unique
+    csv_regions = pd.read_csv(postcode_list)["region_gpt"].unique()
+    assert sample["region_gpt"].unique().tolist() == [region for region in csv_regions if expected.get(region)]
+
+
+def test_sample_depends_only_on_the_seed(postcode_list):
+    first = PostcodeSampler(n_per_region=5, set_seed=3).pc_sampler()
+    cached = PostcodeSampler(n_per_region=5, set_seed=3).pc_sampler()
+    other = PostcodeSampler(n_per_region=5, set_seed=4).pc_sampler()
+
+    pd.testing.assert_frame_equal(cached, first)
+    assert not other.equals(first)
+
+
+def test_postcode_table_is_rebuilt_when_the_csv_changes(postcode_list):
+    table_path = postcode_list.parent.parent / "Outputs" / "Cache" / f"postalcodes.{TABLE_FORMAT}"
+    PostcodeSampler(n_per_region=5, set_seed=3).pc_sampler()
+    built = os.path.getmtime(table_path)
+
+    PostcodeSampler(n_per_region=5, set_seed=3).pc_sampler()
+    assert os.path.getmtime(table_path) == built  # the CSV did not change, the table is reused
+
+    pd.read_csv(postcode_list).query("region_gpt != 'Wales'").to_csv(postcode_list, index=False)
+    os.utime(postcode_list, (built + 10, built + 10))
+    sample = PostcodeSampler(n_per_region=5, set_seed=3).pc_sampler()
+
+    assert os.path.getmtime(table_path) > built
+    assert "Wales" not in region_counts(sample)
+
+
+def test_largest_remainder_divides_the_whole_total():
+    allocation = largest_remainder(10, np.array([1., 1., 1.]))
+    assert allocation.tolist() == [4, 3, 3]
+    assert largest_remainder(7, np.array([0., 0.])).tolist() == [0, 0]
+
+
+def test_fill_quotas_gives_what_small_capacities_leave_to_the_others():
+    assert fill_quotas(10, [1, 8, 8]).tolist() == [1, 5, 4]
+    assert fill_quotas(100, [1, 2, 3]).tolist() == [1, 2, 3]
+    assert fill_quotas(0, [4, 4]).tolist() == [0, 0]
@@ -0,0 +1,80 @@
+import pytest
+
+from Model_Components import Scheduling
+from Model_Components.Scheduling import RequestScheduler, RetriesExhausted
+
+
+class FakeClock:
+    """Replaces the time module of the scheduler, so sleeping only moves the clock forward."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += max(seconds, 1e-9)  # a real sleep always overshoots, a wait that rounds to 0 would never end
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(Scheduling, "time", clock)
+    monkeypatch.setattr(Scheduling.random, "uniform", lambda low, high: high)  # the longest backoff of the jitter
+    return clock
+
+
+def test_requests_are_paced_by_the_token_bucket(clock):
+    scheduler = RequestScheduler(max_rate=10, burst=2)
+    scheduler.rate = 10
+
+    for _ in range(12):
+        scheduler.acquire()
+
+    assert clock.now == pytest.approx(1.0)  # the burst goes right away, the other 10 at 10 per second
+
+
+def test_rate_halves_on_failures_and_climbs_back(clock):
+    scheduler = RequestScheduler(max_rate=10, min_rate=1)
+    for _ in range(5):
+        scheduler.failure()
+    assert scheduler.rate == 1  # never slower than min_rate
+
+    for _ in range(20):
+        scheduler.success()
+    assert scheduler.rate == 10  # never faster than max_rate
+
+
+def test_failed_requests_are_retried_with_backoff(clock):
+    scheduler = RequestScheduler(max_rate=1000, max_attempts=4, backoff_base=1, backoff_max=5)
+    outcomes = [ConnectionError("reset"), TimeoutError("slow"), "page"]
+
+    def request():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert scheduler.call(request) == "page"
+    assert clock.sleeps == [2, 4]  # up to backoff_base * 2^attempt
+
+
+def test_retries_exhausted_carries_the_last_error(clock):
+    scheduler = RequestScheduler(max_rate=1000, max_attempts=3, backoff_base=1, backoff_max=3)
+    errors = [ConnectionError(f"attempt {attempt}") for attempt in range(1, 4)]
+    calls = []
+
+    def request():
+        calls.append(1)
+        raise errors[len(calls) - 1]
+
+    with pytest.raises(RetriesExhausted) as raised:
+        scheduler.call(request)
+
+    assert len(calls) == 3
+    assert raised.value.attempts == 3
+    assert raised.value.__cause__ is errors[-1]
+    assert clock.sleeps == [2, 3]  # backoff_max caps the delay
@@ -0,0 +1,86 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from Model_Components.Backends import HttpBackend
+from Model_Components.Caching import CachedScraper
+
+FIELDS_OF_INTEREST = {"price": True, "property_type": True, "bedrooms": True, "bathrooms": True, "text": True,
+                      "text_values": {"garden": True}}
+FAST_RATE = {"max_rate": 1000, "burst": 100}
+POSTCODES = pd.DataFrame({"postcode": ["AB10", "AB11", "AB12", "G1", "G2"],
+                          "region_gpt": ["Scotland"] * 3 + ["Glasgow"] * 2})
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def make_scraper(fixture_server, postcodes=POSTCODES, n_workers=1, pipeline_size=None, rate_settings=FAST_RATE,
+                 **settings):
+    scraper = CachedScraper(postcodes, 3, FIELDS_OF_INTEREST, n_workers=n_workers, rate_settings=rate_settings,
+                            backend=HttpBackend(n_workers=n_workers, base_url=fixture_server.url,
+                                                rate_settings=rate_settings), **settings)
+    if pipeline_size is not None:
+        scraper.pipeline_size = pipeline_size
+    return scraper
+
+
+def scrape(scraper):
+    try:
+        return scraper.run().reset_index(drop=True)
+    finally:
+        scraper.backend.shutdown()
+
+
+def test_parallel_workers_give_the_serial_rows(workdir, fixture_server):
+    serial = scrape(make_scraper(fixture_server, pipeline_size=0))
+    parallel = scrape(make_scraper(fixture_server, n_workers=3))
+
+    assert len(serial) == len(POSTCODES) * 3 * 24
+    pd.testing.assert_frame_equal(parallel, serial)
+
+
+def test_failing_page_is_only_retried_by_the_scheduler(workdir, fixture_server):
+    """A page that keeps failing is requested max_attempts times by the scheduler, and its postcode is set aside
+    without being attempted again, while the other postcodes are scraped."""
+    bad_page = "/property-for-sale/find.html?locationIdentifier=POSTCODE%5EAB11&index=24"
+    fixture_server.failing_paths.add(bad_page)
+    rate_settings = {"max_attempts": 5, "backoff_base": 0.001, **FAST_RATE}
+
+    scraper = make_scraper(fixture_server, POSTCODES.iloc[:3], rate_settings=rate_settings,
+                           fault_settings={"max_attempts": 3})
+    raw_data = scrape(scraper)
+
+    assert fixture_server.requests[bad_page] == 5
+    assert [(letter["postcode"], letter["first_page"], letter["attempts"]) for letter in scraper.dead_letters] == \
+           [("AB11", 1, 5)]
+    assert raw_data["postcode"].value_counts().to_dict() == {"AB10": 72, "AB12": 72, "AB11": 24}
+
+
+def test_pipelined_pages_give_the_serial_rows(workdir, fixture_server):
+    serial = scrape(make_scraper(fixture_server, pipeline_size=0))
+    pipelined = scrape(make_scraper(fixture_server, pipeline_size=2))
+
+    pd.testing.assert_frame_equal(pipelined, serial)
+
+
+def test_pipeline_stops_when_caching_fails(workdir, fixture_server):
+    """An error of the caller (here writing the journal) ends the run and stops the fetching thread."""
+    scraper = make_scraper(fixture_server, pipeline_size=2)
+    scraper.start_cache()
+
+    def append(*args, **kwargs):
+        raise OSError("disk full")
+    scraper.journal.append = append
+
+    with pytest.raises(OSError, match="disk full"):
+        scraper.scrape_data()
+    scraper.backend.shutdown()
+
+    assert not any(thread.name.startswith("scraping-") for thread in threading.enumerate())
+    # The page that failed, the pages in the queues and in every stage of the pipeline
+    assert sum(count for path, count in fixture_server.requests.items() if "find.html" in path) <= 1 + 3 * 2 + 3
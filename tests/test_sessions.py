@@ -0,0 +1,75 @@
+import pytest
+
+from Model_Components.Sessions import BrowserPool
+
+
+class FakeBrowser:
+    """Stands in for a Chrome WebDriver: it answers current_url until it is quit or crashes."""
+
+    def __init__(self):
+        self.alive = True
+        self.quit_calls = 0
+
+    @property
+    def current_url(self):
+        if not self.alive:
+            raise ConnectionError("chrome not reachable")
+        return "about:blank"
+
+    def quit(self):
+        self.alive = False
+        self.quit_calls += 1
+
+
+class FakeBrowserPool(BrowserPool):
+    def __init__(self, **settings):
+        super().__init__(**settings)
+        self.started = []
+
+    def start_browser(self):
+        browser = FakeBrowser()
+        self.started.append(browser)
+        return browser
+
+
+def load_pages(pool, n_pages):
+    with pool.session() as session:
+        session.pages_loaded += n_pages
+        return session.browser
+
+
+def test_sessions_are_reused_until_max_pages():
+    pool = FakeBrowserPool(size=1, max_pages=3)
+
+    browsers = [load_pages(pool, 1) for _ in range(5)]
+
+    assert browsers[:3] == [pool.started[0]] * 3  # one warm browser for the first three postcodes
+    assert pool.started[0].quit_calls == 1  # recycled once it loaded max_pages pages
+    assert browsers[3:] == [pool.started[1]] * 2
+    assert len(pool.started) == 2
+
+
+def test_dead_and_failed_sessions_are_replaced():
+    pool = FakeBrowserPool(size=1, max_pages=50)
+    first_browser = load_pages(pool, 1)
+    first_browser.alive = False  # Chrome crashed while the session was idle
+
+    second_browser = load_pages(pool, 1)
+    with pytest.raises(RuntimeError):
+        with pool.session():
+            raise RuntimeError("page could not be read")
+    third_browser = load_pages(pool, 1)
+
+    assert len({id(first_browser), id(second_browser), id(third_browser)}) == 3
+    assert second_browser.quit_calls == 1  # a session in use during an error is not trusted anymore
+    assert [session.browser for session in pool.sessions] == [third_browser]
+
+
+def test_shutdown_quits_every_browser():
+    pool = FakeBrowserPool(size=2)
+    with pool.session(), pool.session():
+        pass
+    pool.shutdown()
+
+    assert [browser.quit_calls for browser in pool.started] == [1, 1]
+    assert pool.sessions == []
@@ -0,0 +1,32 @@
+import pandas as pd
+
+from Benchmarks import Fixtures
+from Model_Components.Transforming import DataTransformer
+
+
+def test_property_type_without_room_counts():
+    """The type must be the same whether the counts were scraped on new lines (browser) or inline (parsed HTML)."""
+    raw_data = pd.DataFrame({"property_type": ["Detached house\n3\n1", "Detached house 3 1", "Flat 2 3",
+                                               "Flat\n2", "Bungalow", '"Flat"', None]})
+    property_types = DataTransformer(raw_data).apply_schema(raw_data)["property_type"]
+
+    assert property_types.dtype == "category"
+    assert property_types.iloc[:6].tolist() == ["Detached house", "Detached house", "Flat", "Flat", "Bungalow",
+                                                "Flat"]
+    assert pd.isna(property_types.iloc[6])
+    assert set(property_types.cat.categories) == {"Detached house", "Flat", "Bungalow"}
+
+
+def test_stream_chunks_share_types():
+    """A phrase that is missing from a whole chunk must keep the type it has in the other chunks."""
+    raw_data = Fixtures.raw_data_frame(20000)
+    raw_data.loc[:6999, "garden"] = None
+    chunks = (raw_data.iloc[start:start + 5000] for start in range(0, len(raw_data), 5000))
+
+    clean_chunks = list(DataTransformer(chunks).stream_clean_data())
+
+    assert len(clean_chunks) == 4
+    assert clean_chunks[0]["garden"].isna().all()
+    for clean_chunk in clean_chunks:
+        assert clean_chunk.dtypes.astype(str).equals(clean_chunks[-1].dtypes.astype(str))
+        assert clean_chunk["garden"].dtype == "boolean"